@@ -1,23 +1,26 @@
-from typing import List, Any
+import asyncio
+from functools import lru_cache
+from typing import Optional, Tuple
 from langchain_openai import ChatOpenAI
-from langchain_community.tools import Tool
-from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
-from langchain_classic.chains import LLMChain
-from langchain.agents import create_agent
 from langchain.messages import SystemMessage, HumanMessage
-from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.runnables import RunnableConfig
-from langchain_core.output_parsers import PydanticOutputParser
 
-import os
-import re
-from vector_stores.vector_helper import VectorHelper
-from schemas.rag_tool_parameters import PatientSearchInput
 import constants
-from tools.rag_tool import rag_patient_retrieval
+from caching.llm_cache import get_llm_cache
+from instrumentation.langchain_callback import metrics_callbacks
+from instrumentation.metrics import stage
+from tools.rag_tool import rag_patient_retrieval, retrieve_patient_context, retrieve_patient_context_multi
 
-from dotenv import load_dotenv
-load_dotenv()
+
+@lru_cache(maxsize=256)
+def build_search_query(user_query: str) -> str:
+    """Deterministic, cached stand-in for the LLM query rewrite."""
+    return constants.RETRIEVAL_QUERY_TEMPLATE.format(user_query=" ".join(user_query.split()))
+
+
+def build_search_queries(user_query: str) -> Tuple[str, ...]:
+    """The templated query plus the per-category RETRIEVAL_MULTI_QUERIES."""
+    return (build_search_query(user_query), *constants.RETRIEVAL_MULTI_QUERIES)
 
 
 class RetrievalAgent:
@@ -27,12 +30,12 @@ class RetrievalAgent:
     """
     def __init__(self, tag_name) -> None:
         self.tag_name = tag_name
-        self.vectorstore = VectorHelper()
         self.rag_llm = ChatOpenAI(
             model=constants.RETRIEVAL_MODEL_ID,
             base_url=constants.OLLAMA_MODEL_BASE_URL,  # Ollama endpoint
             api_key="ollama",
             temperature=0.3,
+            cache=get_llm_cache(),
         )
         self.tools = []
         self.agent_system_prompt = SystemMessage(
@@ -50,17 +53,58 @@ class RetrievalAgent:
             The tool output will be returned directly.
             """
         )
-        self.rag_agent = create_agent(
-            model=self.rag_llm,          # normal llama3.2
-            tools=self.get_tools(),
-            system_prompt=self.agent_system_prompt,
-        )
+        self._rag_agent = None
+
+    @property
+    def rag_agent(self):
+        # Only built when agent mode is actually used.
+        if self._rag_agent is None:
+            # langchain.agents pulls in langgraph; only import it when needed.
+            from langchain.agents import create_agent
+
+            self._rag_agent = create_agent(
+                model=self.rag_llm,          # normal llama3.2
+                tools=self.get_tools(),
+                system_prompt=self.agent_system_prompt,
+            )
+        return self._rag_agent
     
+    @property
+    def vectorstore(self):
+        """The shared VectorHelper (loaded on first access)."""
+        from vector_stores.registry import get_vector_helper
+
+        return get_vector_helper()
+
     def get_tools(self):
         self.tools.append(rag_patient_retrieval)
         return self.tools
     
-    def run_retrieval_agent(self, user_query: str, file_path: str) -> str:
+    def run_retrieval_agent(self, user_query: str, file_path: str, mode: Optional[str] = None) -> str:
+        """
+        Retrieve patient context for user_query from the document at file_path.
+
+        mode:
+            - "agent": llama3.2 rewrites the query and calls patient_document_search
+            - "direct": the query is rewritten from RETRIEVAL_QUERY_TEMPLATE and searched directly
+            - "raw": user_query is searched as-is
+            - "multi": the templated query and RETRIEVAL_MULTI_QUERIES are searched
+              in one batch and their results fused
+        Defaults to constants.RETRIEVAL_MODE.
+        """
+        mode = mode or constants.RETRIEVAL_MODE
+        if mode not in constants.RETRIEVAL_MODES:
+            raise ValueError(f"mode must be one of {constants.RETRIEVAL_MODES}")
+        with stage("retrieval", mode=mode):
+            if mode == "direct":
+                return retrieve_patient_context(build_search_query(user_query), file_path)
+            if mode == "raw":
+                return retrieve_patient_context(" ".join(user_query.split()), file_path)
+            if mode == "multi":
+                return retrieve_patient_context_multi(list(build_search_queries(user_query)), file_path)
+            return self._invoke_agent(user_query, file_path)
+
+    def _invoke_agent(self, user_query: str, file_path: str) -> str:
         result = self.rag_agent.invoke(
             {
                 "messages": [
@@ -73,9 +117,37 @@ class RetrievalAgent:
                 ]
             },
             config=RunnableConfig(
-                tags=[f"doc:{self.tag_name}"]
+                tags=[f"doc:{self.tag_name}"],
+                callbacks=metrics_callbacks(),
             )
         )
 
         # Last message MUST be tool output (string)
+        return result["messages"][-1].content
+
+    async def arun_retrieval_agent(self, user_query: str, file_path: str, mode: Optional[str] = None) -> str:
+        """Async variant of run_retrieval_agent; agent mode uses ainvoke."""
+        mode = mode or constants.RETRIEVAL_MODE
+        if mode != "agent":
+            return await asyncio.to_thread(self.run_retrieval_agent, user_query, file_path, mode)
+        with stage("retrieval", mode=mode):
+            return await self._ainvoke_agent(user_query, file_path)
+
+    async def _ainvoke_agent(self, user_query: str, file_path: str) -> str:
+        result = await self.rag_agent.ainvoke(
+            {
+                "messages": [
+                    HumanMessage(
+                        content=f"""
+                        User question: {user_query}
+                        file_path: {file_path}
+                        """
+                    )
+                ]
+            },
+            config=RunnableConfig(
+                tags=[f"doc:{self.tag_name}"],
+                callbacks=metrics_callbacks(),
+            )
+        )
         return result["messages"][-1].content
\ No newline at end of file
@@ -1,28 +1,88 @@
 from __future__ import annotations
 
-from typing import Any, Dict
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
 
-from dotenv import load_dotenv
-from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnableConfig
 from langchain_openai import ChatOpenAI
 
 import constants
+from caching.disk_store import SQLiteCacheStore
+from caching.llm_cache import get_llm_cache
+from instrumentation.langchain_callback import metrics_callbacks
+from instrumentation.metrics import stage
+from chains.context_budgeter import approx_token_count
+from chains.json_stream_parser import RepairingJsonOutputParser
 
-load_dotenv()
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_DATE_RE = re.compile(r"^\d{2}-\d{2}-\d{4}$")
+_STOPWORDS = {"a", "an", "and", "of", "the", "to", "in", "on", "for", "with", "due", "or", "by", "at"}
+
+
+def _evidence_tokens(text: str) -> set:
+    return {word for word in _WORD_RE.findall((text or "").lower()) if word not in _STOPWORDS}
+
+
+def split_evidence_chunks(patient_context: str, max_chars: int = 600) -> List[str]:
+    """Split packed patient context into small evidence chunks."""
+    chunks = []
+    for block in patient_context.split("\n\n"):
+        block = block.strip()
+        for start in range(0, len(block), max_chars):
+            chunks.append(block[start:start + max_chars])
+    return [chunk for chunk in chunks if chunk]
+
+
+def find_evidence(condition: Dict[str, Any], chunks: List[str], top_n: int = 3) -> Tuple[float, List[str]]:
+    """
+    Lexical evidence check for one condition.
+
+    Returns (coverage, supporting_chunks) where coverage is the best fraction of
+    the condition name's words found in a single chunk.
+    """
+    key_tokens = _evidence_tokens(condition.get("key", ""))
+    value_tokens = _evidence_tokens(condition.get("value", ""))
+    if not key_tokens:
+        return 0.0, []
+    scored = []
+    for chunk in chunks:
+        chunk_tokens = _evidence_tokens(chunk)
+        coverage = len(key_tokens & chunk_tokens) / len(key_tokens)
+        # Value words only break ties between chunks that match the name equally well.
+        tie_break = len(value_tokens & chunk_tokens) / len(value_tokens) if value_tokens else 0.0
+        scored.append((coverage, tie_break, chunk))
+    scored.sort(key=lambda item: (item[0], item[1]), reverse=True)
+    best = scored[0][0] if scored else 0.0
+    return best, [chunk for coverage, _, chunk in scored[:top_n] if coverage > 0]
+
+
+def structural_issues(condition: Dict[str, Any]) -> List[str]:
+    """Format problems that do not need an LLM to spot."""
+    issues = []
+    for field in ("start_date", "end_date"):
+        value = (condition.get(field) or "").strip()
+        if value and not _DATE_RE.match(value):
+            issues.append(f"{field} '{value}' is not MM-DD-YYYY")
+    if (condition.get("status") or "").strip().lower() not in ("ongoing", "cleaned up"):
+        issues.append(f"status '{condition.get('status')}' is not ongoing/cleaned up")
+    return issues
 
 
 class ReviewerAgent:
     def __init__(self, tag_name: str) -> None:
         self.tag_name = tag_name
-        self.parser = JsonOutputParser()
+        self.parser = RepairingJsonOutputParser()
         self.llm = ChatOpenAI(
             model=constants.OLLAMA_MODEL_ID,
             base_url=constants.OLLAMA_MODEL_BASE_URL,
             api_key="ollama",
             temperature=0.2,
             max_tokens=600,
+            cache=get_llm_cache(),
             model_kwargs={"response_format": {"type": "json_object"}},
         )
 
@@ -62,13 +122,171 @@ Task output JSON:
 
         self.review_prompt = ChatPromptTemplate.from_template(self.prompt_template)
 
+        # Used by review_incremental, which sends one condition at a time with
+        # only its evidence, so it must not ask for missing conditions.
+        self.condition_prompt_template = """
+You are a clinical QA reviewer (reflexion agent).
+
+You will be given:
+- Task prompt
+- Evidence excerpts from the patient context
+- ONE condition (JSON) produced by another model for that task
+
+Your job is to evaluate whether this single condition is correct and supported by the evidence.
+
+Checks:
+- The condition must be supported by explicit evidence in the excerpts. If not, flag it.
+- Dates must be in MM-DD-YYYY. If unknown, the model should not invent exact dates; it can flag as missing/unclear.
+- status must be either ongoing or cleaned up; flag inconsistencies.
+- Do NOT flag other conditions that are missing; only this condition is being reviewed.
+
+Output JSON STRICTLY in this format:
+{{
+  "verdict": "ok" | "needs_fix",
+  "comment": "1-2 short lines with the review"
+}}
+
+Be concise. Do not include any extra keys or text.
+
+Task prompt:
+{task_prompt}
+
+Evidence:
+{patient_context}
+
+Condition JSON:
+{task_output}
+"""
+
+        self.condition_prompt = ChatPromptTemplate.from_template(self.condition_prompt_template)
+        self._verdict_store: Optional[SQLiteCacheStore] = None
+
+    @property
+    def verdict_store(self) -> SQLiteCacheStore:
+        if self._verdict_store is None:
+            self._verdict_store = SQLiteCacheStore(
+                os.path.join(constants.LLM_CACHE_DIR, "review_verdicts.sqlite"),
+                max_bytes=constants.REVIEW_VERDICT_CACHE_MAX_BYTES,
+            )
+        return self._verdict_store
+
+    def _verdict_key(self, task_prompt: str, condition: Dict[str, Any], evidence: List[str]) -> str:
+        payload = json.dumps(
+            [constants.OLLAMA_MODEL_ID, self.condition_prompt_template, task_prompt, condition, evidence],
+            sort_keys=True,
+            default=str,
+        )
+        return "review:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
     def review(self, task_prompt: str, patient_context: str, task_output: Any) -> Dict[str, str]:
         chain = self.review_prompt | self.llm | self.parser
-        return chain.invoke(
-            {
-                "task_prompt": task_prompt,
-                "patient_context": patient_context,
-                "task_output": task_output,
-            },
-            config=RunnableConfig(tags=[f"doc:{self.tag_name}"]),
-        )
+        with stage("review"):
+            return chain.invoke(
+                {
+                    "task_prompt": task_prompt,
+                    "patient_context": patient_context,
+                    "task_output": task_output,
+                },
+                config=RunnableConfig(tags=[f"doc:{self.tag_name}"], callbacks=metrics_callbacks()),
+            )
+
+    async def areview(self, task_prompt: str, patient_context: str, task_output: Any) -> Dict[str, str]:
+        chain = self.review_prompt | self.llm | self.parser
+        with stage("review"):
+            return await chain.ainvoke(
+                {
+                    "task_prompt": task_prompt,
+                    "patient_context": patient_context,
+                    "task_output": task_output,
+                },
+                config=RunnableConfig(tags=[f"doc:{self.tag_name}"], callbacks=metrics_callbacks()),
+            )
+
+    def review_incremental(
+        self,
+        task_prompt: str,
+        patient_context: str,
+        task_output: Any,
+        chunks: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Review only the conditions that a cheap local check cannot confirm.
+
+        Each condition is first matched lexically against the evidence chunks.
+        Conditions whose name is found there are accepted without an LLM call.
+        The rest are sent one by one with just their best supporting chunks,
+        and valid verdicts are cached per (task prompt, condition, evidence)
+        across reruns; a malformed reply flags the condition but is not cached.
+        Unlike review(), this does not look for conditions missing from the output.
+        """
+        with stage("review_incremental") as fields:
+            result = self._review_incremental(task_prompt, patient_context, task_output, chunks)
+            fields.update(flagged=len(result["flagged"]), llm_checked=result["llm_checked"])
+        return result
+
+    def _review_incremental(
+        self,
+        task_prompt: str,
+        patient_context: str,
+        task_output: Any,
+        chunks: Optional[List[str]],
+    ) -> Dict[str, Any]:
+        conditions = (task_output or {}).get("major_conditions") or []
+        chunks = chunks if chunks is not None else split_evidence_chunks(patient_context)
+
+        comments = []
+        flagged = []
+        to_check = []
+        for condition in conditions:
+            if not isinstance(condition, dict):
+                continue
+            for issue in structural_issues(condition):
+                comments.append(f"{condition.get('key', '?')}: {issue}")
+                flagged.append(condition.get("key", ""))
+            coverage, evidence = find_evidence(condition, chunks, constants.REVIEW_EVIDENCE_CHUNKS)
+            if coverage >= constants.REVIEW_EVIDENCE_THRESHOLD:
+                continue
+            key = self._verdict_key(task_prompt, condition, evidence)
+            cached = self.verdict_store.get(key)
+            if cached is not None:
+                verdict = json.loads(cached)
+            else:
+                to_check.append((key, condition, evidence))
+                continue
+            if verdict.get("verdict") != "ok":
+                flagged.append(condition.get("key", ""))
+                comments.append(f"{condition.get('key', '?')}: {verdict.get('comment', '')}")
+
+        if to_check:
+            chain = self.condition_prompt | self.llm | self.parser
+            verdicts = chain.batch(
+                [
+                    {
+                        "task_prompt": task_prompt,
+                        "patient_context": "\n\n".join(evidence) or "(no matching evidence found)",
+                        "task_output": json.dumps(condition),
+                    }
+                    for _, condition, evidence in to_check
+                ],
+                config=RunnableConfig(tags=[f"doc:{self.tag_name}"], callbacks=metrics_callbacks()),
+                return_exceptions=True,
+            )
+            for (key, condition, _), verdict in zip(to_check, verdicts):
+                if isinstance(verdict, dict) and verdict.get("verdict") in ("ok", "needs_fix"):
+                    self.verdict_store.set(key, json.dumps(verdict).encode("utf-8"))
+                else:
+                    verdict = {"verdict": "needs_fix", "comment": "the reviewer returned no valid verdict"}
+                if verdict.get("verdict") != "ok":
+                    flagged.append(condition.get("key", ""))
+                    comments.append(f"{condition.get('key', '?')}: {verdict.get('comment', '')}")
+
+        return {
+            "verdict": "needs_fix" if flagged else "ok",
+            "comment": "\n".join(comments) if comments else "All conditions are supported by the patient context.",
+            "flagged": sorted(set(flagged)),
+            "llm_checked": len(to_check),
+            # Estimated tokens of evidence and conditions sent to the LLM.
+            "evidence_tokens": sum(
+                approx_token_count("\n\n".join(evidence) + json.dumps(condition)) for _, condition, evidence in to_check
+            ),
+        }
@@ -1,9 +1,15 @@
+from dotenv import load_dotenv
+
 from agents.retrieval_agent import RetrievalAgent
 from agents.reviewer_agent import ReviewerAgent
 from chains.fetch_diagnosis_chain import FetchDiagnosisChain
+from chains.reflexion_loop import ReflexionLoop
+from instrumentation.metrics import get_recorder
 from utils import Utils
+import constants
 
 def main():
+    load_dotenv()
     retrieval_agent = RetrievalAgent(tag_name="agentic")
     reviewer_agent = ReviewerAgent(tag_name="agentic")
     diagnosis_chain = FetchDiagnosisChain(tag_name="agentic")
@@ -11,9 +17,7 @@ def main():
     
     file_path = "data/pdf/Document 12 Leonard Asthma (1).pdf"
     context_file_path = "data/retrieved_contexts/leonardo_txt_context.txt"
-    user_query = """
-    Extract a list of all major or chronic medical conditions mentioned in the given patient infromations and need to find dates of the medical conditions from when it detected and calculate the proper dates in formats and from when it was cleaned up or still it is on going.
-    """
+    user_query = constants.DIAGNOSIS_USER_QUERY
 
     # 1. Retrieval Pipeline using Agent tool calls
     patient_info = retrieval_agent.run_retrieval_agent(user_query, file_path)
@@ -175,16 +179,20 @@ def main():
     #     ]
     # }
 
-    # 3. Reviewer (Reflexion) Agent
-    review = reviewer_agent.review(
-        task_prompt=diagnosis_chain.prompt_template,
-        patient_context=patient_info.strip(),
-        task_output=result,
-    )
+    # 3. Reviewer (Reflexion) loop: review, repair flagged conditions, stop on "ok" or budget
+    reflexion = ReflexionLoop(diagnosis_chain, reviewer_agent).run(patient_info.strip(), result=result)
+    result = reflexion["result"]
+    review = reflexion["review"]
+    print("======= Final Task Result =======")
+    print(result)
+    print(f"Stopped after {len(reflexion['iterations'])} iterations: {reflexion['stop_reason']}")
     print("======= Reviewer Comment =======")
     print(f"Comment: {review.get('comment', '')}")
     print(f"Verdict: {review.get('verdict', '')}")
     print("===================================")
+    print("======= Stage Timings =======")
+    print(get_recorder().format_summary())
+    get_recorder().export()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,207 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from agents.retrieval_agent import RetrievalAgent, build_search_queries, build_search_query
+from agents.reviewer_agent import ReviewerAgent
+from chains.fetch_diagnosis_chain import FetchDiagnosisChain
+from instrumentation.metrics import get_recorder, stage
+from tools.rag_tool import retrieve_patient_context_by_vector, retrieve_patient_context_by_vectors
+from vector_stores.embedding_backends import embed_queries
+from vector_stores.registry import get_vector_helper
+import constants
+
+
+def load_manifest(manifest_path: str) -> List[Dict[str, Any]]:
+    """
+    Read a manifest of documents to process.
+
+    Either JSON lines ({"file_path": ..., "user_query": ...}, user_query optional)
+    or one file path per line. Blank lines and # comments are ignored.
+    """
+    entries = []
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for raw_line in f:
+            line = raw_line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = json.loads(line) if line.startswith("{") else {"file_path": line}
+            entry.setdefault("user_query", constants.DIAGNOSIS_USER_QUERY)
+            entries.append(entry)
+    return entries
+
+
+class BatchRunner:
+    """
+    Runs retrieval -> diagnosis -> review for many documents concurrently.
+
+    Each document moves through the stages on its own, so one document can be
+    under review while another is still being retrieved. The Ollama endpoint,
+    the embedding model and Postgres each have their own concurrency limit.
+    Results are written per document as soon as they complete; documents with
+    a finished result file are skipped, so a crashed run can simply be restarted.
+    """
+    def __init__(
+        self,
+        output_dir: str = constants.BATCH_OUTPUT_DIR,
+        retrieval_mode: str = "direct",
+        llm_concurrency: int = constants.BATCH_LLM_CONCURRENCY,
+        embed_concurrency: int = constants.BATCH_EMBED_CONCURRENCY,
+        db_concurrency: int = constants.BATCH_DB_CONCURRENCY,
+        tag_name: str = "batch",
+    ) -> None:
+        self.output_dir = Path(output_dir)
+        self.retrieval_mode = retrieval_mode
+        self.llm_concurrency = llm_concurrency
+        self.embed_concurrency = embed_concurrency
+        self.db_concurrency = db_concurrency
+        self.retrieval_agent = RetrievalAgent(tag_name=tag_name)
+        self.diagnosis_chain = FetchDiagnosisChain(tag_name=tag_name)
+        self.reviewer_agent = ReviewerAgent(tag_name=tag_name)
+
+    def result_path(self, file_path: str) -> Path:
+        digest = hashlib.sha1(file_path.encode("utf-8")).hexdigest()[:12]
+        return self.output_dir / f"{Path(file_path).stem}-{digest}.json"
+
+    def is_done(self, file_path: str) -> bool:
+        path = self.result_path(file_path)
+        if not path.exists():
+            return False
+        try:
+            return json.loads(path.read_text(encoding="utf-8")).get("status") == "done"
+        except (OSError, ValueError):
+            return False
+
+    def write_result(self, file_path: str, result: Dict[str, Any]) -> None:
+        # Write then rename, so a crash never leaves a half-written "done" file behind.
+        path = self.result_path(file_path)
+        tmp_path = path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(result, indent=2, default=str), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    async def retrieve(self, user_query: str, file_path: str) -> str:
+        if self.retrieval_mode == "agent":
+            async with self.llm_semaphore:
+                return await self.retrieval_agent.arun_retrieval_agent(user_query, file_path, mode="agent")
+
+        # The first call loads the embedding model; keep that off the event loop.
+        embeddings = (await asyncio.to_thread(get_vector_helper)).embeddings
+        if self.retrieval_mode == "multi":
+            queries = list(build_search_queries(user_query))
+            with stage("retrieval", mode=self.retrieval_mode):
+                async with self.embed_semaphore:
+                    with stage("embed", queries=len(queries)):
+                        vectors = await asyncio.to_thread(embed_queries, embeddings, queries)
+                async with self.db_semaphore:
+                    return await asyncio.to_thread(retrieve_patient_context_by_vectors, queries, vectors, file_path)
+
+        query = build_search_query(user_query) if self.retrieval_mode == "direct" else " ".join(user_query.split())
+        with stage("retrieval", mode=self.retrieval_mode):
+            async with self.embed_semaphore:
+                with stage("embed"):
+                    embedding = await asyncio.to_thread(embeddings.embed_query, query)
+            async with self.db_semaphore:
+                return await asyncio.to_thread(retrieve_patient_context_by_vector, embedding, file_path, query)
+
+    async def process_document(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        file_path = entry["file_path"]
+        timings = {}
+        result: Dict[str, Any] = {"file_path": file_path, "status": "error"}
+        started = time.perf_counter()
+        try:
+            stage_started = time.perf_counter()
+            patient_info = (await self.retrieve(entry["user_query"], file_path)).strip()
+            timings["retrieval"] = time.perf_counter() - stage_started
+            result["patient_info"] = patient_info
+
+            stage_started = time.perf_counter()
+            # Acquires the LLM semaphore per call, so map_reduce windows count against it too.
+            diagnosis = await self.diagnosis_chain.arun_task_chain(patient_info, llm_semaphore=self.llm_semaphore)
+            timings["diagnosis"] = time.perf_counter() - stage_started
+            result["result"] = diagnosis
+
+            stage_started = time.perf_counter()
+            async with self.llm_semaphore:
+                review = await self.reviewer_agent.areview(
+                    task_prompt=self.diagnosis_chain.prompt_template,
+                    patient_context=patient_info,
+                    task_output=diagnosis,
+                )
+            timings["review"] = time.perf_counter() - stage_started
+            result["review"] = review
+            result["status"] = "done"
+        except Exception as exc:
+            result["error"] = f"{type(exc).__name__}: {exc}"
+
+        timings["total"] = time.perf_counter() - started
+        result["timings"] = timings
+        result["completed_at"] = datetime.now().isoformat()
+        try:
+            await asyncio.to_thread(self.write_result, file_path, result)
+        except Exception as exc:
+            # Not saved, so it is not done: the next run picks it up again.
+            result["status"] = "error"
+            result["error"] = f"could not write result: {type(exc).__name__}: {exc}"
+        print(f"[{result['status']}] {file_path} in {timings['total']:.1f}s")
+        return result
+
+    async def run(self, entries: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Process every manifest entry that does not have a finished result yet."""
+        # Semaphores are created here so they belong to the running event loop.
+        self.llm_semaphore = asyncio.Semaphore(self.llm_concurrency)
+        self.embed_semaphore = asyncio.Semaphore(self.embed_concurrency)
+        self.db_semaphore = asyncio.Semaphore(self.db_concurrency)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        pending = [entry for entry in entries if not self.is_done(entry["file_path"])]
+        skipped = len(entries) - len(pending)
+        if skipped:
+            print(f"Skipping {skipped} documents with finished results.")
+
+        # One document failing in an unexpected place must not abort the others.
+        results = await asyncio.gather(
+            *(self.process_document(entry) for entry in pending), return_exceptions=True
+        )
+        for entry, result in zip(pending, results):
+            if isinstance(result, BaseException):
+                print(f"[error] {entry['file_path']}: {type(result).__name__}: {result}")
+        done = sum(1 for result in results if isinstance(result, dict) and result["status"] == "done")
+        return {"done": done, "failed": len(results) - done, "skipped": skipped}
+
+
+def main(argv: Optional[List[str]] = None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Run retrieval, diagnosis and review over a manifest of documents.")
+    parser.add_argument("manifest", help="JSONL or one-path-per-line manifest")
+    parser.add_argument("--output-dir", default=constants.BATCH_OUTPUT_DIR)
+    parser.add_argument("--retrieval-mode", choices=constants.RETRIEVAL_MODES, default="direct")
+    parser.add_argument("--llm-concurrency", type=int, default=constants.BATCH_LLM_CONCURRENCY)
+    parser.add_argument("--embed-concurrency", type=int, default=constants.BATCH_EMBED_CONCURRENCY)
+    parser.add_argument("--db-concurrency", type=int, default=constants.BATCH_DB_CONCURRENCY)
+    args = parser.parse_args(argv)
+
+    runner = BatchRunner(
+        output_dir=args.output_dir,
+        retrieval_mode=args.retrieval_mode,
+        llm_concurrency=args.llm_concurrency,
+        embed_concurrency=args.embed_concurrency,
+        db_concurrency=args.db_concurrency,
+    )
+    summary = asyncio.run(runner.run(load_manifest(args.manifest)))
+    print(summary)
+    print(get_recorder().format_summary())
+    get_recorder().export()
+    if summary["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Check that a (quantized) embedding backend retrieves as well as the fp32 torch model.
+
+Chunks the sample corpus the way ingestion does and embeds it with both
+models. Two kinds of queries are then searched exhaustively by cosine:
+
+- probes: the middle third of sampled chunks, whose correct answer is the
+  chunk they were cut from (recall@k is measured against that);
+- the benchmark search queries, compared only by top-k overlap with fp32.
+
+Exits with status 1 if the candidate's probe recall@k is more than
+--tolerance below the fp32 model's:
+
+    python -m benchmarks.embedding_recall --backend onnx --quantization int8
+    python -m benchmarks.embedding_recall --backend openvino --quantization int8 --threads 4
+"""
+import argparse
+import json
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+import constants
+from benchmarks.run_benchmarks import SEARCH_QUERIES
+from vector_stores.embedding_backends import EMBEDDING_BACKENDS, create_embeddings
+from vector_stores.ingestion_helper import SUPPORTED_EXTENSIONS, extract_text
+
+
+def load_chunks(corpus: str, max_chunks: Optional[int]) -> List[str]:
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=constants.INGEST_CHUNK_SIZE,
+        chunk_overlap=constants.INGEST_CHUNK_OVERLAP,
+        separators=["\n\n", "\n", " ", ". "],
+    )
+    chunks = []
+    for root, _, names in sorted(os.walk(corpus)):
+        for name in sorted(names):
+            if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                text = extract_text(os.path.join(root, name))
+                chunks.extend(chunk for chunk in splitter.split_text(text) if chunk.strip())
+    return chunks[:max_chunks] if max_chunks else chunks
+
+
+def make_probes(chunks: List[str], count: int, seed: int) -> List[Dict[str, Any]]:
+    """Middle third of randomly picked chunks, with the index of the chunk each came from."""
+    rng = random.Random(seed)
+    candidates = [index for index, chunk in enumerate(chunks) if len(chunk.split()) >= 30]
+    probes = []
+    for index in rng.sample(candidates, min(count, len(candidates))):
+        words = chunks[index].split()
+        third = len(words) // 3
+        probes.append({"text": " ".join(words[third:2 * third]), "target": index})
+    return probes
+
+
+def normalized(vectors: List[List[float]]) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def top_k(queries: np.ndarray, corpus: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ corpus.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def evaluate(embeddings, chunks: List[str], probes: List[Dict[str, Any]], k: int) -> Dict[str, Any]:
+    started = time.perf_counter()
+    corpus = normalized(embeddings.embed_documents(chunks))
+    embed_seconds = time.perf_counter() - started
+
+    probe_vectors = normalized([embeddings.embed_query(probe["text"]) for probe in probes])
+    query_vectors = normalized([embeddings.embed_query(query) for query in SEARCH_QUERIES])
+    probe_hits = top_k(probe_vectors, corpus, k)
+    recall = float(np.mean([probe["target"] in row for probe, row in zip(probes, probe_hits)]))
+    return {
+        "embed_seconds": embed_seconds,
+        "chunks_per_s": len(chunks) / embed_seconds if embed_seconds else 0.0,
+        f"probe_recall@{k}": recall,
+        "probe_hits": probe_hits,
+        "query_hits": top_k(query_vectors, corpus, k),
+    }
+
+
+def overlap(reference: np.ndarray, candidate: np.ndarray) -> float:
+    """Mean share of the reference top-k also returned by the candidate."""
+    k = reference.shape[1]
+    return float(np.mean([len(set(ref) & set(cand)) / k for ref, cand in zip(reference, candidate)]))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Compare retrieval recall of an embedding backend with fp32 torch.")
+    parser.add_argument("--corpus", default="data")
+    parser.add_argument("--model", default=constants.EMBEDDING_MODEL_NAME)
+    parser.add_argument("--backend", choices=EMBEDDING_BACKENDS, default="onnx")
+    parser.add_argument("--quantization", choices=("none", "int8"), default="int8")
+    parser.add_argument("--batch-size", type=int, default=constants.EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=constants.EMBEDDING_THREADS)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--max-chunks", type=int, default=None, help="only use the first N chunks of the corpus")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="allowed drop in probe recall@k")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    chunks = load_chunks(args.corpus, args.max_chunks)
+    probes = make_probes(chunks, args.probes, args.seed)
+    if not probes:
+        parser.error(f"no chunks long enough to probe under {args.corpus}")
+    quantization = None if args.quantization == "none" else args.quantization
+
+    reference = evaluate(
+        create_embeddings(args.model, "torch", None, args.batch_size, args.threads), chunks, probes, args.k
+    )
+    candidate = evaluate(
+        create_embeddings(args.model, args.backend, quantization, args.batch_size, args.threads),
+        chunks, probes, args.k,
+    )
+
+    recall_key = f"probe_recall@{args.k}"
+    drop = reference[recall_key] - candidate[recall_key]
+    report = {
+        "model": args.model,
+        "candidate": f"{args.backend}/{quantization or 'fp32'}",
+        "chunks": len(chunks),
+        "probes": len(probes),
+        "fp32": {key: value for key, value in reference.items() if not key.endswith("_hits")},
+        "candidate_metrics": {key: value for key, value in candidate.items() if not key.endswith("_hits")},
+        f"probe_overlap@{args.k}": overlap(reference["probe_hits"], candidate["probe_hits"]),
+        f"query_overlap@{args.k}": overlap(reference["query_hits"], candidate["query_hits"]),
+        "recall_drop": drop,
+        "speedup": reference["embed_seconds"] / candidate["embed_seconds"] if candidate["embed_seconds"] else 0.0,
+        "passed": drop <= args.tolerance,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if not report["passed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
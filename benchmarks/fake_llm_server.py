@@ -0,0 +1,225 @@
+"""
+Minimal OpenAI-compatible chat completions server that replays canned responses.
+
+Stands in for Ollama in benchmarks: /v1/chat/completions answers with a fixed
+response picked by matching the prompt, after a configurable delay, with or
+without SSE streaming. Run standalone with `python -m benchmarks.fake_llm_server`.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+
+DIAGNOSIS_RESPONSE = json.dumps({
+    "major_conditions": [
+        {"key": "Asthma", "value": "Persistent asthma treated with inhaled corticosteroids", "start_date": "03-14-2012", "end_date": "", "status": "ongoing"},
+        {"key": "Hypertension", "value": "Elevated blood pressure on repeated visits", "start_date": "06-02-2016", "end_date": "", "status": "ongoing"},
+        {"key": "Pneumonia", "value": "Community acquired pneumonia, resolved with antibiotics", "start_date": "01-10-2019", "end_date": "02-01-2019", "status": "cleaned up"},
+    ]
+})
+REVIEW_RESPONSE = json.dumps({
+    "verdict": "ok",
+    "comment": "All listed conditions are supported by the context. Dates follow MM-DD-YYYY.",
+})
+
+# (substring of the prompt, response); the first match wins, the last entry is the default.
+DEFAULT_RESPONSES: List[Tuple[str, str]] = [
+    ("clinical QA reviewer", REVIEW_RESPONSE),
+    ("major_conditions", DIAGNOSIS_RESPONSE),
+    ("", "Patient medical history, diagnoses and chronic conditions."),
+]
+
+_TOKEN_RE = re.compile(r"\S+\s*|\s+")
+
+
+class FakeLLMServer:
+    """
+    Threaded fake LLM server.
+
+    delay is the time to first token and token_delay the time between streamed
+    tokens; a non-streaming reply waits for delay plus token_delay per token,
+    so both modes take about as long as a real model with the same speed.
+    """
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        delay: float = 0.0,
+        token_delay: float = 0.0,
+        responses: Optional[List[Tuple[str, str]]] = None,
+    ) -> None:
+        self.delay = delay
+        self.token_delay = token_delay
+        self.responses = responses or DEFAULT_RESPONSES
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def pick_response(self, prompt: str) -> str:
+        for needle, response in self.responses:
+            if needle in prompt:
+                return response
+        return self.responses[-1][1]
+
+    def start(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "FakeLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: dict) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/models"):
+                    self._send_json(200, {"object": "list", "data": [{"id": "fake", "object": "model"}]})
+                else:
+                    self._send_json(404, {"error": {"message": "not found"}})
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.requests += 1
+
+                prompt = "\n".join(str(message.get("content") or "") for message in request.get("messages", []))
+                response = server.pick_response(prompt)
+                tokens = _TOKEN_RE.findall(response)
+                model = request.get("model", "fake")
+                completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+                usage = {
+                    "prompt_tokens": len(prompt) // 4,
+                    "completion_tokens": len(tokens),
+                    "total_tokens": len(prompt) // 4 + len(tokens),
+                }
+
+                time.sleep(server.delay)
+                if request.get("stream"):
+                    self._stream(completion_id, model, tokens, usage, request)
+                    return
+
+                time.sleep(server.token_delay * len(tokens))
+                self._send_json(200, {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": response},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": usage,
+                })
+
+            def _stream(self, completion_id, model, tokens, usage, request):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+
+                def send(choices, **extra):
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": choices,
+                        **extra,
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+
+                send([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+                for i, token in enumerate(tokens):
+                    if i:
+                        time.sleep(server.token_delay)
+                    send([{"index": 0, "delta": {"content": token}, "finish_reason": None}])
+                send([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+                if (request.get("stream_options") or {}).get("include_usage"):
+                    send([], usage=usage)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+
+def load_responses(path: str) -> List[Tuple[str, str]]:
+    """Read canned responses from a JSON list of {"match": ..., "response": ...} objects."""
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    responses = []
+    for entry in entries:
+        response = entry["response"]
+        if not isinstance(response, str):
+            response = json.dumps(response)
+        responses.append((entry.get("match", ""), response))
+    return responses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve canned OpenAI-compatible chat completions.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between tokens")
+    parser.add_argument("--responses", help='JSON list of {"match": ..., "response": ...}')
+    args = parser.parse_args()
+
+    server = FakeLLMServer(
+        host=args.host,
+        port=args.port,
+        delay=args.delay,
+        token_delay=args.token_delay,
+        responses=load_responses(args.responses) if args.responses else None,
+    )
+    print(f"Fake LLM server listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Benchmarks for ingest, embeddings, vector search and the full pipeline.
+
+Runs against the sample corpus in data/ with the local FAISS backend and the
+fake LLM server, so it needs neither Postgres nor Ollama:
+
+    python -m benchmarks.run_benchmarks --output bench.json
+    python -m benchmarks.run_benchmarks --embeddings hash --stages search,e2e
+
+LLM and embedding caches are switched off so every run does the real work.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import statistics
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+import constants
+from benchmarks.fake_llm_server import FakeLLMServer
+
+STAGES = ("ingest", "embed", "search", "e2e")
+
+SEARCH_QUERIES = [
+    "Patient medical history, diagnoses, chronic conditions and their dates",
+    "asthma inhaler prescription",
+    "blood pressure hypertension medication",
+    "allergies and adverse drug reactions",
+    "hospital admission discharge summary",
+    "laboratory results abnormal values",
+    "surgical history and procedures",
+    "family history of heart disease",
+]
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic hashed bag-of-words embeddings.
+
+    No model download and nearly free to compute, for measuring search and
+    pipeline overhead on their own. Not meant for retrieval quality.
+    """
+    def __init__(self, dimension: int = 384) -> None:
+        self.dimension = dimension
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimension
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimension
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean/max of latency samples (seconds) in milliseconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        position = (len(ordered) - 1) * q
+        low, high = math.floor(position), math.ceil(position)
+        return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+    return {
+        "count": len(ordered),
+        "p50_ms": pick(0.50) * 1000,
+        "p95_ms": pick(0.95) * 1000,
+        "p99_ms": pick(0.99) * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def timed(fn: Callable[[], Any]) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def configure(workdir: str, embeddings_kind: str):
+    """Point constants at the local backend and build the shared VectorHelper."""
+    constants.VECTOR_BACKEND = "faiss"
+    constants.FAISS_INDEX_DIR = os.path.join(workdir, "faiss_index")
+    constants.LLM_CACHE_ENABLED = False
+    constants.EMBEDDING_CACHE_ENABLED = False
+    constants.WORKING_SET_ENABLED = False
+
+    from vector_stores import registry
+
+    registry.reset()
+    if embeddings_kind == "hash":
+        registry.install(embeddings=HashEmbeddings())
+    return registry.get_vector_helper()
+
+
+def bench_ingest(helper, files: List[str]) -> Dict[str, Any]:
+    from vector_stores.ingestion_helper import IngestionHelper
+
+    ingestion = IngestionHelper(vector_helper=helper)
+    started = time.perf_counter()
+    ok, message = ingestion.ingest_files(files)
+    elapsed = time.perf_counter() - started
+    chunks = sum(len(helper.backend.source_chunk_hashes(path)) for path in files)
+    total_bytes = sum(os.path.getsize(path) for path in files)
+    return {
+        "ok": ok,
+        "message": message,
+        "documents": len(files),
+        "chunks": chunks,
+        "seconds": elapsed,
+        "chunks_per_s": chunks / elapsed if elapsed else 0.0,
+        "mb_per_s": total_bytes / 1e6 / elapsed if elapsed else 0.0,
+    }
+
+
+def bench_embeddings(helper, files: List[str], batch_sizes: List[int], samples: int) -> Dict[str, Any]:
+    texts = []
+    for path in files:
+        texts.extend(row[1] for row in helper.backend.source_embeddings(path))
+    texts = texts[:samples]
+    if not texts:
+        return {"error": "no chunks ingested"}
+
+    results = {"texts": len(texts), "batches": {}}
+    for batch_size in batch_sizes:
+        def run():
+            for start in range(0, len(texts), batch_size):
+                helper.embeddings.embed_documents(texts[start:start + batch_size])
+
+        elapsed = timed(run)
+        results["batches"][str(batch_size)] = {
+            "seconds": elapsed,
+            "texts_per_s": len(texts) / elapsed if elapsed else 0.0,
+        }
+    query_latencies = [timed(lambda q=query: helper.embeddings.embed_query(q)) for query in SEARCH_QUERIES]
+    results["embed_query"] = percentiles(query_latencies)
+    return results
+
+
+def bench_search(helper, files: List[str], repeats: int) -> Dict[str, Any]:
+    from tools.rag_tool import MAX_DISTANCE
+    from vector_stores.working_set import DocumentWorkingSet
+
+    embedded = [(query, helper.embeddings.embed_query(query)) for query in SEARCH_QUERIES]
+    cases = {
+        # Same call rag_patient_retrieval makes in dense mode.
+        "dense_source_filtered": lambda query, vector, path: list(helper.search_by_vector_with_score_threshold(
+            vector, k=constants.TOP_K, filter={"source": path}, max_score=MAX_DISTANCE
+        )),
+        "dense_top10": lambda query, vector, path: list(helper.search_by_vector_with_score_threshold(vector, k=10)),
+        "hybrid_source_filtered": lambda query, vector, path: helper.hybrid_search(
+            query, filter={"source": path}, embedding=vector
+        ),
+    }
+
+    results = {}
+    for name, case in cases.items():
+        latencies = []
+        for _ in range(repeats):
+            for query, vector in embedded:
+                for path in files:
+                    latencies.append(timed(lambda: case(query, vector, path)))
+        results[name] = percentiles(latencies)
+
+    # The same filtered search served from the in-memory working set.
+    previous = helper.working_set
+    helper.working_set = DocumentWorkingSet(helper.backend)
+    try:
+        latencies = []
+        for _ in range(repeats):
+            for query, vector in embedded:
+                for path in files:
+                    latencies.append(timed(lambda: cases["dense_source_filtered"](query, vector, path)))
+        results["working_set_source_filtered"] = percentiles(latencies)
+    finally:
+        helper.working_set = previous
+    return results
+
+
+def bench_end_to_end(files: List[str], workdir: str, concurrency: int) -> Dict[str, Any]:
+    from batch_runner import BatchRunner
+    from instrumentation.metrics import get_recorder
+
+    runner = BatchRunner(
+        output_dir=os.path.join(workdir, "batch_results"),
+        retrieval_mode="direct",
+        llm_concurrency=concurrency,
+    )
+    entries = [{"file_path": path, "user_query": constants.DIAGNOSIS_USER_QUERY} for path in files]
+    get_recorder().reset()
+    started = time.perf_counter()
+    summary = asyncio.run(runner.run(entries))
+    elapsed = time.perf_counter() - started
+
+    stages: Dict[str, List[float]] = {}
+    for path in files:
+        with open(runner.result_path(path), "r", encoding="utf-8") as f:
+            for stage, seconds in json.load(f).get("timings", {}).items():
+                stages.setdefault(stage, []).append(seconds)
+    return {
+        "summary": summary,
+        "seconds": elapsed,
+        "documents_per_s": len(files) / elapsed if elapsed else 0.0,
+        "stages": {stage: percentiles(samples) for stage, samples in stages.items()},
+        # Sub-stage breakdown (embed, search, prompt, llm, parse, ...) from the instrumentation.
+        "instrumented_stages": get_recorder().summary(),
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    def walk(node, indent=0):
+        for key, value in node.items():
+            if isinstance(value, dict):
+                print(" " * indent + f"{key}:")
+                walk(value, indent + 2)
+            else:
+                shown = f"{value:.2f}" if isinstance(value, float) else value
+                print(" " * indent + f"{key}: {shown}")
+
+    walk(report)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark ingest, embeddings, search and the full pipeline.")
+    parser.add_argument("--corpus", default="data", help="directory of PDF/DOCX/TXT documents")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"comma-separated subset of {', '.join(STAGES)}")
+    parser.add_argument("--embeddings", choices=("hf", "hash"), default="hf",
+                        help="hf: the real sentence-transformers model; hash: deterministic stand-in")
+    parser.add_argument("--embed-batch-sizes", default="16,64,256")
+    parser.add_argument("--embed-samples", type=int, default=512)
+    parser.add_argument("--search-repeats", type=int, default=20)
+    parser.add_argument("--llm-delay", type=float, default=0.05, help="fake LLM time to first token (s)")
+    parser.add_argument("--llm-token-delay", type=float, default=0.0, help="fake LLM time per token (s)")
+    parser.add_argument("--llm-concurrency", type=int, default=constants.BATCH_LLM_CONCURRENCY)
+    parser.add_argument("--workdir", help="where to build the index (default: a temporary directory)")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="reviewer-bench-")
+    server = FakeLLMServer(delay=args.llm_delay, token_delay=args.llm_token_delay).start()
+    constants.OLLAMA_MODEL_BASE_URL = server.base_url
+    try:
+        helper = configure(workdir, args.embeddings)
+        from vector_stores.ingestion_helper import IngestionHelper
+
+        files = IngestionHelper(vector_helper=helper).collect_files(args.corpus)
+        report: Dict[str, Any] = {
+            "config": {
+                "corpus": args.corpus,
+                "documents": len(files),
+                "embeddings": args.embeddings,
+                "backend": constants.VECTOR_BACKEND,
+                "llm_delay_s": args.llm_delay,
+                "llm_token_delay_s": args.llm_token_delay,
+            }
+        }
+
+        # Search, embedding and e2e stages all need the corpus in the index.
+        report["ingest"] = bench_ingest(helper, files)
+        if "embed" in stages:
+            batch_sizes = [int(size) for size in args.embed_batch_sizes.split(",")]
+            report["embed"] = bench_embeddings(helper, files, batch_sizes, args.embed_samples)
+        if "search" in stages:
+            report["search"] = bench_search(helper, files, args.search_repeats)
+        if "e2e" in stages:
+            report["e2e"] = bench_end_to_end(files, workdir, args.llm_concurrency)
+            report["e2e"]["llm_requests"] = server.requests
+    finally:
+        server.stop()
+        from vector_stores import registry
+
+        registry.reset()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
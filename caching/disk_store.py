@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class CacheStore:
+    """Minimal bytes key/value interface the caches are written against."""
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class SQLiteCacheStore(CacheStore):
+    """
+    On-disk cache store backed by a single SQLite file.
+
+    Entries are evicted least-recently-used first once the stored payload
+    exceeds max_bytes. With ttl_seconds set, older entries read as misses.
+    """
+    def __init__(self, path: str, max_bytes: int, ttl_seconds: Optional[float] = None) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._delete(key)
+                return None
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        now = time.time()
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._delete(key)
+            self._conn.execute(
+                "INSERT INTO entries (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._total_bytes = 0
+
+    def size_bytes(self) -> int:
+        return self._total_bytes
+
+    def _delete(self, key: str) -> None:
+        row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._total_bytes -= row[0]
+
+    def _evict(self) -> None:
+        # Drop the least recently used entries until we are back under ~90% of the cap,
+        # so a full cache does not evict on every single write.
+        target = int(self.max_bytes * 0.9)
+        cursor = self._conn.execute("SELECT key, size FROM entries ORDER BY accessed_at")
+        doomed = []
+        for key, size in cursor:
+            if self._total_bytes <= target:
+                break
+            doomed.append((key,))
+            self._total_bytes -= size
+        cursor.close()
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
@@ -0,0 +1,146 @@
+import hashlib
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+import constants
+from vector_stores.embedding_backends import embed_queries
+from .disk_store import CacheStore, SQLiteCacheStore
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that caches vectors keyed by (model, text hash).
+
+    Lookups go through a bounded in-memory LRU first and then the pluggable
+    on-disk store; only misses reach the underlying model, in one batch.
+    """
+    def __init__(
+        self,
+        underlying: Embeddings,
+        model_name: str,
+        store: Optional[CacheStore] = None,
+        memory_items: int = 4096,
+    ) -> None:
+        self.underlying = underlying
+        self.model_name = model_name
+        self.store = store
+        self.memory_items = memory_items
+        # Tuples, so callers that modify a returned vector cannot change the cache.
+        self._memory: "OrderedDict[str, Tuple[float, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _key(self, kind: str, text: str) -> str:
+        # Queries and documents are kept apart: some models embed them differently.
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model_name}:{kind}:{digest}"
+
+    def _lookup(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return list(vector)
+        if self.store is not None:
+            payload = self.store.get(key)
+            if payload is not None:
+                vector = array("f", payload).tolist()
+                self._remember(key, vector)
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+                return vector
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        with self._lock:
+            self._memory[key] = tuple(vector)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _save(self, key: str, vector: List[float]) -> None:
+        self._remember(key, vector)
+        if self.store is not None:
+            self.store.set(key, array("f", vector).tobytes())
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        results: List[Optional[List[float]]] = []
+        missing: Dict[str, List[int]] = {}
+        for index, text in enumerate(texts):
+            vector = self._lookup(self._key("doc", text))
+            results.append(vector)
+            if vector is None:
+                missing.setdefault(text, []).append(index)
+
+        if missing:
+            missing_texts = list(missing)
+            vectors = self.underlying.embed_documents(missing_texts)
+            for text, vector in zip(missing_texts, vectors):
+                self._save(self._key("doc", text), vector)
+                for index in missing[text]:
+                    results[index] = list(vector)
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key("query", text)
+        vector = self._lookup(key)
+        if vector is None:
+            vector = self.underlying.embed_query(text)
+            self._save(key, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """embed_query for several texts, with the misses embedded in one batch."""
+        results: List[Optional[List[float]]] = []
+        missing: Dict[str, List[int]] = {}
+        for index, text in enumerate(texts):
+            vector = self._lookup(self._key("query", text))
+            results.append(vector)
+            if vector is None:
+                missing.setdefault(text, []).append(index)
+
+        if missing:
+            missing_texts = list(missing)
+            vectors = embed_queries(self.underlying, missing_texts)
+            for text, vector in zip(missing_texts, vectors):
+                self._save(self._key("query", text), vector)
+                for index in missing[text]:
+                    results[index] = list(vector)
+        return results
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters since this wrapper was created."""
+        with self._lock:
+            stats = dict(self._stats)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        stats["hits"] = hits
+        stats["hit_rate"] = hits / lookups if lookups else 0.0
+        stats["memory_items"] = len(self._memory)
+        if isinstance(self.store, SQLiteCacheStore):
+            stats["disk_bytes"] = self.store.size_bytes()
+        return stats
+
+
+def cached_embeddings(underlying: Embeddings, model_name: str) -> Embeddings:
+    """Wrap an embeddings model with the cache configured in constants, if enabled."""
+    if not constants.EMBEDDING_CACHE_ENABLED:
+        return underlying
+    store = SQLiteCacheStore(
+        os.path.join(constants.EMBEDDING_CACHE_DIR, "embeddings.sqlite"),
+        max_bytes=constants.EMBEDDING_CACHE_MAX_BYTES,
+    )
+    return CachedEmbeddings(
+        underlying,
+        model_name,
+        store=store,
+        memory_items=constants.EMBEDDING_CACHE_MEMORY_ITEMS,
+    )
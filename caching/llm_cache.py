@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+import constants
+from .disk_store import CacheStore, SQLiteCacheStore
+
+
+class LLMResponseCache(BaseCache):
+    """
+    Persistent LangChain LLM cache on top of a CacheStore.
+
+    LangChain passes the rendered prompt and an llm_string that already
+    contains the model id, temperature, max_tokens and model_kwargs
+    (response_format), so the key is a hash of both. TTL and size-based
+    eviction come from the store.
+    """
+    def __init__(self, store: CacheStore) -> None:
+        self.store = store
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0}
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        llm_hash = hashlib.sha256(llm_string.encode("utf-8")).hexdigest()
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return f"llm:{llm_hash}:{prompt_hash}"
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        payload = self.store.get(self._key(prompt, llm_string))
+        if payload is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        generations = []
+        for item in json.loads(payload):
+            if "message" in item:
+                message = messages_from_dict([item["message"]])[0]
+                generations.append(ChatGeneration(message=message, generation_info=item.get("generation_info")))
+            else:
+                generations.append(Generation(text=item["text"], generation_info=item.get("generation_info")))
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        items = []
+        for generation in return_val:
+            item: Dict[str, Any] = {"text": generation.text, "generation_info": generation.generation_info}
+            if isinstance(generation, ChatGeneration):
+                item["message"] = message_to_dict(generation.message)
+            items.append(item)
+        self.store.set(self._key(prompt, llm_string), json.dumps(items, default=str).encode("utf-8"))
+        self._count("writes")
+
+    def clear(self, **kwargs: Any) -> None:
+        self.store.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters since this cache was created."""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        if isinstance(self.store, SQLiteCacheStore):
+            stats["disk_bytes"] = self.store.size_bytes()
+        return stats
+
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Return the process-wide LLM response cache, or None when disabled in constants."""
+    global _llm_cache
+    if not constants.LLM_CACHE_ENABLED:
+        return None
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            store = SQLiteCacheStore(
+                os.path.join(constants.LLM_CACHE_DIR, "llm_responses.sqlite"),
+                max_bytes=constants.LLM_CACHE_MAX_BYTES,
+                ttl_seconds=constants.LLM_CACHE_TTL_SECONDS,
+            )
+            _llm_cache = LLMResponseCache(store)
+    return _llm_cache
@@ -0,0 +1,137 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+import constants
+
+
+def approx_token_count(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for llama-style tokenizers)."""
+    return (len(text) + 3) // 4
+
+
+class ContextBudgeter:
+    """
+    Packs retrieved chunks into a token budget before they are sent to an LLM.
+
+    Chunks are taken best score first (by default scores are distances, lower
+    is better; pass higher_is_better=True for fused or rank scores).
+    Chunks of the same document (and page, unless ingestion recorded a
+    document-level offset) whose ranges overlap with matching text are merged,
+    so the splitter's chunk_overlap is not paid for twice, and chunks are
+    skipped once the budget is used up. The packed context is emitted in
+    document order so the model reads the record as it was written.
+    """
+    def __init__(
+        self,
+        token_budget: Optional[int] = None,
+        model_id: str = constants.OLLAMA_MODEL_ID,
+        token_counter: Callable[[str], int] = approx_token_count,
+        separator: str = "\n\n",
+        higher_is_better: bool = False,
+    ) -> None:
+        self.token_budget = token_budget or constants.CONTEXT_TOKEN_BUDGETS.get(
+            model_id, constants.DEFAULT_CONTEXT_TOKEN_BUDGET
+        )
+        self.token_counter = token_counter
+        self.separator = separator
+        self.higher_is_better = higher_is_better
+
+    def select(self, scored_chunks: List[Tuple[Document, float]]) -> List[Tuple[str, int, str]]:
+        """Return the packed (source, start, text) spans in document order."""
+        spans: Dict[Tuple, List[List]] = {}
+        used_tokens = 0
+        seen_texts = set()
+
+        ranked = sorted(scored_chunks, key=lambda item: item[1], reverse=self.higher_is_better)
+        for doc, _ in ranked:
+            text = doc.page_content
+            if not text or text in seen_texts:
+                continue
+            seen_texts.add(text)
+
+            key, start = self._position(doc.metadata, len(seen_texts))
+            source_spans = spans.setdefault(key, [])
+
+            merged_start, merged_text, new_part, absorbed = self._merge(source_spans, start, text)
+            cost = self.token_counter(new_part) if new_part else 0
+            if used_tokens + cost > self.token_budget:
+                continue
+            used_tokens += cost
+            for span in absorbed:
+                source_spans.remove(span)
+            source_spans.append([merged_start, merged_text])
+
+        packed = []
+        for key in sorted(spans):
+            for span_start, span_text in sorted(spans[key], key=lambda span: span[0]):
+                packed.append((key[0], span_start, span_text))
+        return packed
+
+    def pack(self, scored_chunks: List[Tuple[Document, float]]) -> str:
+        """Return the packed context string for (document, score) pairs."""
+        return self.separator.join(text for _, _, text in self.select(scored_chunks))
+
+    @staticmethod
+    def _position(metadata: Dict, ordinal: int) -> Tuple[Tuple, int]:
+        """Return the (span key, start) a chunk is placed at.
+
+        The document-level offset is used when ingestion recorded one. Otherwise
+        start_index is only meaningful within its page, so the page is part of
+        the key. Chunks without any position get a span of their own.
+        """
+        source = metadata.get("source", "")
+        offset = metadata.get("offset")
+        if offset is not None and offset >= 0:
+            return (source, -1, 0), offset
+        page = metadata.get("page")
+        page = page if isinstance(page, int) else -1
+        start = metadata.get("start_index")
+        if start is None or start < 0:
+            # No position information: keep it as its own span after the rest of the document.
+            return (source, page, ordinal), 0
+        return (source, page, 0), start
+
+    @staticmethod
+    def _merge(source_spans: List[List], start: int, text: str):
+        """Merge a chunk into the overlapping spans whose text agrees with it.
+
+        A span is only absorbed if every character it shares with the chunk
+        (and with the spans absorbed before it) is the same; otherwise both are
+        kept. Returns (merged_start, merged_text, text_not_already_covered,
+        spans_absorbed).
+        """
+        overlapping = sorted(
+            (span for span in source_spans
+             if span[0] <= start + len(text) and start <= span[0] + len(span[1])),
+            key=lambda span: span[0],
+        )
+        if not overlapping:
+            return start, text, text, []
+
+        base = min([start] + [span[0] for span in overlapping])
+        end = max([start + len(text)] + [span[0] + len(span[1]) for span in overlapping])
+        buffer: List[Optional[str]] = [None] * (end - base)
+        buffer[start - base:start - base + len(text)] = list(text)
+        covered = [False] * len(text)
+
+        absorbed = []
+        for span in overlapping:
+            span_start, span_text = span
+            offset = span_start - base
+            if any(buffer[offset + i] not in (None, char) for i, char in enumerate(span_text)):
+                continue
+            buffer[offset:offset + len(span_text)] = list(span_text)
+            for i in range(max(span_start, start), min(span_start + len(span_text), start + len(text))):
+                covered[i - start] = True
+            absorbed.append(span)
+        if not absorbed:
+            return start, text, text, []
+
+        merged_start = min([start] + [span[0] for span in absorbed])
+        merged_end = max([start + len(text)] + [span[0] + len(span[1]) for span in absorbed])
+        merged_text = "".join(
+            char if char is not None else " " for char in buffer[merged_start - base:merged_end - base]
+        )
+        new_part = "".join(char for char, seen in zip(text, covered) if not seen)
+        return merged_start, merged_text, new_part, absorbed
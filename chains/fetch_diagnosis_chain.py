@@ -1,35 +1,100 @@
-from typing import List, Any
+import asyncio
+from datetime import datetime
+import json
+import logging
+import re
+from typing import Callable, Dict, Generator, List, Any, Optional
 from langchain_openai import ChatOpenAI
-from langchain_community.tools import Tool
-from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
-from langchain_classic.chains import LLMChain
-from langchain.agents import create_agent
-from langchain.tools import tool
-from langchain.messages import SystemMessage, HumanMessage
-from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnableConfig
-from langchain_core.output_parsers import PydanticOutputParser
 
-import os
-import re
-from vector_stores.vector_helper import VectorHelper
-from schemas.rag_tool_parameters import PatientSearchInput
 import constants
+from caching.llm_cache import get_llm_cache
+from chains.json_stream_parser import IncrementalArrayParser, RepairingJsonOutputParser
+from instrumentation.langchain_callback import metrics_callbacks
+from instrumentation.metrics import get_recorder, stage, stage_path
+
+logger = logging.getLogger(__name__)
+
+_DATE_FORMATS = ("%m-%d-%Y", "%m/%d/%Y")
+
+
+def normalize_condition_name(name: str) -> str:
+    """Lowercase, drop clinical codes like (SN530) and punctuation, collapse whitespace."""
+    name = re.sub(r"\([^)]*\)", " ", name or "").lower()
+    name = re.sub(r"[^a-z0-9]+", " ", name)
+    return " ".join(name.split())
+
+
+def _parse_date(value: str) -> Optional[datetime]:
+    for date_format in _DATE_FORMATS:
+        try:
+            return datetime.strptime((value or "").strip(), date_format)
+        except ValueError:
+            continue
+    return None
 
 
-from dotenv import load_dotenv
-load_dotenv()
+def merge_conditions(partials: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Reduce step of map-reduce extraction: merge per-window major_conditions.
+
+    Conditions are deduplicated by normalised name. The earliest start_date
+    wins; a condition is "cleaned up" only if every window that mentions it
+    says so, and then gets the latest end_date. Otherwise it is "ongoing" and
+    has no end_date. Distinct values are joined.
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for partial in partials:
+        for condition in (partial or {}).get("major_conditions") or []:
+            if not isinstance(condition, dict):
+                continue
+            name = normalize_condition_name(condition.get("key", ""))
+            if not name:
+                continue
+            entry = merged.setdefault(name, {
+                "key": condition.get("key", "").strip(),
+                "values": [],
+                "starts": [],
+                "ends": [],
+                "statuses": [],
+            })
+            value = (condition.get("value") or "").strip()
+            if value and value not in entry["values"]:
+                entry["values"].append(value)
+            entry["starts"].append(condition.get("start_date") or "")
+            entry["ends"].append(condition.get("end_date") or "")
+            entry["statuses"].append((condition.get("status") or "").strip().lower())
+
+    major_conditions = []
+    for entry in merged.values():
+        starts = [date for date in map(_parse_date, entry["starts"]) if date]
+        ends = [date for date in map(_parse_date, entry["ends"]) if date]
+        cleaned_up = bool(entry["statuses"]) and all(status == "cleaned up" for status in entry["statuses"])
+        end_date = ""
+        if cleaned_up:
+            end_date = max(ends).strftime("%m-%d-%Y") if ends else next((end for end in entry["ends"] if end), "")
+        major_conditions.append({
+            "key": entry["key"],
+            "value": "; ".join(entry["values"]),
+            "start_date": min(starts).strftime("%m-%d-%Y") if starts else next((start for start in entry["starts"] if start), ""),
+            "end_date": end_date,
+            "status": "cleaned up" if cleaned_up else "ongoing",
+        })
+    return {"major_conditions": major_conditions}
+
 
 class FetchDiagnosisChain:
     def __init__(self, tag_name) -> None:
         self.tag_name = tag_name
-        self.parser = JsonOutputParser()
+        self.parser = RepairingJsonOutputParser()
         self.task_llm = ChatOpenAI(
             model=constants.OLLAMA_MODEL_ID,
             base_url=constants.OLLAMA_MODEL_BASE_URL,  # Ollama endpoint
             api_key="ollama",
             temperature=0.3,
             max_tokens=2500,
+            cache=get_llm_cache(),
             model_kwargs={
                 "response_format": {"type": "json_object"}
             }
@@ -64,11 +129,237 @@ class FetchDiagnosisChain:
             Ensure that the output is strictly in JSON format without any additional text.
         """
         self.task_prompt = ChatPromptTemplate.from_template(self.prompt_template)
+        self.repair_prompt_template = """
+            You are clinical experts correcting a previous extraction of major or chronic medical conditions from the patient information given below as a context.
+
+            A reviewer flagged these conditions:
+            {flagged_conditions}
+
+            Reviewer comment:
+            {review_comment}
+
+            Re-check ONLY the flagged conditions against the context. Fix their key, value, start_date, end_date (MM-DD-YYYY) and status (ongoing or cleaned up). Drop a condition if the context does not support it.
+            If the reviewer comment says major or chronic conditions are missing from the extraction, add each one the context supports. Do not repeat any other condition.
+
+            Return the corrected flagged conditions and any added ones strictly in this format:
+            {{
+            "major_conditions": [
+                {{"key": "Condition Name", "value": "Supporting detail or reason","start_date":"MM-DD-YYYY","end_date":"MM-DD-YYYY","status":"ongoing/cleaned up"}}
+            ]
+            }}
+
+            context:
+            {patient_info}
+
+            Ensure that the output is strictly in JSON format without any additional text.
+        """
+        self.repair_prompt = ChatPromptTemplate.from_template(self.repair_prompt_template)
     
-    def run_task_chain(self, patient_info: str):
+    def _resolve_mode(self, patient_info: str, mode: Optional[str]) -> str:
+        mode = mode or constants.DIAGNOSIS_MODE
+        if mode not in constants.DIAGNOSIS_MODES:
+            raise ValueError(f"mode must be one of {constants.DIAGNOSIS_MODES}")
+        if mode == "auto":
+            # Same ~4 chars/token estimate the context budgeter uses.
+            too_long = len(patient_info) > constants.DIAGNOSIS_MAP_WINDOW_TOKENS * 4
+            return "map_reduce" if too_long else "single"
+        return mode
+
+    def split_windows(self, patient_info: str) -> List[str]:
+        """Split a long record into overlapping context windows for the map step."""
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=constants.DIAGNOSIS_MAP_WINDOW_TOKENS * 4,
+            chunk_overlap=200,
+        )
+        return splitter.split_text(patient_info)
+
+    def _reduce(self, outputs: List[Any]) -> Dict[str, Any]:
+        partials = []
+        for index, output in enumerate(outputs):
+            if isinstance(output, Exception):
+                # Counted as an error of the map_window stage under the current stage.
+                logger.warning("map window %d of %d failed: %r", index + 1, len(outputs), output)
+                get_recorder().record(stage_path("map_window"), 0.0, error=type(output).__name__)
+                continue
+            partials.append(output)
+        if outputs and not partials:
+            raise outputs[0]
+        return merge_conditions(partials)
+
+    def run_map_reduce(self, patient_info: str) -> Dict[str, Any]:
+        """Extract conditions from each window in parallel, then merge them."""
         task_chain = self.task_prompt | self.task_llm | self.parser
-        response_text = task_chain.invoke(
-            {"patient_info": patient_info},
-            config=RunnableConfig(tags=[f"doc:{self.tag_name}"]),
+        outputs = task_chain.batch(
+            [{"patient_info": window} for window in self.split_windows(patient_info)],
+            config=RunnableConfig(
+                tags=[f"doc:{self.tag_name}"],
+                callbacks=metrics_callbacks(),
+                max_concurrency=constants.DIAGNOSIS_MAP_CONCURRENCY,
+            ),
+            return_exceptions=True,
         )
-        return response_text
\ No newline at end of file
+        return self._reduce(outputs)
+
+    async def arun_map_reduce(
+        self,
+        patient_info: str,
+        llm_semaphore: Optional[asyncio.Semaphore] = None,
+    ) -> Dict[str, Any]:
+        """
+        Async run_map_reduce.
+
+        With llm_semaphore, every window prompt holds a slot of it while it runs,
+        so a shared LLM concurrency limit also covers the map step.
+        """
+        task_chain = self.task_prompt | self.task_llm | self.parser
+        config = RunnableConfig(tags=[f"doc:{self.tag_name}"], callbacks=metrics_callbacks())
+        map_slots = asyncio.Semaphore(constants.DIAGNOSIS_MAP_CONCURRENCY)
+
+        async def map_window(window: str) -> Any:
+            async with map_slots:
+                if llm_semaphore is None:
+                    return await task_chain.ainvoke({"patient_info": window}, config=config)
+                async with llm_semaphore:
+                    return await task_chain.ainvoke({"patient_info": window}, config=config)
+
+        outputs = await asyncio.gather(
+            *(map_window(window) for window in self.split_windows(patient_info)),
+            return_exceptions=True,
+        )
+        return self._reduce(outputs)
+
+    def run_task_chain(self, patient_info: str, mode: Optional[str] = None):
+        """
+        Extract major conditions from patient_info.
+
+        mode: "single" (one prompt), "map_reduce" (parallel window prompts merged
+        by merge_conditions) or "auto" (map_reduce only for long records).
+        Defaults to constants.DIAGNOSIS_MODE.
+        """
+        mode = self._resolve_mode(patient_info, mode)
+        with stage("diagnosis", mode=mode):
+            if mode == "map_reduce":
+                return self.run_map_reduce(patient_info)
+            task_chain = self.task_prompt | self.task_llm | self.parser
+            response_text = task_chain.invoke(
+                {"patient_info": patient_info},
+                config=RunnableConfig(tags=[f"doc:{self.tag_name}"], callbacks=metrics_callbacks()),
+            )
+        return response_text
+
+    def repair_conditions(
+        self,
+        patient_info: str,
+        task_output: Dict[str, Any],
+        review_comment: str,
+        flagged: List[str],
+    ) -> Dict[str, Any]:
+        """
+        Re-extract only the flagged conditions and splice them back into task_output.
+
+        Unflagged conditions are kept as they are; flagged ones are replaced by
+        the repaired entries (or dropped if the model no longer reports them).
+        Conditions the review comment reports as missing are added; flagged may
+        be empty when that is the only problem.
+        """
+        conditions = (task_output or {}).get("major_conditions") or []
+        flagged_names = {normalize_condition_name(name) for name in flagged}
+        flagged_conditions = [
+            condition for condition in conditions
+            if normalize_condition_name(condition.get("key", "")) in flagged_names
+        ]
+        repair_chain = self.repair_prompt | self.task_llm | self.parser
+        with stage("repair", flagged=len(flagged)):
+            repaired = repair_chain.invoke(
+                {
+                    "patient_info": patient_info,
+                    "flagged_conditions": json.dumps(flagged_conditions or flagged, indent=2),
+                    "review_comment": review_comment,
+                },
+                config=RunnableConfig(tags=[f"doc:{self.tag_name}", "repair"], callbacks=metrics_callbacks()),
+            )
+        kept = [
+            condition for condition in conditions
+            if normalize_condition_name(condition.get("key", "")) not in flagged_names
+        ]
+        kept_names = {normalize_condition_name(condition.get("key", "")) for condition in kept}
+        # An unflagged condition the model repeats keeps its original entry.
+        added = [
+            condition for condition in (repaired or {}).get("major_conditions") or []
+            if isinstance(condition, dict) and normalize_condition_name(condition.get("key", "")) not in kept_names
+        ]
+        return {"major_conditions": kept + added}
+
+    async def arun_task_chain(
+        self,
+        patient_info: str,
+        mode: Optional[str] = None,
+        llm_semaphore: Optional[asyncio.Semaphore] = None,
+    ):
+        """
+        Async run_task_chain.
+
+        llm_semaphore, if given, is held for each LLM call rather than for the
+        whole extraction, so map_reduce never runs more prompts than it allows.
+        """
+        mode = self._resolve_mode(patient_info, mode)
+        with stage("diagnosis", mode=mode):
+            if mode == "map_reduce":
+                return await self.arun_map_reduce(patient_info, llm_semaphore=llm_semaphore)
+            task_chain = self.task_prompt | self.task_llm | self.parser
+            config = RunnableConfig(tags=[f"doc:{self.tag_name}"], callbacks=metrics_callbacks())
+            if llm_semaphore is None:
+                return await task_chain.ainvoke({"patient_info": patient_info}, config=config)
+            async with llm_semaphore:
+                return await task_chain.ainvoke({"patient_info": patient_info}, config=config)
+
+    def stream_task_chain(self, patient_info: str) -> Generator[Dict[str, Any], None, Dict[str, Any]]:
+        """
+        Yield each major_conditions entry as soon as the model finishes writing it.
+
+        The generator's return value (e.g. via `yield from`) is the full output;
+        a truncated or malformed tail is repaired instead of failing the call.
+        """
+        stream_parser = IncrementalArrayParser("major_conditions")
+        stream_chain = self.task_prompt | self.task_llm
+        for chunk in stream_chain.stream(
+            {"patient_info": patient_info},
+            config=RunnableConfig(tags=[f"doc:{self.tag_name}"], callbacks=metrics_callbacks()),
+        ):
+            yield from stream_parser.feed(chunk.content or "")
+        emitted = len(stream_parser.items)
+        result = stream_parser.finish()
+        # finish() may have repaired one more entry from a truncated tail.
+        yield from result["major_conditions"][emitted:]
+        return result
+
+    def run_task_chain_streaming(
+        self,
+        patient_info: str,
+        on_condition: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        """Stream the extraction, calling on_condition per entry, and return the full output."""
+        stream = self.stream_task_chain(patient_info)
+        while True:
+            try:
+                condition = next(stream)
+            except StopIteration as stop:
+                return stop.value
+            if on_condition is not None:
+                on_condition(condition)
+
+    async def astream_task_chain(self, patient_info: str):
+        """Async variant of stream_task_chain (yields entries only)."""
+        stream_parser = IncrementalArrayParser("major_conditions")
+        stream_chain = self.task_prompt | self.task_llm
+        async for chunk in stream_chain.astream(
+            {"patient_info": patient_info},
+            config=RunnableConfig(tags=[f"doc:{self.tag_name}"], callbacks=metrics_callbacks()),
+        ):
+            for condition in stream_parser.feed(chunk.content or ""):
+                yield condition
+        emitted = len(stream_parser.items)
+        for condition in stream_parser.finish()["major_conditions"][emitted:]:
+            yield condition
@@ -0,0 +1,110 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+import json_repair
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.outputs import Generation
+
+
+def repair_json(text: str) -> Any:
+    """json.loads, falling back to json_repair for truncated or slightly malformed output."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return json_repair.loads(text)
+
+
+class RepairingJsonOutputParser(JsonOutputParser):
+    """JsonOutputParser that repairs a malformed completion instead of failing the call."""
+
+    def parse_result(self, result: List[Generation], *, partial: bool = False) -> Any:
+        try:
+            return super().parse_result(result, partial=partial)
+        except OutputParserException:
+            if partial:
+                return None
+            repaired = json_repair.loads(result[0].text)
+            if repaired in ("", None):
+                raise
+            return repaired
+
+
+class IncrementalArrayParser:
+    """
+    Incrementally scans streamed JSON text and emits each complete object of
+    one top-level array (e.g. "major_conditions") as soon as its closing brace
+    arrives, without waiting for the rest of the completion.
+    """
+    def __init__(self, array_key: str = "major_conditions") -> None:
+        self.array_key = array_key
+        self.buffer = ""
+        self.items: List[Dict[str, Any]] = []
+        self._array_start = re.compile(r'"%s"\s*:\s*\[' % re.escape(array_key))
+        self._pos = 0
+        self._in_array = False
+        self._array_closed = False
+        self._object_start: Optional[int] = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Add streamed text; return the objects completed by it."""
+        self.buffer += text
+        completed = []
+        if not self._in_array and not self._array_closed:
+            match = self._array_start.search(self.buffer)
+            if match is None:
+                return completed
+            self._in_array = True
+            self._pos = match.end()
+
+        while self._in_array and self._pos < len(self.buffer):
+            char = self.buffer[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._object_start = self._pos
+                self._depth += 1
+            elif char == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    item = repair_json(self.buffer[self._object_start:self._pos + 1])
+                    self._object_start = None
+                    if isinstance(item, dict):
+                        self.items.append(item)
+                        completed.append(item)
+            elif char == "]" and self._depth == 0:
+                self._in_array = False
+                self._array_closed = True
+            self._pos += 1
+        return completed
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        Close the stream and return the whole output.
+
+        A truncated trailing object is repaired and emitted, and the array
+        in the result always matches the items emitted while streaming.
+        """
+        if self._object_start is not None:
+            tail = repair_json(self.buffer[self._object_start:])
+            if isinstance(tail, dict) and tail:
+                self.items.append(tail)
+            self._object_start = None
+
+        result = repair_json(self.buffer) if self.buffer.strip() else {}
+        if not isinstance(result, dict):
+            result = {}
+        result[self.array_key] = list(self.items)
+        return result
@@ -0,0 +1,159 @@
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from agents.reviewer_agent import ReviewerAgent
+from chains.context_budgeter import approx_token_count
+from chains.fetch_diagnosis_chain import FetchDiagnosisChain, normalize_condition_name
+from instrumentation.metrics import stage
+import constants
+
+
+class ReflexionLoop:
+    """
+    Extract -> review -> targeted repair, until the reviewer says "ok".
+
+    Stops at the first "ok" verdict, after max_iterations reviews, or once the
+    wall-clock or (estimated) token budget is spent. Each repair re-extracts
+    only the conditions the reviewer flagged.
+
+    The first review is always a full review, which also checks for conditions
+    missing from the output. With incremental_review, later reviews only
+    re-check the conditions the local evidence check cannot confirm.
+    """
+    def __init__(
+        self,
+        diagnosis_chain: FetchDiagnosisChain,
+        reviewer_agent: ReviewerAgent,
+        max_iterations: int = constants.REFLEXION_MAX_ITERATIONS,
+        time_budget_s: Optional[float] = constants.REFLEXION_TIME_BUDGET_S,
+        token_budget: Optional[int] = constants.REFLEXION_TOKEN_BUDGET,
+        incremental_review: bool = True,
+    ) -> None:
+        self.diagnosis_chain = diagnosis_chain
+        self.reviewer_agent = reviewer_agent
+        self.max_iterations = max_iterations
+        self.time_budget_s = time_budget_s
+        self.token_budget = token_budget
+        self.incremental_review = incremental_review
+
+    def _review(self, patient_info: str, result: Dict[str, Any], full: bool) -> Dict[str, Any]:
+        review = self.reviewer_agent.review if full else self.reviewer_agent.review_incremental
+        return review(
+            task_prompt=self.diagnosis_chain.prompt_template,
+            patient_context=patient_info,
+            task_output=result,
+        )
+
+    @staticmethod
+    def _named_in_comment(review: Dict[str, Any], result: Dict[str, Any]) -> List[str]:
+        """Conditions of result whose (normalised) name appears in the review comment."""
+        comment = f" {normalize_condition_name(review.get('comment', ''))} "
+        named = []
+        for condition in result.get("major_conditions") or []:
+            if not isinstance(condition, dict):
+                continue
+            name = normalize_condition_name(condition.get("key", ""))
+            if name and f" {name} " in comment:
+                named.append(condition.get("key", ""))
+        return named
+
+    def _flagged(self, patient_info: str, review: Dict[str, Any], result: Dict[str, Any]) -> Tuple[List[str], int]:
+        """
+        Return (condition names to repair, estimated tokens spent finding them).
+
+        An incremental review lists them. A full review only has a comment: the
+        conditions it names are used, and if it names none, an incremental
+        review picks the ones the evidence does not support. The list may be
+        empty when the comment only reports missing conditions.
+        """
+        if "flagged" in review:
+            return list(review["flagged"]), 0
+        named = self._named_in_comment(review, result)
+        if named:
+            return named, 0
+        incremental = self._review(patient_info, result, full=False)
+        return list(incremental["flagged"]), approx_token_count(json.dumps(result)) + incremental.get("evidence_tokens", 0)
+
+    def _stop_reason(self, started: float, used_tokens: int) -> Optional[str]:
+        if self.time_budget_s is not None and time.perf_counter() - started >= self.time_budget_s:
+            return "time_budget"
+        if self.token_budget is not None and used_tokens >= self.token_budget:
+            return "token_budget"
+        return None
+
+    def run(self, patient_info: str, result: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Run the loop and return the final result, last review, stop reason and per-iteration stats.
+
+        Pass result to start from an existing extraction instead of running one.
+        Each iteration is recorded as a "reflexion_iteration" metrics stage.
+        """
+        started = time.perf_counter()
+        # Token usage is estimated from prompt and output sizes; every call re-sends the context.
+        context_tokens = approx_token_count(patient_info)
+        used_tokens = 0
+        iterations = []
+
+        if result is None:
+            stage_started = time.perf_counter()
+            result = self.diagnosis_chain.run_task_chain(patient_info)
+            used_tokens += context_tokens + approx_token_count(json.dumps(result))
+            iterations.append({"iteration": 0, "step": "extract", "seconds": time.perf_counter() - stage_started})
+
+        review: Dict[str, Any] = {}
+        stop_reason = "max_iterations"
+        for iteration in range(1, self.max_iterations + 1):
+            stats: Dict[str, Any] = {"iteration": iteration}
+            with stage("reflexion_iteration") as fields:
+                stage_started = time.perf_counter()
+                full_review = iteration == 1 or not self.incremental_review
+                review = self._review(patient_info, result, full_review)
+                stats["review_seconds"] = time.perf_counter() - stage_started
+                stats["verdict"] = review.get("verdict")
+                used_tokens += approx_token_count(json.dumps(result)) + (
+                    context_tokens if full_review else review.get("evidence_tokens", 0)
+                )
+
+                if review.get("verdict") == "ok":
+                    stop_reason = "ok"
+                elif iteration == self.max_iterations:
+                    stop_reason = "max_iterations"
+                else:
+                    stop_reason = self._stop_reason(started, used_tokens)
+
+                if stop_reason is None:
+                    flagged, flag_tokens = self._flagged(patient_info, review, result)
+                    used_tokens += flag_tokens
+                    stats["flagged"] = flagged
+                    # Finding the flags may have taken a while; the repair re-sends the whole context.
+                    stop_reason = self._stop_reason(started, used_tokens + context_tokens)
+
+                if stop_reason is None:
+                    stage_started = time.perf_counter()
+                    result = self.diagnosis_chain.repair_conditions(
+                        patient_info, result, review.get("comment", ""), flagged
+                    )
+                    stats["repair_seconds"] = time.perf_counter() - stage_started
+                    used_tokens += context_tokens + approx_token_count(json.dumps(result))
+
+                stats["tokens_used"] = used_tokens
+                stats["elapsed_seconds"] = time.perf_counter() - started
+                fields.update(
+                    verdict=stats["verdict"],
+                    flagged=len(stats.get("flagged", [])),
+                    tokens_used=used_tokens,
+                    stop_reason=stop_reason,
+                )
+            iterations.append(stats)
+            if stop_reason is not None:
+                break
+
+        return {
+            "result": result,
+            "review": review,
+            "stop_reason": stop_reason,
+            "iterations": iterations,
+            "tokens_used": used_tokens,
+            "elapsed_seconds": time.perf_counter() - started,
+        }
@@ -0,0 +1,190 @@
+"""
+Command line entry point for the pipeline stages.
+
+    python cli.py ingest data/pdf data/docs
+    python cli.py retrieve "data/pdf/Document 12 Leonard Asthma (1).pdf" --output context.txt
+    python cli.py extract --context-file context.txt --output result.json
+    python cli.py review --context-file context.txt --result-file result.json --reflexion
+    python cli.py run-batch manifest.jsonl
+
+Only the standard library and constants are imported up front. Each subcommand
+imports the modules it needs when it runs, so `--help` and argument errors
+return immediately and `ingest` never loads the LLM clients. Pass
+--import-times to print what each of those imports cost.
+"""
+import argparse
+import importlib
+import json
+import sys
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+import constants
+
+_STARTED = time.perf_counter()
+_import_times: List[Tuple[str, float]] = []
+
+
+def lazy_import(module_name: str):
+    """Import a module, recording how long it took if it was not loaded yet."""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    _import_times.append((module_name, time.perf_counter() - started))
+    return module
+
+
+def format_import_times() -> str:
+    lines = [f"{'module':<32}  {'import_ms':>9}"]
+    for module_name, seconds in _import_times:
+        lines.append(f"{module_name:<32}  {seconds * 1000:>9.1f}")
+    lines.append(f"{'total':<32}  {sum(seconds for _, seconds in _import_times) * 1000:>9.1f}")
+    return "\n".join(lines)
+
+
+def _read_text(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _write_output(path: Optional[str], content: Any) -> None:
+    """Write content (JSON-encoded unless it is a string) to path, or print it."""
+    text = content if isinstance(content, str) else json.dumps(content, indent=2, default=str)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"Content written to {path}")
+    else:
+        print(text)
+
+
+def _retrieve(file_path: str, user_query: str, mode: str) -> str:
+    retrieval_agent = lazy_import("agents.retrieval_agent")
+    return retrieval_agent.RetrievalAgent(tag_name="cli").run_retrieval_agent(user_query, file_path, mode=mode).strip()
+
+
+def cmd_ingest(args: argparse.Namespace) -> None:
+    lazy_import("ingest").main(args.passthrough)
+
+
+def cmd_run_batch(args: argparse.Namespace) -> None:
+    lazy_import("batch_runner").main(args.passthrough)
+
+
+def cmd_retrieve(args: argparse.Namespace) -> None:
+    _write_output(args.output, _retrieve(args.file_path, args.query, args.mode))
+
+
+def cmd_extract(args: argparse.Namespace) -> None:
+    if args.context_file:
+        patient_info = _read_text(args.context_file).strip()
+    else:
+        patient_info = _retrieve(args.file_path, args.query, args.retrieval_mode)
+
+    diagnosis_chain = lazy_import("chains.fetch_diagnosis_chain").FetchDiagnosisChain(tag_name="cli")
+    if args.stream:
+        result = diagnosis_chain.run_task_chain_streaming(
+            patient_info,
+            on_condition=lambda condition: print(json.dumps(condition, default=str), flush=True),
+        )
+    else:
+        result = diagnosis_chain.run_task_chain(patient_info, mode=args.mode)
+    _write_output(args.output, result)
+
+
+def cmd_review(args: argparse.Namespace) -> None:
+    patient_info = _read_text(args.context_file).strip()
+    with open(args.result_file, "r", encoding="utf-8") as f:
+        result = json.load(f)
+
+    diagnosis_chain = lazy_import("chains.fetch_diagnosis_chain").FetchDiagnosisChain(tag_name="cli")
+    reviewer_agent = lazy_import("agents.reviewer_agent").ReviewerAgent(tag_name="cli")
+    if args.reflexion:
+        loop = lazy_import("chains.reflexion_loop").ReflexionLoop(
+            diagnosis_chain, reviewer_agent, incremental_review=args.incremental
+        )
+        _write_output(args.output, loop.run(patient_info, result=result))
+        return
+
+    review = reviewer_agent.review_incremental if args.incremental else reviewer_agent.review
+    _write_output(args.output, review(
+        task_prompt=diagnosis_chain.prompt_template,
+        patient_context=patient_info,
+        task_output=result,
+    ))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Patient record retrieval, diagnosis extraction and review.")
+    parser.add_argument("--import-times", action="store_true", help="print the time spent importing each module")
+    parser.add_argument("--metrics", action="store_true", help="print the stage timing summary when done")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    # ingest and run-batch keep their own argument parsers; everything after the name is passed on.
+    ingest = subparsers.add_parser("ingest", help="ingest documents into the vector store", add_help=False)
+    ingest.set_defaults(handler=cmd_ingest, passthrough=True)
+
+    run_batch = subparsers.add_parser("run-batch", help="process a manifest of documents", add_help=False)
+    run_batch.set_defaults(handler=cmd_run_batch, passthrough=True)
+
+    retrieve = subparsers.add_parser("retrieve", help="retrieve the patient context for one document")
+    retrieve.add_argument("file_path", help="ingested document to search")
+    retrieve.add_argument("--query", default=constants.DIAGNOSIS_USER_QUERY)
+    retrieve.add_argument("--mode", choices=constants.RETRIEVAL_MODES, default=constants.RETRIEVAL_MODE)
+    retrieve.add_argument("--output", help="write the context here instead of printing it")
+    retrieve.set_defaults(handler=cmd_retrieve)
+
+    extract = subparsers.add_parser("extract", help="extract major conditions from a patient context")
+    source = extract.add_mutually_exclusive_group(required=True)
+    source.add_argument("file_path", nargs="?", help="ingested document to retrieve the context from")
+    source.add_argument("--context-file", help="previously retrieved context")
+    extract.add_argument("--query", default=constants.DIAGNOSIS_USER_QUERY)
+    extract.add_argument("--retrieval-mode", choices=constants.RETRIEVAL_MODES, default=constants.RETRIEVAL_MODE)
+    extract.add_argument("--mode", choices=constants.DIAGNOSIS_MODES, default=None, help="default: DIAGNOSIS_MODE")
+    extract.add_argument("--stream", action="store_true", help="print each condition as soon as it is complete")
+    extract.add_argument("--output", help="write the result JSON here instead of printing it")
+    extract.set_defaults(handler=cmd_extract)
+
+    review = subparsers.add_parser("review", help="review an extraction against its patient context")
+    review.add_argument("--context-file", required=True)
+    review.add_argument("--result-file", required=True, help="extraction result JSON")
+    review.add_argument("--incremental", action="store_true", help="only send unconfirmed conditions to the LLM")
+    review.add_argument("--reflexion", action="store_true", help="repair flagged conditions until the review passes")
+    review.add_argument("--output", help="write the review JSON here instead of printing it")
+    review.set_defaults(handler=cmd_review)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if getattr(args, "passthrough", False):
+        args.passthrough = extra
+    elif extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    if args.command == "extract" and args.stream and args.mode:
+        # Streaming always extracts in a single pass.
+        parser.error("extract: --stream cannot be combined with --mode")
+
+    # After argument parsing, so --help never pays for it.
+    dotenv = lazy_import("dotenv")
+    dotenv.load_dotenv()
+
+    handler: Callable[[argparse.Namespace], None] = args.handler
+    try:
+        handler(args)
+    finally:
+        if args.import_times:
+            print(format_import_times(), file=sys.stderr)
+            print(f"Wall time since start: {(time.perf_counter() - _STARTED) * 1000:.1f} ms", file=sys.stderr)
+        if args.metrics and "instrumentation.metrics" in sys.modules:
+            recorder = sys.modules["instrumentation.metrics"].get_recorder()
+            for module_name, seconds in _import_times:
+                recorder.record(f"import:{module_name}", seconds)
+            print(recorder.format_summary(), file=sys.stderr)
+            recorder.export()
+
+
+if __name__ == "__main__":
+    main()
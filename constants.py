@@ -1,4 +1,103 @@
 TOP_K=1000
 RETRIEVAL_MODEL_ID="llama3.2"
 OLLAMA_MODEL_BASE_URL="http://localhost:11434/v1"
-OLLAMA_MODEL_ID="llama3.2"
\ No newline at end of file
+OLLAMA_MODEL_ID="llama3.2"
+INGEST_CHUNK_SIZE=500
+INGEST_CHUNK_OVERLAP=100
+INGEST_EMBED_BATCH_SIZE=256
+INGEST_STREAMING=False
+INGEST_STREAM_PAGES_PER_TASK=16
+
+EMBEDDING_CACHE_ENABLED=True
+EMBEDDING_CACHE_DIR=".cache/embeddings"
+EMBEDDING_CACHE_MAX_BYTES=512 * 1024 * 1024
+EMBEDDING_CACHE_MEMORY_ITEMS=4096
+
+EMBEDDING_MODEL_NAME="sentence-transformers/all-mpnet-base-v2"
+# "torch", "onnx" or "openvino"; quantization None (fp32) or "int8".
+EMBEDDING_BACKEND="torch"
+EMBEDDING_QUANTIZATION=None
+# Instruction set the int8 ONNX model is quantized for: "avx512_vnni", "avx512", "avx2" or "arm64".
+EMBEDDING_ONNX_QUANTIZATION_CONFIG="avx512_vnni"
+EMBEDDING_MODEL_DIR=".cache/models"
+EMBEDDING_BATCH_SIZE=32
+EMBEDDING_THREADS=None
+EMBEDDING_DYNAMIC_BATCHING=True
+
+VECTOR_INDEX_METHOD="hnsw"
+# "full", "halfvec" or "binary": encoding the PGVector ANN index is built on.
+# Compact storages search candidates with it and rerank them exactly. They only
+# serve unfiltered searches without min_score; the pipeline always filters by
+# source, so its searches stay exact on the full vectors whatever this is set to.
+VECTOR_STORAGE="full"
+VECTOR_RERANK_CANDIDATES_FACTOR=4
+HNSW_M=16
+HNSW_EF_CONSTRUCTION=64
+HNSW_EF_SEARCH=100
+IVFFLAT_LISTS=100
+IVFFLAT_PROBES=10
+
+RETRIEVAL_MODES=("agent", "direct", "raw", "multi")
+RETRIEVAL_MODE="agent"
+RETRIEVAL_QUERY_TEMPLATE="Patient medical history, diagnoses, chronic conditions and their dates: {user_query}"
+# Searched together with the templated query in "multi" retrieval mode.
+RETRIEVAL_MULTI_QUERIES=[
+    "Major or chronic medical conditions and diagnoses with their dates",
+    "Current and past medications, prescriptions and dosages",
+    "Test results, laboratory values and reference ranges",
+    "Appointments, reminders and consultations with dates and locations",
+]
+
+DIAGNOSIS_USER_QUERY="Extract a list of all major or chronic medical conditions mentioned in the given patient infromations and need to find dates of the medical conditions from when it detected and calculate the proper dates in formats and from when it was cleaned up or still it is on going."
+BATCH_LLM_CONCURRENCY=2
+BATCH_EMBED_CONCURRENCY=2
+BATCH_DB_CONCURRENCY=4
+BATCH_OUTPUT_DIR="data/batch_results"
+
+# Token budget for retrieved context per model (prompt template and output not included).
+DEFAULT_CONTEXT_TOKEN_BUDGET=3000
+CONTEXT_TOKEN_BUDGETS={"llama3.2": 3000}
+
+DIAGNOSIS_MODES=("single", "map_reduce", "auto")
+DIAGNOSIS_MODE="single"
+DIAGNOSIS_MAP_WINDOW_TOKENS=1500
+DIAGNOSIS_MAP_CONCURRENCY=4
+
+LLM_CACHE_ENABLED=True
+LLM_CACHE_DIR=".cache/llm"
+LLM_CACHE_MAX_BYTES=256 * 1024 * 1024
+LLM_CACHE_TTL_SECONDS=7 * 24 * 3600
+
+REVIEW_EVIDENCE_THRESHOLD=1.0
+REVIEW_EVIDENCE_CHUNKS=3
+REVIEW_VERDICT_CACHE_MAX_BYTES=32 * 1024 * 1024
+
+REFLEXION_MAX_ITERATIONS=3
+REFLEXION_TIME_BUDGET_S=300
+REFLEXION_TOKEN_BUDGET=20000
+
+# "dense" (vector search with the similarity threshold) or "hybrid" (vector + full-text, RRF-fused)
+RETRIEVAL_SEARCH_MODE="dense"
+HYBRID_TOP_K=100
+HYBRID_RRF_K=60
+
+# "pgvector" (PostgreSQL) or "faiss" (local index on disk, no database needed)
+VECTOR_BACKEND="pgvector"
+FAISS_INDEX_DIR="data/faiss_index"
+
+# In-memory per-document vectors for repeated searches on the same patient file
+WORKING_SET_ENABLED=False
+WORKING_SET_MAX_BYTES=256 * 1024 * 1024
+
+# Stage timing / token metrics (instrumentation.metrics)
+METRICS_ENABLED=True
+METRICS_JSONL_PATH=None  # e.g. "data/metrics/events.jsonl"
+METRICS_PROMETHEUS_PATH=None  # e.g. "data/metrics/metrics.prom"
+METRICS_MAX_SAMPLES=10000
+
+# Shared PostgreSQL pool (SQLAlchemy QueuePool used by db_helper and PGVector)
+DB_POOL_SIZE=5
+DB_POOL_MAX_OVERFLOW=5
+DB_POOL_TIMEOUT_S=30
+DB_POOL_RECYCLE_S=1800
+DB_STATEMENT_TIMEOUT_MS=30000
@@ -0,0 +1,37 @@
+import argparse
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+from vector_stores.ingestion_helper import IngestionHelper
+
+
+def main(argv: Optional[List[str]] = None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Ingest patient documents into the vector store.")
+    parser.add_argument("directories", nargs="+", help="Directories to ingest, e.g. data/pdf data/docs")
+    parser.add_argument("--batch-size", type=int, default=None, help="Chunks per embedding batch")
+    parser.add_argument("--workers", type=int, default=None, help="Text extraction processes")
+    parser.add_argument("--stream", action=argparse.BooleanOptionalAction, default=None,
+                        help="Extract and embed PDFs page range by page range (default: INGEST_STREAMING)")
+    args = parser.parse_args(argv)
+
+    kwargs = {"max_workers": args.workers}
+    if args.batch_size:
+        kwargs["embed_batch_size"] = args.batch_size
+    if args.stream is not None:
+        kwargs["streaming"] = args.stream
+    ingestion = IngestionHelper(**kwargs)
+
+    files = []
+    for directory in args.directories:
+        files.extend(ingestion.collect_files(directory))
+
+    success, message = ingestion.ingest_files(files)
+    print(message)
+    if not success:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
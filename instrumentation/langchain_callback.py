@@ -0,0 +1,126 @@
+"""LangChain callback that feeds prompt, LLM, parser and tool timings into the recorder."""
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from .metrics import get_recorder, stage_path
+
+
+def _component_kind(name: Optional[str]) -> Optional[str]:
+    """Map a runnable name to the stage it is recorded under (None = not recorded)."""
+    if not name:
+        return None
+    if "PromptTemplate" in name:
+        return "prompt"
+    if "Parser" in name:
+        return "parse"
+    return None
+
+
+def _token_usage(response: LLMResult) -> Dict[str, int]:
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+    if not prompt_tokens and not completion_tokens:
+        # Streaming and cached replies carry usage on the message instead.
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt_tokens += metadata.get("input_tokens", 0)
+                completion_tokens += metadata.get("output_tokens", 0)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Records each LLM call (total time, time to first token, token counts),
+    prompt rendering, output parsing and tool calls as stages under whatever
+    stage was open when the run started.
+    """
+    # Run in the caller's thread so token timestamps are not delayed by an executor.
+    run_inline = True
+
+    def __init__(self) -> None:
+        self._runs: Dict[UUID, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, name: str, **fields: Any) -> None:
+        with self._lock:
+            self._runs[run_id] = {"stage": stage_path(name), "started": time.perf_counter(), **fields}
+
+    def _finish(self, run_id: UUID, **fields: Any) -> None:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        elapsed = time.perf_counter() - run.pop("started")
+        first_token = run.pop("first_token", None)
+        if first_token is not None:
+            fields["ttft_s"] = first_token
+        streamed_tokens = run.pop("streamed_tokens", 0)
+        if streamed_tokens and not fields.get("completion_tokens"):
+            # No usage reported for the stream: count streamed chunks instead.
+            fields["completion_tokens"] = streamed_tokens
+        get_recorder().record(run.pop("stage"), elapsed, **run, **fields)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, "llm", prompt_chars=sum(len(prompt) for prompt in prompts))
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID, **kwargs: Any) -> None:
+        chars = sum(len(str(message.content)) for batch in messages for message in batch)
+        self._start(run_id, "llm", prompt_chars=chars)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None:
+                return
+            if "first_token" not in run:
+                run["first_token"] = time.perf_counter() - run["started"]
+            if token:
+                run["streamed_tokens"] = run.get("streamed_tokens", 0) + 1
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, **_token_usage(response))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, error=type(error).__name__)
+
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name")
+        kind = _component_kind(name)
+        if kind:
+            self._start(run_id, kind)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, error=type(error).__name__)
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name") or "tool"
+        self._start(run_id, f"tool:{name}")
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, error=type(error).__name__)
+
+
+_handler: Optional[MetricsCallbackHandler] = None
+
+
+def metrics_callbacks() -> List[BaseCallbackHandler]:
+    """Callbacks to pass in a RunnableConfig; empty when metrics are disabled."""
+    global _handler
+    if not get_recorder().enabled:
+        return []
+    if _handler is None:
+        _handler = MetricsCallbackHandler()
+    return [_handler]
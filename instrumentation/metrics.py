@@ -0,0 +1,231 @@
+"""
+In-process stage timing and counters.
+
+Stages nest: a stage opened inside another one is recorded as "outer/inner",
+across threads started with asyncio.to_thread and across asyncio tasks.
+Events can be appended to a JSONL file as they happen; aggregates can be
+exported in Prometheus text format or printed as a summary table.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+import constants
+
+_current_stage: ContextVar[str] = ContextVar("reviewer_metrics_stage", default="")
+
+
+def current_stage() -> str:
+    """The "/"-joined path of the stages open in the current context."""
+    return _current_stage.get()
+
+
+def stage_path(name: str) -> str:
+    parent = _current_stage.get()
+    return f"{parent}/{name}" if parent else name
+
+
+def _quantile(ordered: List[float], q: float) -> float:
+    position = (len(ordered) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+class MetricsRecorder:
+    """
+    Collects stage timings plus numeric fields (token and chunk counts) per stage.
+
+    Keeps exact counts and totals, and the last max_samples durations per stage
+    for percentiles. With jsonl_path set, every event is also appended there.
+    """
+    def __init__(
+        self,
+        enabled: bool = True,
+        jsonl_path: Optional[str] = None,
+        max_samples: int = 10000,
+    ) -> None:
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._jsonl = None
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts: Dict[str, int] = defaultdict(int)
+            self._seconds: Dict[str, float] = defaultdict(float)
+            self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=self.max_samples))
+            self._totals: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+            self._errors: Dict[str, int] = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name: str, **fields: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Time a block as a (nested) stage.
+
+        Yields a dict the block can add fields to, e.g. fields["chunks"] = 12.
+        Do not open a stage around a yield in a generator: the stage would leak
+        into the consumer's context.
+        """
+        if not self.enabled:
+            yield fields
+            return
+        path = stage_path(name)
+        token = _current_stage.set(path)
+        started = time.perf_counter()
+        try:
+            yield fields
+        except BaseException as exc:
+            fields.setdefault("error", type(exc).__name__)
+            raise
+        finally:
+            _current_stage.reset(token)
+            self.record(path, time.perf_counter() - started, **fields)
+
+    def record(self, stage: str, seconds: float, **fields: Any) -> None:
+        """Record one finished stage; numeric fields are summed per stage."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counts[stage] += 1
+            self._seconds[stage] += seconds
+            self._samples[stage].append(seconds)
+            for key, value in fields.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self._totals[stage][key] += value
+            if fields.get("error"):
+                self._errors[stage] += 1
+            if self.jsonl_path:
+                self._write_event({"ts": time.time(), "stage": stage, "seconds": seconds, **fields})
+
+    def _write_event(self, event: Dict[str, Any]) -> None:
+        # Caller holds the lock.
+        if self._jsonl is None:
+            directory = os.path.dirname(self.jsonl_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._jsonl = open(self.jsonl_path, "a", encoding="utf-8", buffering=1)
+        self._jsonl.write(json.dumps(event, default=str) + "\n")
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per-stage count, total/mean/percentile durations and summed fields."""
+        with self._lock:
+            report = {}
+            for stage, count in self._counts.items():
+                ordered = sorted(self._samples[stage])
+                report[stage] = {
+                    "count": count,
+                    "errors": self._errors.get(stage, 0),
+                    "total_s": self._seconds[stage],
+                    "mean_ms": self._seconds[stage] / count * 1000,
+                    "p50_ms": _quantile(ordered, 0.50) * 1000,
+                    "p95_ms": _quantile(ordered, 0.95) * 1000,
+                    "max_ms": ordered[-1] * 1000,
+                    **dict(self._totals.get(stage, {})),
+                }
+            return report
+
+    def format_summary(self) -> str:
+        """Stages sorted by total time, as a fixed-width table."""
+        report = self.summary()
+        if not report:
+            return "No stages recorded."
+        width = max(len("stage"), *(len(stage) for stage in report))
+        lines = [f"{'stage':<{width}}  {'count':>6}  {'total_s':>9}  {'mean_ms':>9}  {'p50_ms':>9}  {'p95_ms':>9}  extra"]
+        for stage, row in sorted(report.items(), key=lambda item: item[1]["total_s"], reverse=True):
+            extra = ", ".join(
+                f"{key}={value:g}" for key, value in row.items()
+                if key not in ("count", "errors", "total_s", "mean_ms", "p50_ms", "p95_ms", "max_ms")
+            )
+            if row["errors"]:
+                extra = f"errors={row['errors']}" + (f", {extra}" if extra else "")
+            lines.append(
+                f"{stage:<{width}}  {row['count']:>6}  {row['total_s']:>9.3f}  {row['mean_ms']:>9.1f}  "
+                f"{row['p50_ms']:>9.1f}  {row['p95_ms']:>9.1f}  {extra}"
+            )
+        return "\n".join(lines)
+
+    def prometheus_text(self, prefix: str = "reviewer") -> str:
+        """Aggregates in the Prometheus text exposition format."""
+        def label(value: str) -> str:
+            return value.replace("\\", "\\\\").replace('"', '\\"')
+
+        report = self.summary()
+        lines = [
+            f"# HELP {prefix}_stage_seconds Wall time per pipeline stage.",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        for stage, row in report.items():
+            stage_label = f'stage="{label(stage)}"'
+            lines.append(f'{prefix}_stage_seconds{{{stage_label},quantile="0.5"}} {row["p50_ms"] / 1000:.6f}')
+            lines.append(f'{prefix}_stage_seconds{{{stage_label},quantile="0.95"}} {row["p95_ms"] / 1000:.6f}')
+            lines.append(f"{prefix}_stage_seconds_sum{{{stage_label}}} {row['total_s']:.6f}")
+            lines.append(f"{prefix}_stage_seconds_count{{{stage_label}}} {row['count']}")
+        lines.append(f"# TYPE {prefix}_stage_errors_total counter")
+        for stage, row in report.items():
+            lines.append(f'{prefix}_stage_errors_total{{stage="{label(stage)}"}} {row["errors"]}')
+
+        fields = sorted({key for row in report.values() for key in row} - {
+            "count", "errors", "total_s", "mean_ms", "p50_ms", "p95_ms", "max_ms"
+        })
+        for key in fields:
+            metric = f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', key)}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for stage, row in report.items():
+                if key in row:
+                    lines.append(f'{metric}{{stage="{label(stage)}"}} {row[key]:g}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def export(self) -> None:
+        """Write the Prometheus file configured in constants (if any) and flush the JSONL log."""
+        if constants.METRICS_PROMETHEUS_PATH:
+            self.write_prometheus(constants.METRICS_PROMETHEUS_PATH)
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.close()
+                self._jsonl = None
+
+
+_recorder: Optional[MetricsRecorder] = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder() -> MetricsRecorder:
+    """Return the process-wide recorder configured from constants."""
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = MetricsRecorder(
+                    enabled=constants.METRICS_ENABLED,
+                    jsonl_path=constants.METRICS_JSONL_PATH,
+                    max_samples=constants.METRICS_MAX_SAMPLES,
+                )
+    return _recorder
+
+
+def stage(name: str, **fields: Any):
+    """Shorthand for get_recorder().stage(name, **fields)."""
+    return get_recorder().stage(name, **fields)
@@ -0,0 +1,99 @@
+import pytest
+
+from caching import disk_store
+from caching.disk_store import SQLiteCacheStore
+from caching.embedding_cache import CachedEmbeddings
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A time.time for disk_store that only moves when advanced."""
+    now = {"t": 1000.0}
+    monkeypatch.setattr(disk_store.time, "time", lambda: now["t"])
+    return now
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    store = SQLiteCacheStore(str(tmp_path / "cache.sqlite"), max_bytes=1000, ttl_seconds=60)
+    store.set("a", b"value")
+    clock["t"] += 60
+    assert store.get("a") == b"value"
+    clock["t"] += 1
+    assert store.get("a") is None
+    assert store.size_bytes() == 0
+
+
+def test_eviction_drops_least_recently_used_to_90_percent(tmp_path, clock):
+    store = SQLiteCacheStore(str(tmp_path / "cache.sqlite"), max_bytes=100)
+    for i in range(10):
+        clock["t"] += 1
+        store.set(f"k{i}", bytes(10))
+    assert store.size_bytes() == 100
+
+    # Reading k0 makes k1 and k2 the least recently used.
+    clock["t"] += 1
+    assert store.get("k0") is not None
+    clock["t"] += 1
+    store.set("k10", bytes(10))
+
+    assert store.size_bytes() == 90
+    assert store.get("k1") is None and store.get("k2") is None
+    assert store.get("k0") is not None and store.get("k10") is not None
+
+
+def test_oversized_values_are_not_stored(tmp_path):
+    store = SQLiteCacheStore(str(tmp_path / "cache.sqlite"), max_bytes=10)
+    store.set("big", bytes(11))
+    assert store.get("big") is None
+    assert store.size_bytes() == 0
+
+
+def test_size_survives_reopening(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    SQLiteCacheStore(path, max_bytes=100).set("a", bytes(7))
+    assert SQLiteCacheStore(path, max_bytes=100).size_bytes() == 7
+
+
+class CountingEmbeddings:
+    def __init__(self, offset):
+        self.offset = offset
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[self.offset + len(text), 0.5] for text in texts]
+
+    def embed_query(self, text):
+        self.calls.append([text])
+        return [self.offset + len(text), 1.5]
+
+
+def test_cache_keys_are_per_model(tmp_path):
+    store = SQLiteCacheStore(str(tmp_path / "cache.sqlite"), max_bytes=10_000)
+    first = CachedEmbeddings(CountingEmbeddings(0), "model-a", store=store)
+    second = CachedEmbeddings(CountingEmbeddings(100), "model-b", store=store)
+
+    assert first.embed_documents(["abc"]) == [[3.0, 0.5]]
+    assert second.embed_documents(["abc"]) == [[103.0, 0.5]]
+    assert len(second.underlying.calls) == 1
+
+    # Same model, fresh memory: served from disk.
+    again = CachedEmbeddings(CountingEmbeddings(0), "model-a", store=store)
+    assert again.embed_documents(["abc"]) == [[3.0, 0.5]]
+    assert again.underlying.calls == []
+    assert again.stats()["disk_hits"] == 1
+
+
+def test_queries_and_documents_are_cached_apart(tmp_path):
+    embeddings = CachedEmbeddings(CountingEmbeddings(0), "model-a")
+    assert embeddings.embed_documents(["abc", "abc"]) == [[3.0, 0.5], [3.0, 0.5]]
+    assert embeddings.embed_query("abc") == [3.0, 1.5]
+    assert embeddings.embed_queries(["abc", "de"]) == [[3.0, 1.5], [2.0, 1.5]]
+    assert embeddings.underlying.calls == [["abc"], ["abc"], ["de"]]
+    assert embeddings.stats()["memory_hits"] == 1
+
+
+def test_returned_vectors_do_not_alias_the_cache():
+    embeddings = CachedEmbeddings(CountingEmbeddings(0), "model-a")
+    embeddings.embed_query("abc").append(9.0)
+    assert embeddings.embed_query("abc") == [3.0, 1.5]
@@ -0,0 +1,39 @@
+from langchain_core.documents import Document
+
+from chains.context_budgeter import ContextBudgeter
+
+
+def chunk(text, **metadata):
+    return Document(page_content=text, metadata={"source": "record.pdf", **metadata})
+
+
+def test_chunks_from_different_pages_with_same_start_index_are_both_kept():
+    packed = ContextBudgeter(token_budget=1000).pack([
+        (chunk("page one text here", page=1, start_index=0), 0.1),
+        (chunk("PAGE TWO DIFFERENT", page=2, start_index=0), 0.2),
+    ])
+    assert packed == "page one text here\n\nPAGE TWO DIFFERENT"
+
+
+def test_overlapping_chunks_with_conflicting_text_are_not_merged():
+    packed = ContextBudgeter(token_budget=1000).pack([
+        (chunk("abcdefgh", start_index=0), 0.1),
+        (chunk("XXXXijkl", start_index=4), 0.2),
+    ])
+    assert packed == "abcdefgh\n\nXXXXijkl"
+
+
+def test_overlapping_chunks_with_matching_text_are_merged():
+    packed = ContextBudgeter(token_budget=1000).pack([
+        (chunk("abcdefgh", page=3, start_index=10), 0.1),
+        (chunk("efghijkl", page=3, start_index=14), 0.2),
+    ])
+    assert packed == "abcdefghijkl"
+
+
+def test_document_offset_takes_precedence_over_page_start_index():
+    packed = ContextBudgeter(token_budget=1000).pack([
+        (chunk("efghijkl", page=2, start_index=0, offset=4), 0.1),
+        (chunk("abcdefgh", page=1, start_index=0, offset=0), 0.2),
+    ])
+    assert packed == "abcdefghijkl"
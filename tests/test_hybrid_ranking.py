@@ -0,0 +1,52 @@
+from langchain_core.documents import Document
+
+from vector_stores.vector_helper import lexical_query_terms, reciprocal_rank_fusion
+
+
+def doc(name, row_id=None):
+    metadata = {"id": row_id} if row_id else {}
+    return Document(page_content=name, metadata=metadata)
+
+
+def names(fused):
+    return [d.page_content for d, _ in fused]
+
+
+def test_fusion_rewards_documents_ranked_by_several_lists():
+    dense = [(doc("a", "1"), 0.1), (doc("b", "2"), 0.2), (doc("c", "3"), 0.3)]
+    lexical = [(doc("b", "2"), 9.0), (doc("c", "3"), 8.0)]
+    fused = reciprocal_rank_fusion([dense, lexical], k=60)
+    assert names(fused) == ["b", "c", "a"]
+    assert fused[0][1] == 1 / 62 + 1 / 61
+    assert fused[2][1] == 1 / 61
+
+
+def test_fusion_ties_keep_first_seen_order():
+    fused = reciprocal_rank_fusion([[(doc("a"), 0.1)], [(doc("b"), 0.1)]], k=60)
+    assert names(fused) == ["a", "b"]
+    assert fused[0][1] == fused[1][1]
+
+
+def test_fusion_keys_on_row_id_then_content():
+    # Same id, different text: one entry, keeping the first document seen.
+    by_id = reciprocal_rank_fusion([[(doc("old", "7"), 0.1)], [(doc("new", "7"), 0.2)]])
+    assert names(by_id) == ["old"]
+    # No id: identical text is the same chunk.
+    by_content = reciprocal_rank_fusion([[(doc("same"), 0.1)], [(doc("same"), 0.2)]])
+    assert len(by_content) == 1
+
+
+def test_fusion_of_nothing_is_empty():
+    assert reciprocal_rank_fusion([]) == []
+    assert reciprocal_rank_fusion([[], []]) == []
+
+
+def test_lexical_terms_keep_doses_and_codes_whole():
+    assert lexical_query_terms("Metformin 120mg, device SN530") == ["metformin", "120mg", "device", "sn530"]
+
+
+def test_lexical_terms_drop_stop_words_short_tokens_and_repeats():
+    assert lexical_query_terms("What is the patient's BP? BP was high, x-ray of a hip") == [
+        "bp", "high", "ray", "hip",
+    ]
+    assert lexical_query_terms("the of a") == []
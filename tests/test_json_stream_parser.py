@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+pytest.importorskip("json_repair")
+
+from chains.json_stream_parser import IncrementalArrayParser, repair_json
+
+CONDITIONS = [
+    {"key": "Asthma", "value": 'said "wheezy {at night}"', "status": "ongoing"},
+    {"key": "C:\\path", "value": "brace } and bracket ] inside", "status": "cleaned up"},
+    {"key": "Gout", "value": "", "status": "ongoing"},
+]
+OUTPUT = json.dumps({"note": "x", "major_conditions": CONDITIONS, "after": [1, 2]})
+
+
+def stream(text, chunk_size):
+    parser = IncrementalArrayParser()
+    emitted = []
+    for start in range(0, len(text), chunk_size):
+        emitted.extend(parser.feed(text[start:start + chunk_size]))
+    return parser, emitted
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 16, len(OUTPUT)])
+def test_objects_are_emitted_whole_at_any_chunk_boundary(chunk_size):
+    parser, emitted = stream(OUTPUT, chunk_size)
+    assert emitted == CONDITIONS
+    result = parser.finish()
+    assert result["major_conditions"] == CONDITIONS
+    assert result["after"] == [1, 2]
+
+
+def test_escaped_quote_split_across_chunks_does_not_end_the_string():
+    text = '{"major_conditions": [{"key": "A", "value": "x \\" } y"}]}'
+    split = text.index("\\") + 1
+    parser = IncrementalArrayParser()
+    assert parser.feed(text[:split]) == []
+    assert parser.feed(text[split:]) == [{"key": "A", "value": 'x " } y'}]
+
+
+def test_nothing_is_emitted_before_the_array_key_arrives():
+    parser = IncrementalArrayParser()
+    assert parser.feed('{"major_cond') == []
+    assert parser.feed('itions": [{"key": "A"}') == [{"key": "A"}]
+
+
+def test_truncated_trailing_object_is_repaired_on_finish():
+    parser, emitted = stream('{"major_conditions": [{"key": "A"}, {"key": "B", "value": "cut of', 5)
+    assert emitted == [{"key": "A"}]
+    result = parser.finish()
+    assert [item["key"] for item in result["major_conditions"]] == ["A", "B"]
+    assert result["major_conditions"][1]["value"].startswith("cut of")
+
+
+def test_finish_without_any_output():
+    assert IncrementalArrayParser().finish() == {"major_conditions": []}
+
+
+def test_repair_json_accepts_valid_json_unchanged():
+    assert repair_json('{"a": [1, 2]}') == {"a": [1, 2]}
+
+
+def test_repair_json_drops_trailing_commas():
+    assert repair_json('{"a": [1, 2,], "b": "c",}') == {"a": [1, 2], "b": "c"}
+
+
+def test_repair_json_closes_truncated_input():
+    assert repair_json('{"major_conditions": [{"key": "Asthma", "status": "ongo') == {
+        "major_conditions": [{"key": "Asthma", "status": "ongo"}]
+    }
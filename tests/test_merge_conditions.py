@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("langchain_openai")
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+import constants
+from chains.fetch_diagnosis_chain import FetchDiagnosisChain, merge_conditions
+from instrumentation.metrics import get_recorder
+
+
+def condition(key, start="", end="", status="ongoing", value=""):
+    return {"key": key, "value": value, "start_date": start, "end_date": end, "status": status}
+
+
+def test_duplicates_across_windows_are_merged_by_normalised_name():
+    merged = merge_conditions([
+        {"major_conditions": [condition("Asthma (SN530)", "03-14-2012", value="inhaler")]},
+        {"major_conditions": [condition("asthma", "01-02-2010", value="inhaler")]},
+    ])["major_conditions"]
+    assert len(merged) == 1
+    assert merged[0]["key"] == "Asthma (SN530)"
+    assert merged[0]["start_date"] == "01-02-2010"
+    assert merged[0]["value"] == "inhaler"
+
+
+def test_cleaned_up_only_if_every_window_says_so_and_takes_the_latest_end():
+    merged = merge_conditions([
+        {"major_conditions": [condition("Pneumonia", "01-10-2019", "01-20-2019", "cleaned up", "a")]},
+        {"major_conditions": [condition("Pneumonia", "01-12-2019", "02-01-2019", "cleaned up", "b")]},
+    ])["major_conditions"]
+    assert merged == [condition("Pneumonia", "01-10-2019", "02-01-2019", "cleaned up", "a; b")]
+
+
+def test_conflicting_status_is_ongoing_without_an_end_date():
+    merged = merge_conditions([
+        {"major_conditions": [condition("Gout", "05-01-2020", "06-01-2020", "cleaned up")]},
+        {"major_conditions": [condition("Gout", "07-01-2021", "08-01-2021", "ongoing")]},
+    ])["major_conditions"]
+    assert merged[0]["status"] == "ongoing"
+    assert merged[0]["end_date"] == ""
+    assert merged[0]["start_date"] == "05-01-2020"
+
+
+def test_malformed_entries_are_skipped():
+    merged = merge_conditions([
+        None,
+        {"major_conditions": ["not a dict", condition(""), condition("Eczema", "not a date")]},
+    ])["major_conditions"]
+    assert merged == [condition("Eczema", "not a date")]
+
+
+def test_failed_windows_are_recorded_and_the_rest_merged():
+    chain = FetchDiagnosisChain(tag_name="test")
+    recorder = get_recorder()
+    recorder.reset()
+    result = chain._reduce([
+        {"major_conditions": [condition("Asthma")]},
+        TimeoutError("window timed out"),
+    ])
+    assert [item["key"] for item in result["major_conditions"]] == ["Asthma"]
+    assert recorder.summary()["map_window"]["errors"] == 1
+
+
+def test_all_windows_failing_raises_the_first_error():
+    chain = FetchDiagnosisChain(tag_name="test")
+    with pytest.raises(TimeoutError):
+        chain._reduce([TimeoutError("first"), ValueError("second")])
+
+
+def test_async_map_reduce_holds_the_llm_semaphore_per_window(monkeypatch):
+    monkeypatch.setattr(constants, "DIAGNOSIS_MAP_WINDOW_TOKENS", 50)
+    monkeypatch.setattr(constants, "DIAGNOSIS_MAP_CONCURRENCY", 4)
+    chain = FetchDiagnosisChain(tag_name="test")
+    running = {"now": 0, "peak": 0}
+
+    async def fake_llm(prompt_value):
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+        return AIMessage(content=json.dumps({"major_conditions": [condition("Asthma", "03-14-2012")]}))
+
+    chain.task_llm = RunnableLambda(fake_llm)
+    record = "\n\n".join(f"Paragraph {i} about the patient's asthma and inhaler use." for i in range(20))
+    assert len(chain.split_windows(record)) > 4
+
+    async def run():
+        return await chain.arun_task_chain(record, mode="map_reduce", llm_semaphore=asyncio.Semaphore(2))
+
+    merged = asyncio.run(run())
+    assert [c["key"] for c in merged["major_conditions"]] == ["Asthma"]
+    assert running["peak"] == 2
@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+pytest.importorskip("langchain_openai")
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+import constants
+from agents.reviewer_agent import ReviewerAgent, find_evidence, split_evidence_chunks, structural_issues
+
+CONTEXT = (
+    "Seen for persistent asthma, uses a salbutamol inhaler.\n\n"
+    "Blood pressure normal. Hayfever in summer."
+)
+
+
+def condition(key, value="", start="03-14-2012", end="", status="ongoing"):
+    return {"key": key, "value": value, "start_date": start, "end_date": end, "status": status}
+
+
+def test_split_evidence_chunks_splits_blocks_and_long_text():
+    chunks = split_evidence_chunks("a" * 5 + "\n\n\n\n" + "b" * 12, max_chars=5)
+    assert chunks == ["aaaaa", "bbbbb", "bbbbb", "bb"]
+
+
+def test_supported_condition_is_fully_covered():
+    coverage, evidence = find_evidence(condition("Persistent Asthma"), split_evidence_chunks(CONTEXT))
+    assert coverage == 1.0
+    assert evidence[0].startswith("Seen for persistent asthma")
+
+
+def test_unsupported_condition_has_no_coverage_or_evidence():
+    assert find_evidence(condition("Type 2 diabetes"), split_evidence_chunks(CONTEXT)) == (0.0, [])
+
+
+def test_value_words_break_ties_between_chunks():
+    chunks = ["asthma review", "asthma inhaler salbutamol"]
+    coverage, evidence = find_evidence(condition("Asthma", value="salbutamol inhaler"), chunks)
+    assert coverage == 1.0
+    assert evidence[0] == "asthma inhaler salbutamol"
+
+
+def test_condition_without_a_name_has_no_evidence():
+    assert find_evidence(condition(""), split_evidence_chunks(CONTEXT)) == (0.0, [])
+
+
+def test_structural_issues_for_malformed_condition():
+    issues = structural_issues(condition("Asthma", start="2012-03-14", end="soon", status="active"))
+    assert len(issues) == 3
+    assert structural_issues(condition("Asthma", status="Cleaned up", end="01-01-2020")) == []
+
+
+@pytest.fixture
+def reviewer(tmp_path, monkeypatch):
+    monkeypatch.setattr(constants, "LLM_CACHE_DIR", str(tmp_path))
+    agent = ReviewerAgent(tag_name="test")
+    agent.calls = []
+
+    def fake_llm(prompt_value):
+        agent.calls.append(prompt_value.to_string())
+        return AIMessage(content=agent.reply)
+
+    agent.llm = RunnableLambda(fake_llm)
+    agent.reply = json.dumps({"verdict": "needs_fix", "comment": "not in the record"})
+    return agent
+
+
+def review(agent, *conditions):
+    return agent.review_incremental("task", CONTEXT, {"major_conditions": list(conditions)})
+
+
+def test_supported_conditions_skip_the_llm(reviewer):
+    result = review(reviewer, condition("Asthma"), condition("Hayfever"))
+    assert result["verdict"] == "ok"
+    assert result["llm_checked"] == 0
+    assert reviewer.calls == []
+
+
+def test_unsupported_condition_is_sent_alone_and_verdict_is_cached(reviewer):
+    result = review(reviewer, condition("Asthma"), condition("Gout"))
+    assert result["flagged"] == ["Gout"]
+    assert len(reviewer.calls) == 1
+    assert "Gout" in reviewer.calls[0] and "missing" not in reviewer.calls[0].split("Condition JSON:")[1]
+
+    again = review(reviewer, condition("Asthma"), condition("Gout"))
+    assert again["flagged"] == ["Gout"]
+    assert again["llm_checked"] == 0
+    assert len(reviewer.calls) == 1
+
+
+def test_malformed_verdict_flags_but_is_not_cached(reviewer):
+    reviewer.reply = json.dumps(["not", "a", "verdict"])
+    assert review(reviewer, condition("Gout"))["flagged"] == ["Gout"]
+    reviewer.reply = json.dumps({"verdict": "ok", "comment": "fine"})
+    assert review(reviewer, condition("Gout"))["verdict"] == "ok"
+    assert len(reviewer.calls) == 2
+
+
+def test_structural_issues_are_flagged_without_the_llm(reviewer):
+    result = review(reviewer, condition("Asthma", start="2012"))
+    assert result["flagged"] == ["Asthma"]
+    assert "start_date" in result["comment"]
+    assert reviewer.calls == []
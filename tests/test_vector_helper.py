@@ -0,0 +1,56 @@
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+pytest.importorskip("faiss")
+
+from vector_stores.faiss_backend import FaissBackend
+from vector_stores.vector_helper import VectorHelper, content_hash
+
+
+def make_helper(index_dir):
+    return VectorHelper(
+        embeddings=DeterministicFakeEmbedding(size=8),
+        backend=FaissBackend(index_dir=str(index_dir)),
+        working_set=False,
+    )
+
+
+def chunks(count):
+    return [Document(page_content=f"chunk number {i}", metadata={}) for i in range(count)]
+
+
+def test_interrupted_first_ingest_is_completed_on_the_next_run(tmp_path, monkeypatch):
+    helper = make_helper(tmp_path)
+    doc_hash = content_hash("whole document")
+    add_chunks = helper.add_chunks
+
+    def failing_add_chunks(documents, batch_size=256):
+        add_chunks(documents[:2], batch_size)
+        raise RuntimeError("embedding service went away")
+
+    monkeypatch.setattr(helper, "add_chunks", failing_add_chunks)
+    with pytest.raises(RuntimeError):
+        helper.sync_chunks("record.pdf", doc_hash, chunks(5))
+    monkeypatch.undo()
+
+    stored = helper.backend.source_chunk_hashes("record.pdf")
+    assert len(stored) == 2
+    assert all(row["doc_hash"] is None for row in stored)
+
+    plan = helper.sync_chunks("record.pdf", doc_hash, chunks(5))
+    assert not plan.unchanged
+    assert len(plan.new_chunks) == 3
+    stored = helper.backend.source_chunk_hashes("record.pdf")
+    assert len(stored) == 5
+    assert all(row["doc_hash"] == doc_hash for row in stored)
+
+    assert helper.sync_chunks("record.pdf", doc_hash, chunks(5)).unchanged
+
+
+def test_unnamed_texts_do_not_replace_each_other(tmp_path):
+    helper = make_helper(tmp_path)
+    helper.create_vectorization("first text about asthma")
+    helper.create_vectorization("second text about diabetes")
+    documents = [row[1] for row in helper.backend.search([0.1] * 8, 10)]
+    assert sorted(documents) == ["first text about asthma", "second text about diabetes"]
@@ -0,0 +1,95 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from vector_stores.working_set import DocumentWorkingSet
+
+
+class FakeBackend:
+    """Serves source_embeddings from a dict and counts the loads."""
+    def __init__(self, sources):
+        self.sources = sources
+        self.loads = []
+
+    def source_embeddings(self, source):
+        self.loads.append(source)
+        return self.sources.get(source, [])
+
+
+def rows(source, count):
+    return [
+        (f"{source}-{i}", f"{source} chunk {i}", {"source": source}, [1.0, float(i)])
+        for i in range(count)
+    ]
+
+
+# Two float32 values per chunk.
+CHUNK_BYTES = 8
+
+
+@pytest.fixture
+def backend():
+    return FakeBackend({"a": rows("a", 2), "b": rows("b", 2), "c": rows("c", 2)})
+
+
+def test_search_orders_by_distance_and_counts_hits(backend):
+    working_set = DocumentWorkingSet(backend, max_bytes=1000)
+    first = working_set.search([1.0, 0.0], "a", k=2)
+    assert [doc.metadata["id"] for doc, _ in first] == ["a-0", "a-1"]
+    assert first[0][1] == pytest.approx(0.0, abs=1e-6)
+
+    working_set.search([0.0, 1.0], "a", k=1)
+    assert backend.loads == ["a"]
+    assert working_set.stats() == {"sources": 1, "bytes": 2 * CHUNK_BYTES, "hits": 1, "misses": 1}
+
+
+def test_score_bounds_filter_results(backend):
+    working_set = DocumentWorkingSet(backend, max_bytes=1000)
+    assert [doc.page_content for doc, _ in working_set.search([1.0, 0.0], "a", k=2, max_score=0.1)] == ["a chunk 0"]
+    assert [doc.page_content for doc, _ in working_set.search([1.0, 0.0], "a", k=2, min_score=0.1)] == ["a chunk 1"]
+
+
+def test_results_are_copies_of_the_cached_chunks(backend):
+    working_set = DocumentWorkingSet(backend, max_bytes=1000)
+    doc, _ = working_set.search([1.0, 0.0], "a", k=1)[0]
+    doc.metadata["score"] = 0.5
+    doc.page_content = "changed"
+    again, _ = working_set.search([1.0, 0.0], "a", k=1)[0]
+    assert again.page_content == "a chunk 0"
+    assert "score" not in again.metadata
+
+
+def test_least_recently_used_source_is_evicted_by_bytes(backend):
+    working_set = DocumentWorkingSet(backend, max_bytes=4 * CHUNK_BYTES)
+    working_set.search([1.0, 0.0], "a", k=1)
+    working_set.search([1.0, 0.0], "b", k=1)
+    working_set.search([1.0, 0.0], "a", k=1)
+    working_set.search([1.0, 0.0], "c", k=1)
+
+    assert working_set.stats()["sources"] == 2
+    assert working_set.stats()["bytes"] == 4 * CHUNK_BYTES
+    working_set.search([1.0, 0.0], "a", k=1)
+    working_set.search([1.0, 0.0], "b", k=1)
+    assert backend.loads == ["a", "b", "c", "b"]
+
+
+def test_sources_too_large_or_missing_fall_back(backend):
+    working_set = DocumentWorkingSet(backend, max_bytes=CHUNK_BYTES)
+    assert working_set.search([1.0, 0.0], "a", k=1) is None
+    assert working_set.search([1.0, 0.0], "missing", k=1) is None
+    assert working_set.stats()["sources"] == 0
+
+
+def test_invalidate_reloads_the_source(backend):
+    working_set = DocumentWorkingSet(backend, max_bytes=1000)
+    working_set.search([1.0, 0.0], "a", k=1)
+    working_set.search([1.0, 0.0], "b", k=1)
+
+    backend.sources["a"] = rows("a", 3)
+    working_set.invalidate("a")
+    assert len(working_set.search([1.0, 0.0], "a", k=5)) == 3
+    assert working_set.stats()["bytes"] == 5 * CHUNK_BYTES
+
+    working_set.invalidate()
+    assert working_set.stats()["sources"] == 0 and working_set.stats()["bytes"] == 0
+    assert backend.loads == ["a", "b", "a"]
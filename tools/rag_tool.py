@@ -1,28 +1,108 @@
-from langchain.tools import tool
-from vector_stores.vector_helper import VectorHelper
+from typing import List, Optional
+from langchain_core.tools import tool
+from vector_stores.embedding_backends import embed_queries
+from vector_stores.registry import get_vector_helper
 from schemas.rag_tool_parameters import PatientSearchInput
+from chains.context_budgeter import ContextBudgeter
+from instrumentation.metrics import stage
 import constants
 
-vectorstore = VectorHelper()
+# Minimum cosine similarity of a retrieved chunk; searches take the nearest
+# chunks within the matching distance cutoff (distance = 1 - similarity).
+SIMILARITY_THRESHOLD = 0.8
+MAX_DISTANCE = 1 - SIMILARITY_THRESHOLD
 
-@tool("patient_document_search", description="Retrieve patient information regarding the all medical history",args_schema=PatientSearchInput, return_direct=True)
-def rag_patient_retrieval(query: str, file_path: str) -> str:
-    """
-    Retrieve patient information from PGVector
+
+def retrieve_patient_context(query: str, file_path: str) -> str:
     """
-    print("call patient_document_search...")
-    similarity_threshold = 0.8
-    all_chunks = []
+    Retrieve patient information from PGVector.
 
+    Plain function behind the patient_document_search tool, so callers that do
+    not need an LLM tool-calling loop can search directly.
+    """
     print(f"Retrieval Query: {query}")
     print(f"file_path: {file_path}")
+    with stage("embed"):
+        embedding = get_vector_helper().embeddings.embed_query(query)
+    return retrieve_patient_context_by_vector(embedding, file_path, query=query)
 
-    docs = vectorstore.search_with_cosine_similarity(query, k=constants.TOP_K, filter={"source": file_path})
-    print(f"Found {len(docs)} documents for query: {query}")
-        
-    for doc, score in docs:
-        if score is not None and score >= similarity_threshold:
-            all_chunks.append(doc)
 
-    final_context = "\n\n".join([chunk.page_content for chunk in all_chunks])
-    return final_context
\ No newline at end of file
+def retrieve_patient_context_by_vector(
+    embedding: List[float],
+    file_path: str,
+    query: Optional[str] = None,
+) -> str:
+    """Same as retrieve_patient_context for an already embedded query (DB work only)."""
+    if constants.RETRIEVAL_SEARCH_MODE == "hybrid" and query:
+        with stage("search", mode="hybrid") as fields:
+            scored_chunks = get_vector_helper().hybrid_search(
+                query,
+                k=constants.HYBRID_TOP_K,
+                filter={"source": file_path},
+                embedding=embedding,
+            )
+            fields["chunks"] = len(scored_chunks)
+        print(f"Found {len(scored_chunks)} documents (hybrid) for file_path: {file_path}")
+        with stage("pack", chunks=len(scored_chunks)) as fields:
+            final_context = ContextBudgeter(higher_is_better=True).pack(scored_chunks)
+            fields["context_chars"] = len(final_context)
+        return final_context
+
+    # Threshold, source filter and ordering run in SQL; only qualifying rows are streamed back.
+    with stage("search", mode="dense") as fields:
+        docs = get_vector_helper().search_by_vector_with_score_threshold(
+            embedding,
+            k=constants.TOP_K,
+            filter={"source": file_path},
+            max_score=MAX_DISTANCE,
+        )
+        scored_chunks = list(docs)
+        fields["chunks"] = len(scored_chunks)
+    print(f"Found {len(scored_chunks)} documents for file_path: {file_path}")
+
+    # Dedupe overlapping chunks and fit them into the model's token budget.
+    with stage("pack", chunks=len(scored_chunks)) as fields:
+        final_context = ContextBudgeter().pack(scored_chunks)
+        fields["context_chars"] = len(final_context)
+    return final_context
+
+
+def retrieve_patient_context_multi(queries: List[str], file_path: str) -> str:
+    """
+    Retrieve patient information for several queries at once.
+
+    The queries are embedded in one batch and searched in one backend round
+    trip; their results are fused and deduplicated before packing.
+    """
+    print(f"Retrieval Queries: {queries}")
+    print(f"file_path: {file_path}")
+    with stage("embed", queries=len(queries)):
+        embeddings = embed_queries(get_vector_helper().embeddings, queries)
+    return retrieve_patient_context_by_vectors(queries, embeddings, file_path)
+
+
+def retrieve_patient_context_by_vectors(queries: List[str], embeddings: List[List[float]], file_path: str) -> str:
+    """Same as retrieve_patient_context_multi for already embedded queries (DB work only)."""
+    with stage("search", mode="multi", queries=len(queries)) as fields:
+        result = get_vector_helper().multi_query_search(
+            queries,
+            k=constants.TOP_K,
+            filter={"source": file_path},
+            max_score=MAX_DISTANCE,
+            embeddings=embeddings,
+        )
+        fields["chunks"] = len(result.fused)
+    print(f"Found {len(result.fused)} documents for {len(queries)} queries for file_path: {file_path}")
+    with stage("pack", chunks=len(result.fused)) as fields:
+        final_context = ContextBudgeter(higher_is_better=True).pack(result.fused)
+        fields["context_chars"] = len(final_context)
+    return final_context
+
+
+@tool("patient_document_search", description="Retrieve patient information regarding the all medical history",args_schema=PatientSearchInput, return_direct=True)
+def rag_patient_retrieval(query: str, file_path: str) -> str:
+    """
+    Retrieve patient information from PGVector
+    """
+    print("call patient_document_search...")
+    return retrieve_patient_context(query, file_path)
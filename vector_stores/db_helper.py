@@ -1,8 +1,16 @@
+import io
+import json
+import asyncio
 import os
+import threading
+import time
+import uuid
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, Generator, Iterable, Optional, Tuple, Union
+from typing import Any, Dict, Generator, Iterable, List, Optional, Tuple, Union
 from dotenv import load_dotenv
+import constants
+from instrumentation.metrics import get_recorder, stage_path
 load_dotenv()
 
 # Try to load environment variables from a .env file if python-dotenv is installed.
@@ -50,18 +58,17 @@ _DB_SSLMODE = os.getenv("DB_SSLMODE", "prefer")
 
 # Lazy import to avoid hard dependency errors at import time if not installed yet
 _psycopg2 = None
-_pool = None
+_engine = None
+_engine_lock = threading.Lock()
 
 
 def _import_psycopg2():
     global _psycopg2
     if _psycopg2 is None:
         import psycopg2  # type: ignore
-        from psycopg2 import pool as pg_pool  # type: ignore
         from psycopg2.extras import DictCursor  # type: ignore
         _psycopg2 = {
             "psycopg2": psycopg2,
-            "pool": pg_pool,
             "DictCursor": DictCursor,
         }
     return _psycopg2
@@ -75,40 +82,97 @@ def get_dsn() -> str:
     )
 
 
-def init_connection_pool(minconn: int = 1, maxconn: int = 5) -> None:
-    """Initialize a global connection pool.
+def get_database_url():
+    """SQLAlchemy URL for the same database as get_dsn()."""
+    from sqlalchemy.engine import URL
 
-    Safe to call multiple times; subsequent calls are ignored once initialized.
+    return URL.create(
+        "postgresql+psycopg2",
+        username=_DB_USER,
+        password=_DB_PASSWORD,
+        host=_DB_HOST,
+        port=_DB_PORT,
+        database=_DB_NAME,
+    )
+
+
+def init_connection_pool(
+    pool_size: int = constants.DB_POOL_SIZE,
+    max_overflow: int = constants.DB_POOL_MAX_OVERFLOW,
+) -> None:
+    """Initialize the shared SQLAlchemy engine and its connection pool.
+
+    One thread-safe QueuePool serves db_helper and the PGVector store. Connections
+    are pinged before use, recycled after DB_POOL_RECYCLE_S and get a server-side
+    statement_timeout. Safe to call multiple times; later calls are ignored.
     """
-    global _pool
-    if _pool is not None:
+    global _engine
+    if _engine is not None:
         return
-    m = _import_psycopg2()
-    _pool = m["pool"].SimpleConnectionPool(minconn, maxconn, dsn=get_dsn())
+    with _engine_lock:
+        if _engine is not None:
+            return
+        from sqlalchemy import create_engine
+
+        options = f"-c statement_timeout={int(constants.DB_STATEMENT_TIMEOUT_MS)}"
+        _engine = create_engine(
+            get_database_url(),
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=constants.DB_POOL_TIMEOUT_S,
+            pool_recycle=constants.DB_POOL_RECYCLE_S,
+            pool_pre_ping=True,
+            connect_args={
+                "sslmode": _DB_SSLMODE,
+                "options": options,
+                "application_name": "reviewer_agent",
+            },
+        )
+
+
+def get_engine():
+    """Return the shared SQLAlchemy engine, creating the pool on first use."""
+    init_connection_pool()
+    return _engine
 
 
 def close_connection_pool() -> None:
-    """Close the global connection pool if initialized."""
-    global _pool
-    if _pool is not None:
-        _pool.closeall()
-        _pool = None
+    """Dispose of the shared engine and close every pooled connection."""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+
+def pool_status() -> Dict[str, Any]:
+    """Current pool occupancy (size, checked out, overflow)."""
+    if _engine is None:
+        return {}
+    pool = _engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+    }
 
 
 def get_connection():
-    """Get a database connection, using the pool if available."""
-    m = _import_psycopg2()
-    if _pool is None:
-        return m["psycopg2"].connect(dsn=get_dsn())
-    return _pool.getconn()
+    """Check a DBAPI connection out of the shared pool.
+
+    Time spent waiting for a free connection is recorded as the "db_pool_wait" stage.
+    """
+    engine = get_engine()
+    started = time.perf_counter()
+    conn = engine.raw_connection()
+    get_recorder().record(stage_path("db_pool_wait"), time.perf_counter() - started)
+    return conn
 
 
 def put_connection(conn) -> None:
-    """Return a connection to the pool or close it if pooling is not active."""
-    if _pool is None:
-        conn.close()
-    else:
-        _pool.putconn(conn)
+    """Return a connection to the pool."""
+    conn.close()
 
 
 @contextmanager
@@ -143,14 +207,20 @@ def execute_sql(
     *,
     fetch: Optional[str] = None,
     dict_rows: bool = True,
+    statement_timeout_ms: Optional[int] = None,
 ):
     """Execute a SQL statement with optional fetch.
 
     - fetch=None: no fetch, returns None
     - fetch="one": fetchone()
     - fetch="all": fetchall()
+
+    statement_timeout_ms overrides the pool's DB_STATEMENT_TIMEOUT_MS for this
+    statement only (0 disables it, e.g. for index builds).
     """
-    with get_cursor(dict_rows=dict_rows) as cur:
+    with get_recorder().stage("sql"), get_cursor(dict_rows=dict_rows) as cur:
+        if statement_timeout_ms is not None:
+            cur.execute("SELECT set_config('statement_timeout', %s, true)", (str(int(statement_timeout_ms)),))
         cur.execute(query, params)
         if fetch is None:
             return None
@@ -161,11 +231,543 @@ def execute_sql(
         raise ValueError("fetch must be None, 'one', or 'all'")
 
 
+async def aexecute_sql(
+    query: str,
+    params: Optional[Union[Tuple[Any, ...], Dict[str, Any]]] = None,
+    **kwargs: Any,
+):
+    """execute_sql on a worker thread, for use from asyncio code (same shared pool)."""
+    return await asyncio.to_thread(execute_sql, query, params, **kwargs)
+
+
+def stream_sql(
+    query: str,
+    params: Optional[Union[Tuple[Any, ...], Dict[str, Any]]] = None,
+    *,
+    itersize: int = 500,
+    dict_rows: bool = True,
+    settings: Optional[Dict[str, Any]] = None,
+) -> Generator[Any, None, None]:
+    """Yield rows from a server-side (named) cursor, itersize rows per round trip.
+
+    settings are applied with set_config(..., is_local => true), so they only
+    last for this query's transaction (e.g. {"hnsw.ef_search": 100}).
+    """
+    m = _import_psycopg2()
+    conn = get_connection()
+    cursor_factory = m["DictCursor"] if dict_rows else None
+    cur = conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=cursor_factory)
+    cur.itersize = itersize
+    finished = False
+    # Only time spent waiting on the database counts, not the consumer's work between rows.
+    db_seconds = 0.0
+    rows = 0
+    try:
+        started = time.perf_counter()
+        if settings:
+            with conn.cursor() as setting_cur:
+                for name, value in settings.items():
+                    setting_cur.execute("SELECT set_config(%s, %s, true)", (name, str(value)))
+        cur.execute(query, params)
+        iterator = iter(cur)
+        while True:
+            row = next(iterator, None)
+            db_seconds += time.perf_counter() - started
+            if row is None:
+                break
+            rows += 1
+            yield row
+            started = time.perf_counter()
+        finished = True
+    finally:
+        get_recorder().record(stage_path("sql"), db_seconds, rows=rows)
+        try:
+            cur.close()
+            if finished:
+                conn.commit()
+            else:
+                conn.rollback()
+        finally:
+            put_connection(conn)
+
+
 def ensure_pgvector_extension() -> None:
     """Ensure the pgvector extension is available in the current database."""
     execute_sql("CREATE EXTENSION IF NOT EXISTS vector;")
 
 
+# Table names created by langchain_community's PGVector store.
+COLLECTION_TABLE = "langchain_pg_collection"
+EMBEDDING_TABLE = "langchain_pg_embedding"
+
+
+def get_collection_id(collection_name: str) -> Optional[str]:
+    """Return the uuid of a PGVector collection, or None if it does not exist."""
+    row = execute_sql(
+        f"SELECT uuid FROM {COLLECTION_TABLE} WHERE name = %s",
+        (collection_name,),
+        fetch="one",
+    )
+    return str(row["uuid"]) if row else None
+
+
+def _copy_escape(value: str) -> str:
+    """Escape a value for PostgreSQL's COPY text format."""
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _vector_literal(embedding: Iterable[float]) -> str:
+    return "[" + ",".join(str(float(x)) for x in embedding) + "]"
+
+
+def copy_embeddings(
+    collection_id: str,
+    texts: List[str],
+    embeddings: List[List[float]],
+    metadatas: List[Dict[str, Any]],
+    ids: Optional[List[str]] = None,
+) -> List[str]:
+    """Bulk insert embedding rows with a single COPY instead of row-by-row INSERTs.
+
+    Returns the custom ids written for each row.
+    """
+    if ids is None:
+        ids = [str(uuid.uuid4()) for _ in texts]
+
+    buffer = io.StringIO()
+    for text, embedding, metadata, custom_id in zip(texts, embeddings, metadatas, ids):
+        buffer.write(
+            "\t".join(
+                (
+                    str(uuid.uuid4()),
+                    collection_id,
+                    _vector_literal(embedding),
+                    _copy_escape(text.replace("\x00", "")),
+                    _copy_escape(json.dumps(metadata, default=str)),
+                    _copy_escape(custom_id),
+                )
+            )
+        )
+        buffer.write("\n")
+    buffer.seek(0)
+
+    with get_cursor(dict_rows=False) as cur:
+        cur.copy_expert(
+            f"COPY {EMBEDDING_TABLE} (uuid, collection_id, embedding, document, cmetadata, custom_id) "
+            "FROM STDIN",
+            buffer,
+        )
+    return ids
+
+
+def fetch_source_chunk_hashes(collection_id: str, source: str):
+    """Return (uuid, chunk_hash, doc_hash) rows stored for one source document."""
+    return execute_sql(
+        f"""
+        SELECT uuid::text AS uuid,
+               cmetadata->>'chunk_hash' AS chunk_hash,
+               cmetadata->>'doc_hash' AS doc_hash
+        FROM {EMBEDDING_TABLE}
+        WHERE collection_id = %s AND cmetadata->>'source' = %s
+        """,
+        (collection_id, source),
+        fetch="all",
+    )
+
+
+def fetch_source_embeddings(collection_id: str, source: str):
+    """Return every stored chunk of one source with its embedding as a float array."""
+    return execute_sql(
+        f"""
+        SELECT uuid::text AS id, document, cmetadata, embedding::real[] AS embedding
+        FROM {EMBEDDING_TABLE}
+        WHERE collection_id = %s AND cmetadata->>'source' = %s
+        """,
+        (collection_id, source),
+        fetch="all",
+    )
+
+
+def delete_embeddings(uuids: List[str]) -> None:
+    """Delete embedding rows by primary key."""
+    if not uuids:
+        return
+    execute_sql(f"DELETE FROM {EMBEDDING_TABLE} WHERE uuid = ANY(%s::uuid[])", (list(uuids),))
+
+
+def set_source_doc_hash(collection_id: str, source: str, doc_hash: str) -> None:
+    """Stamp every stored chunk of a source with the current document hash."""
+    execute_sql(
+        f"""
+        UPDATE {EMBEDDING_TABLE}
+        SET cmetadata = (cmetadata::jsonb || jsonb_build_object('doc_hash', %s::text))::json
+        WHERE collection_id = %s AND cmetadata->>'source' = %s
+          AND cmetadata->>'doc_hash' IS DISTINCT FROM %s
+        """,
+        (doc_hash, collection_id, source, doc_hash),
+    )
+
+
+# pgvector operators for each PGVector distance strategy.
+DISTANCE_OPERATORS = {"cosine": "<=>", "euclidean": "<->", "inner": "<#>"}
+
+
+def _metadata_filter_sql(filter: Optional[Dict[str, Any]], params: Dict[str, Any]) -> str:
+    clauses = []
+    for i, (key, value) in enumerate((filter or {}).items()):
+        params[f"filter_key_{i}"] = key
+        params[f"filter_value_{i}"] = str(value)
+        clauses.append(f"AND cmetadata->>%(filter_key_{i})s = %(filter_value_{i})s")
+    return "\n".join(clauses)
+
+
+def _order_by_distance(distance: str, filter: Optional[Dict[str, Any]]) -> str:
+    # "+ 0" keeps the planner off the ANN index, which only orders by the bare operator.
+    return f"{distance} + 0" if filter else distance
+
+
+def stream_similarity_search(
+    collection_id: str,
+    embedding: List[float],
+    k: int,
+    filter: Optional[Dict[str, Any]] = None,
+    min_score: Optional[float] = None,
+    max_score: Optional[float] = None,
+    distance_operator: str = DISTANCE_OPERATORS["cosine"],
+    settings: Optional[Dict[str, Any]] = None,
+) -> Generator[Any, None, None]:
+    """
+    Stream (id, document, cmetadata, distance) rows nearest to embedding.
+
+    Metadata equality filters, the score bounds, ordering and the limit are all
+    applied in SQL, so only qualifying rows leave the database. Embeddings
+    themselves are never sent back.
+
+    With a metadata filter the ranking is exact: an ANN index scan yields at
+    most ef_search (or probes' worth of) rows before the filter is applied, so
+    a selective filter would leave few or none. The filtered rows come from the
+    source index instead and are sorted by their true distance.
+    """
+    params: Dict[str, Any] = {
+        "query": _vector_literal(embedding),
+        "collection_id": collection_id,
+        "k": k,
+    }
+    distance = f"(embedding {distance_operator} %(query)s::vector)"
+    bounds = []
+    if min_score is not None:
+        params["min_score"] = min_score
+        bounds.append(f"AND {distance} >= %(min_score)s")
+    if max_score is not None:
+        params["max_score"] = max_score
+        bounds.append(f"AND {distance} <= %(max_score)s")
+
+    query = f"""
+        SELECT uuid::text AS id, document, cmetadata, {distance} AS distance
+        FROM {EMBEDDING_TABLE}
+        WHERE collection_id = %(collection_id)s
+        {_metadata_filter_sql(filter, params)}
+        {" ".join(bounds)}
+        ORDER BY {_order_by_distance(distance, filter)}
+        LIMIT %(k)s
+    """
+    return stream_sql(query, params, settings=settings)
+
+
+def stream_reranked_similarity_search(
+    collection_id: str,
+    embedding: List[float],
+    k: int,
+    storage: str,
+    candidates: int,
+    filter: Optional[Dict[str, Any]] = None,
+    max_score: Optional[float] = None,
+    distance_operator: str = DISTANCE_OPERATORS["cosine"],
+    settings: Optional[Dict[str, Any]] = None,
+) -> Generator[Any, None, None]:
+    """
+    Two-pass variant of stream_similarity_search for halfvec/binary storage.
+
+    The inner query takes the nearest candidates rows by the compact encoding,
+    which the compact ANN index serves. The outer query rescores only those
+    with the full-precision vectors, applies max_score and returns the best k,
+    so distances mean exactly what they do in stream_similarity_search.
+    A lower score bound cannot be served by a nearest-first candidate pass,
+    and a metadata filter is only applied to the rows the index scan returns;
+    use stream_similarity_search for either.
+    """
+    params: Dict[str, Any] = {
+        "query": _vector_literal(embedding),
+        "collection_id": collection_id,
+        "k": k,
+        "candidates": max(candidates, k),
+    }
+    compact_column, compact_query = _compact_expressions(storage, len(embedding))
+    compact_operator = _compact_operator(storage, distance_operator)
+    distance = f"(embedding {distance_operator} %(query)s::vector)"
+    bound = ""
+    if max_score is not None:
+        params["max_score"] = max_score
+        bound = f"WHERE {distance} <= %(max_score)s"
+
+    query = f"""
+        SELECT uuid::text AS id, document, cmetadata, {distance} AS distance
+        FROM (
+            SELECT uuid, document, cmetadata, embedding
+            FROM {EMBEDDING_TABLE}
+            WHERE collection_id = %(collection_id)s
+            {_metadata_filter_sql(filter, params)}
+            ORDER BY {compact_column} {compact_operator} {compact_query}
+            LIMIT %(candidates)s
+        ) AS candidates
+        {bound}
+        ORDER BY distance
+        LIMIT %(k)s
+    """
+    return stream_sql(query, params, settings=settings)
+
+
+def stream_multi_similarity_search(
+    collection_id: str,
+    embeddings: List[List[float]],
+    k: int,
+    filter: Optional[Dict[str, Any]] = None,
+    min_score: Optional[float] = None,
+    max_score: Optional[float] = None,
+    distance_operator: str = DISTANCE_OPERATORS["cosine"],
+    settings: Optional[Dict[str, Any]] = None,
+    storage: str = "full",
+    candidates: Optional[int] = None,
+) -> Generator[Any, None, None]:
+    """
+    Run one nearest-neighbour search per embedding in a single statement.
+
+    The query vectors are a VALUES list joined LATERAL to the same search
+    stream_similarity_search runs, or to the candidate pass and rerank of
+    stream_reranked_similarity_search for compact storage. Streams
+    (query_index, id, document, cmetadata, distance) rows ordered by query and
+    distance. A chunk found by several queries carries its document and
+    cmetadata only on its first row (None afterwards), so it is sent once.
+    Filtered full-storage searches are exact, as in stream_similarity_search.
+    """
+    params: Dict[str, Any] = {"collection_id": collection_id, "k": k}
+    values = []
+    for index, embedding in enumerate(embeddings):
+        params[f"query_{index}"] = _vector_literal(embedding)
+        values.append(f"({index}, %(query_{index})s::vector)")
+
+    distance = f"(embedding {distance_operator} q.query)"
+    filters = _metadata_filter_sql(filter, params)
+    bounds = []
+    if min_score is not None:
+        params["min_score"] = min_score
+        bounds.append(f"AND {distance} >= %(min_score)s")
+    if max_score is not None:
+        params["max_score"] = max_score
+        bounds.append(f"AND {distance} <= %(max_score)s")
+
+    if storage == "full":
+        search = f"""
+            SELECT uuid, {distance} AS distance
+            FROM {EMBEDDING_TABLE}
+            WHERE collection_id = %(collection_id)s
+            {filters}
+            {" ".join(bounds)}
+            ORDER BY {_order_by_distance(distance, filter)}
+            LIMIT %(k)s
+        """
+    else:
+        if min_score is not None:
+            raise ValueError("min_score needs full storage; a candidate pass would drop the rows it keeps")
+        params["candidates"] = max(candidates or k, k)
+        compact_column, compact_query = _compact_expressions(storage, len(embeddings[0]), "q.query")
+        search = f"""
+            SELECT uuid, {distance} AS distance
+            FROM (
+                SELECT uuid, embedding
+                FROM {EMBEDDING_TABLE}
+                WHERE collection_id = %(collection_id)s
+                {filters}
+                ORDER BY {compact_column} {_compact_operator(storage, distance_operator)} {compact_query}
+                LIMIT %(candidates)s
+            ) AS candidates
+            WHERE TRUE {" ".join(bounds)}
+            ORDER BY distance
+            LIMIT %(k)s
+        """
+
+    query = f"""
+        WITH hits AS (
+            SELECT q.query_index, hit.uuid, hit.distance,
+                   row_number() OVER (PARTITION BY hit.uuid ORDER BY q.query_index) = 1 AS first_hit
+            FROM (VALUES {", ".join(values)}) AS q(query_index, query)
+            CROSS JOIN LATERAL ({search}) AS hit
+        )
+        SELECT hits.query_index, hits.uuid::text AS id,
+               CASE WHEN hits.first_hit THEN e.document END AS document,
+               CASE WHEN hits.first_hit THEN e.cmetadata END AS cmetadata,
+               hits.distance
+        FROM hits
+        JOIN {EMBEDDING_TABLE} AS e ON e.uuid = hits.uuid
+        ORDER BY hits.query_index, hits.distance
+    """
+    return stream_sql(query, params, settings=settings)
+
+
+# Operator classes for ANN indexes, keyed like DISTANCE_OPERATORS.
+_VECTOR_OPCLASSES = {"cosine": "vector_cosine_ops", "euclidean": "vector_l2_ops", "inner": "vector_ip_ops"}
+_HALFVEC_OPCLASSES = {"cosine": "halfvec_cosine_ops", "euclidean": "halfvec_l2_ops", "inner": "halfvec_ip_ops"}
+
+# Embedding encodings the ANN index can be built on. "halfvec" (2x smaller) and
+# "binary" (32x smaller) are expression indexes over the full-precision column,
+# which stays in the table for the exact rerank. Needs pgvector >= 0.7.
+VECTOR_STORAGES = ("full", "halfvec", "binary")
+
+
+def _compact_expressions(storage: str, dimension: int, query_sql: str = "%(query)s::vector") -> Tuple[str, str]:
+    """(indexed expression, same encoding of the query_sql vector) for a compact storage."""
+    dimension = int(dimension)
+    if storage == "halfvec":
+        return f"(embedding::halfvec({dimension}))", f"{query_sql}::halfvec({dimension})"
+    if storage == "binary":
+        return f"(binary_quantize(embedding)::bit({dimension}))", f"binary_quantize({query_sql})::bit({dimension})"
+    raise ValueError(f"storage must be one of {VECTOR_STORAGES}")
+
+
+def _compact_operator(storage: str, distance_operator: str) -> str:
+    # Bits are compared by Hamming distance whatever the vector distance is.
+    return "<~>" if storage == "binary" else distance_operator
+
+
+def ensure_embedding_dimension(dimension: int) -> None:
+    """Give the embedding column a fixed dimension; pgvector cannot index untyped vectors.
+
+    PGVector creates the column as plain `vector` unless embedding_length is
+    passed. Existing rows must all already have this dimension.
+    """
+    row = execute_sql(
+        """
+        SELECT format_type(atttypid, atttypmod) AS column_type
+        FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attname = 'embedding'
+        """,
+        (EMBEDDING_TABLE,),
+        fetch="one",
+    )
+    if row and row["column_type"] == "vector":
+        execute_sql(
+            f"ALTER TABLE {EMBEDDING_TABLE} ALTER COLUMN embedding TYPE vector({int(dimension)})",
+            statement_timeout_ms=0,
+        )
+
+
+def create_vector_index(
+    method: str = "hnsw",
+    distance: str = "cosine",
+    m: int = 16,
+    ef_construction: int = 64,
+    lists: int = 100,
+    storage: str = "full",
+    dimension: Optional[int] = None,
+) -> str:
+    """Create an HNSW or IVFFlat index on the embedding column if it is missing.
+
+    With storage "halfvec" or "binary" the index is built on that encoding of
+    the column instead (dimension is then required). Returns the index name.
+    """
+    if storage == "full":
+        column = "embedding"
+        opclass = _VECTOR_OPCLASSES[distance]
+        index_name = f"{EMBEDDING_TABLE}_embedding_{method}_{distance}_idx"
+    else:
+        if not dimension:
+            raise ValueError(f"dimension is required for {storage} storage")
+        column, _ = _compact_expressions(storage, dimension)
+        if storage == "binary":
+            opclass, distance = "bit_hamming_ops", "hamming"
+        else:
+            opclass = _HALFVEC_OPCLASSES[distance]
+        index_name = f"{EMBEDDING_TABLE}_embedding_{storage}_{method}_{distance}_idx"
+    if method == "hnsw":
+        options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+    elif method == "ivfflat":
+        options = f"lists = {int(lists)}"
+    else:
+        raise ValueError("method must be 'hnsw' or 'ivfflat'")
+    execute_sql(
+        f"CREATE INDEX IF NOT EXISTS {index_name} ON {EMBEDDING_TABLE} "
+        f"USING {method} ({column} {opclass}) WITH ({options})",
+        statement_timeout_ms=0,
+    )
+    return index_name
+
+
+def create_source_index() -> str:
+    """Index (collection_id, source) so per-document filters do not scan the whole table."""
+    index_name = f"{EMBEDDING_TABLE}_collection_source_idx"
+    execute_sql(
+        f"CREATE INDEX IF NOT EXISTS {index_name} ON {EMBEDDING_TABLE} "
+        "(collection_id, (cmetadata->>'source'))",
+        statement_timeout_ms=0,
+    )
+    return index_name
+
+
+# Text search config used for the lexical index. 'simple' does no stemming or
+# stop-word removal, so clinical codes such as SN530 and doses such as 120mg survive.
+FULLTEXT_CONFIG = "simple"
+_TSVECTOR_SQL = f"to_tsvector('{FULLTEXT_CONFIG}', coalesce(document, ''))"
+
+
+def create_fulltext_index() -> str:
+    """GIN expression index over the chunk text.
+
+    Being an expression index, Postgres keeps it in sync with every insert,
+    COPY and delete, with no extra column or trigger to maintain.
+    """
+    index_name = f"{EMBEDDING_TABLE}_document_fts_idx"
+    execute_sql(
+        f"CREATE INDEX IF NOT EXISTS {index_name} ON {EMBEDDING_TABLE} USING gin ({_TSVECTOR_SQL})",
+        statement_timeout_ms=0,
+    )
+    return index_name
+
+
+def stream_lexical_search(
+    collection_id: str,
+    terms: List[str],
+    k: int,
+    filter: Optional[Dict[str, Any]] = None,
+) -> Generator[Any, None, None]:
+    """Stream (id, document, cmetadata, rank) rows matching any of terms, best rank first."""
+    params: Dict[str, Any] = {
+        "tsquery": " | ".join(terms),
+        "collection_id": collection_id,
+        "k": k,
+    }
+    query = f"""
+        SELECT uuid::text AS id, document, cmetadata,
+               ts_rank_cd({_TSVECTOR_SQL}, query) AS rank
+        FROM {EMBEDDING_TABLE}, to_tsquery('{FULLTEXT_CONFIG}', %(tsquery)s) AS query
+        WHERE collection_id = %(collection_id)s
+        {_metadata_filter_sql(filter, params)}
+        AND {_TSVECTOR_SQL} @@ query
+        ORDER BY rank DESC
+        LIMIT %(k)s
+    """
+    return stream_sql(query, params)
+
+
+def analyze_embeddings() -> None:
+    """Refresh planner statistics after large loads so the new indexes get picked."""
+    execute_sql(f"ANALYZE {EMBEDDING_TABLE}", statement_timeout_ms=0)
+
+
 if __name__ == "__main__":
     # Optional smoke test
     init_connection_pool()
@@ -0,0 +1,229 @@
+"""
+Sentence-transformers embedding models on the torch, ONNX or OpenVINO runtime.
+
+The ONNX and OpenVINO backends can run an int8-quantized copy of the model.
+The first time a quantized model is asked for, it is exported once under
+EMBEDDING_MODEL_DIR and then loaded from there.
+"""
+import importlib.util
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+import constants
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "openvino")
+QUANTIZATIONS = (None, "int8")
+# Modules each non-torch runtime needs, installed by the project extra of the same name.
+_BACKEND_MODULES = {
+    "onnx": ("onnxruntime", "optimum.onnxruntime"),
+    "openvino": ("openvino", "optimum.intel"),
+}
+
+
+def require_backend(backend: str) -> None:
+    """Raise ImportError naming the project extra to install if backend's runtime is missing."""
+    for module_name in _BACKEND_MODULES.get(backend, ()):
+        try:
+            found = importlib.util.find_spec(module_name) is not None
+        except ModuleNotFoundError:
+            found = False
+        if not found:
+            raise ImportError(
+                f"The {backend!r} embedding backend needs {module_name}; "
+                f"install it with `pip install 'reviewer-agent[{backend}]'`."
+            )
+
+
+def embedding_namespace(
+    model_name: str = constants.EMBEDDING_MODEL_NAME,
+    backend: str = constants.EMBEDDING_BACKEND,
+    quantization: Optional[str] = constants.EMBEDDING_QUANTIZATION,
+) -> str:
+    """Cache namespace for a model configuration, so vectors from different runtimes never mix."""
+    if backend == "torch" and not quantization:
+        return model_name
+    return f"{model_name}:{backend}:{quantization or 'fp32'}"
+
+
+def _quantized_file_name(backend: str) -> str:
+    if backend == "onnx":
+        return f"onnx/model_qint8_{constants.EMBEDDING_ONNX_QUANTIZATION_CONFIG}.onnx"
+    return "openvino/openvino_model_qint8_quantized.xml"
+
+
+def export_quantized_model(model_name: str, backend: str, output_dir: Optional[str] = None) -> str:
+    """
+    Export an int8 copy of model_name for backend into output_dir and return the directory.
+
+    ONNX uses dynamic quantization for EMBEDDING_ONNX_QUANTIZATION_CONFIG; OpenVINO
+    uses static quantization calibrated on sentence-transformers' default dataset.
+    Does nothing if the quantized file is already there.
+    """
+    if backend not in ("onnx", "openvino"):
+        raise ValueError(f"int8 quantization needs the onnx or openvino backend, not {backend!r}")
+    require_backend(backend)
+    if output_dir is None:
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "--", model_name)
+        output_dir = os.path.join(constants.EMBEDDING_MODEL_DIR, f"{safe_name}-{backend}-int8")
+    if os.path.exists(os.path.join(output_dir, _quantized_file_name(backend))):
+        return output_dir
+
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, backend=backend, device="cpu")
+    model.save(output_dir)
+    if backend == "onnx":
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        export_dynamic_quantized_onnx_model(
+            model, constants.EMBEDDING_ONNX_QUANTIZATION_CONFIG, output_dir, push_to_hub=False
+        )
+    else:
+        from optimum.intel import OVQuantizationConfig
+        from sentence_transformers import export_static_quantized_openvino_model
+
+        export_static_quantized_openvino_model(model, OVQuantizationConfig(), output_dir, push_to_hub=False)
+    return output_dir
+
+
+def _runtime_kwargs(backend: str, threads: Optional[int]) -> Dict[str, Any]:
+    """Keyword arguments for the runtime's from_pretrained (thread count, provider)."""
+    if backend == "onnx":
+        import onnxruntime
+
+        session_options = onnxruntime.SessionOptions()
+        if threads:
+            session_options.intra_op_num_threads = threads
+            session_options.inter_op_num_threads = 1
+        return {"provider": "CPUExecutionProvider", "session_options": session_options}
+    if backend == "openvino":
+        return {"ov_config": {"INFERENCE_NUM_THREADS": str(threads)}} if threads else {}
+    if threads:
+        # torch has one process-wide intra-op pool.
+        import torch
+
+        torch.set_num_threads(threads)
+    return {}
+
+
+def create_embeddings(
+    model_name: str = constants.EMBEDDING_MODEL_NAME,
+    backend: str = constants.EMBEDDING_BACKEND,
+    quantization: Optional[str] = constants.EMBEDDING_QUANTIZATION,
+    batch_size: int = constants.EMBEDDING_BATCH_SIZE,
+    threads: Optional[int] = constants.EMBEDDING_THREADS,
+) -> Embeddings:
+    """
+    Build a HuggingFaceEmbeddings model on the requested runtime.
+
+    threads caps the CPU threads used by inference (None leaves the runtime
+    default, usually one per core); batch_size is the sentence-transformers
+    encode batch size.
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend!r}")
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization: {quantization!r}")
+    require_backend(backend)
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    model_path = model_name
+    runtime_kwargs = _runtime_kwargs(backend, threads)
+    if quantization == "int8":
+        model_path = export_quantized_model(model_name, backend)
+        runtime_kwargs["file_name"] = _quantized_file_name(backend)
+
+    model_kwargs: Dict[str, Any] = {"device": "cpu", "backend": backend}
+    if runtime_kwargs:
+        model_kwargs["model_kwargs"] = runtime_kwargs
+    return HuggingFaceEmbeddings(
+        model_name=model_path,
+        model_kwargs=model_kwargs,
+        encode_kwargs={"batch_size": batch_size},
+    )
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    Embed several queries exactly as embed_query would, in one batch where possible.
+
+    Uses the model's embed_queries when it has one (BatchingEmbeddings and
+    CachedEmbeddings do), otherwise calls embed_query per text. Unlike
+    embed_documents, this keeps query prompts and the query cache namespace.
+    """
+    batch = getattr(embeddings, "embed_queries", None)
+    if batch is not None:
+        return batch(texts)
+    return [embeddings.embed_query(text) for text in texts]
+
+
+class _QueryRequest:
+    __slots__ = ("text", "vector", "error", "done")
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.vector: Optional[List[float]] = None
+        self.error: Optional[BaseException] = None
+        self.done = False
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Coalesces concurrent embed_query calls into embed_documents batches.
+
+    While one batch runs, queries from other threads queue up; the next thread
+    to get the model embeds everything queued (up to max_batch_size) at once.
+    A single caller is not delayed. Only for models that embed queries and
+    documents the same way, as sentence-transformers does without prompts.
+    """
+    def __init__(self, underlying: Embeddings, max_batch_size: int = 32) -> None:
+        self.underlying = underlying
+        self.max_batch_size = max_batch_size
+        self._queue: List[_QueryRequest] = []
+        self._queue_lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self.batches = 0
+        self.queries = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._run_lock:
+            return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Queue several queries at once; they share batches with concurrent embed_query calls."""
+        requests = [_QueryRequest(text) for text in texts]
+        with self._queue_lock:
+            self._queue.extend(requests)
+        with self._run_lock:
+            # Other threads may have embedded some of these while we waited.
+            while not all(request.done for request in requests):
+                with self._queue_lock:
+                    batch = self._queue[:self.max_batch_size]
+                    del self._queue[:len(batch)]
+                self._run(batch)
+        for request in requests:
+            if request.error is not None:
+                raise request.error
+        return [request.vector for request in requests]
+
+    def _run(self, batch: List[_QueryRequest]) -> None:
+        # Caller holds _run_lock.
+        try:
+            vectors = self.underlying.embed_documents([request.text for request in batch])
+        except Exception as exc:
+            for request in batch:
+                request.error = exc
+        else:
+            for request, vector in zip(batch, vectors):
+                request.vector = vector
+        for request in batch:
+            request.done = True
+        self.batches += 1
+        self.queries += len(batch)
@@ -0,0 +1,312 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import constants
+from .vector_backend import BackendRow, VectorBackend
+
+# Lazy import so the PGVector-only setup never needs faiss/numpy at import time.
+_faiss = None
+
+
+def _import_faiss():
+    global _faiss
+    if _faiss is None:
+        import faiss  # type: ignore
+        import numpy  # type: ignore
+        _faiss = {"faiss": faiss, "np": numpy}
+    return _faiss
+
+
+class FaissBackend(VectorBackend):
+    """
+    Local VectorHelper backend: an on-disk FAISS index plus a SQLite sidecar.
+
+    Vectors are L2-normalised in an IndexIDMap2(IndexFlatIP), so search is
+    exact and 1 - inner product equals PGVector's cosine distance. The sidecar
+    maps FAISS ids to chunk uuid, source, text and metadata, resolves metadata
+    filters to id selectors and holds an FTS5 table for lexical search. The
+    index is held in memory. All sidecar access goes through one connection
+    under the backend lock.
+    """
+    name = "faiss"
+
+    def __init__(self, index_dir: str = constants.FAISS_INDEX_DIR) -> None:
+        self.index_dir = index_dir
+        self.index_path = os.path.join(index_dir, "index.faiss")
+        self._lock = threading.RLock()
+        self._dirty = False
+        os.makedirs(index_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(os.path.join(index_dir, "chunks.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                uuid TEXT UNIQUE NOT NULL,
+                source TEXT,
+                document TEXT NOT NULL,
+                cmetadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source);
+            """
+        )
+        try:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(document, content='chunks', content_rowid='id')"
+            )
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: lexical search is unavailable.
+            self.has_fts = False
+        self._conn.commit()
+
+        self.index = None
+        if os.path.exists(self.index_path):
+            m = _import_faiss()
+            self.index = m["faiss"].read_index(self.index_path)
+        self._reconcile()
+
+    def _reconcile(self) -> None:
+        # The index and the sidecar are written separately, so a crash can leave
+        # either ahead: rows committed after the last index flush have no vector,
+        # and ids deleted from SQLite before a flush are still in the index file.
+        with self._lock:
+            known = set()
+            if self.index is not None:
+                m = _import_faiss()
+                known = set(m["faiss"].vector_to_array(self.index.id_map).tolist())
+            stored = {row_id for (row_id,) in self._conn.execute("SELECT id FROM chunks")}
+            orphans = [(row_id,) for row_id in stored - known]
+            if orphans:
+                self._delete_rows(orphans)
+                self._conn.commit()
+            missing = sorted(known - stored)
+            if missing:
+                self.index.remove_ids(m["faiss"].IDSelectorBatch(m["np"].asarray(missing, dtype="int64")))
+                self._dirty = True
+                self.flush()
+
+    def _delete_rows(self, row_ids: List[tuple]) -> None:
+        if self.has_fts:
+            self._conn.executemany(
+                "INSERT INTO chunks_fts(chunks_fts, rowid, document) "
+                "SELECT 'delete', id, document FROM chunks WHERE id = ?",
+                row_ids,
+            )
+        self._conn.executemany("DELETE FROM chunks WHERE id = ?", row_ids)
+
+    def _normalized(self, embeddings: List[List[float]]):
+        m = _import_faiss()
+        vectors = m["np"].asarray(embeddings, dtype="float32")
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        vectors = m["np"].ascontiguousarray(vectors)
+        m["faiss"].normalize_L2(vectors)
+        return vectors
+
+    def add(self, texts: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]]) -> List[str]:
+        if not texts:
+            return []
+        m = _import_faiss()
+        vectors = self._normalized(embeddings)
+        uuids = [str(uuid.uuid4()) for _ in texts]
+        with self._lock:
+            if self.index is None:
+                self.index = m["faiss"].IndexIDMap2(m["faiss"].IndexFlatIP(vectors.shape[1]))
+            row_ids = []
+            for chunk_uuid, text, metadata in zip(uuids, texts, metadatas):
+                cursor = self._conn.execute(
+                    "INSERT INTO chunks (uuid, source, document, cmetadata) VALUES (?, ?, ?, ?)",
+                    (chunk_uuid, metadata.get("source"), text, json.dumps(metadata, default=str)),
+                )
+                row_ids.append(cursor.lastrowid)
+                if self.has_fts:
+                    self._conn.execute(
+                        "INSERT INTO chunks_fts(rowid, document) VALUES (?, ?)", (cursor.lastrowid, text)
+                    )
+            self._conn.commit()
+            self.index.add_with_ids(vectors, m["np"].asarray(row_ids, dtype="int64"))
+            self._dirty = True
+        return uuids
+
+    def source_chunk_hashes(self, source: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT uuid, json_extract(cmetadata, '$.chunk_hash'), json_extract(cmetadata, '$.doc_hash')
+                FROM chunks WHERE source = ?
+                """,
+                (source,),
+            ).fetchall()
+        return [{"uuid": row[0], "chunk_hash": row[1], "doc_hash": row[2]} for row in rows]
+
+    def source_embeddings(self, source: str) -> List[Tuple[str, str, Dict[str, Any], List[float]]]:
+        with self._lock:
+            if self.index is None:
+                return []
+            rows = self._conn.execute(
+                "SELECT id, uuid, document, cmetadata FROM chunks WHERE source = ?", (source,)
+            ).fetchall()
+            return [
+                (chunk_uuid, document, json.loads(cmetadata), self.index.reconstruct(row_id).tolist())
+                for row_id, chunk_uuid, document, cmetadata in rows
+            ]
+
+    def delete(self, ids: List[str]) -> None:
+        if not ids:
+            return
+        m = _import_faiss()
+        with self._lock:
+            placeholders = ",".join("?" for _ in ids)
+            row_ids = [
+                row[0] for row in self._conn.execute(
+                    f"SELECT id FROM chunks WHERE uuid IN ({placeholders})", list(ids)
+                )
+            ]
+            if self.index is not None and row_ids:
+                self.index.remove_ids(m["faiss"].IDSelectorBatch(m["np"].asarray(row_ids, dtype="int64")))
+                self._dirty = True
+            self._delete_rows([(row_id,) for row_id in row_ids])
+            self._conn.commit()
+
+    def set_source_doc_hash(self, source: str, doc_hash: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE chunks SET cmetadata = json_set(cmetadata, '$.doc_hash', ?) WHERE source = ?",
+                (doc_hash, source),
+            )
+            self._conn.commit()
+
+    def flush(self) -> None:
+        """Write the index to disk (atomically) if it changed."""
+        with self._lock:
+            if not self._dirty or self.index is None:
+                return
+            tmp_path = self.index_path + ".tmp"
+            _import_faiss()["faiss"].write_index(self.index, tmp_path)
+            os.replace(tmp_path, self.index_path)
+            self._dirty = False
+
+    def _filter_ids(self, filter: Optional[Dict[str, Any]]) -> Optional[List[int]]:
+        """Row ids matching a metadata equality filter, or None for no filter."""
+        if not filter:
+            return None
+        clauses, params = [], []
+        for key, value in filter.items():
+            if key == "source":
+                clauses.append("source = ?")
+            else:
+                clauses.append("CAST(json_extract(cmetadata, ?) AS TEXT) = ?")
+                params.append(f"$.{key}")
+            params.append(str(value))
+        sql = "SELECT id FROM chunks WHERE " + " AND ".join(clauses)
+        with self._lock:
+            return [row[0] for row in self._conn.execute(sql, params)]
+
+    def _rows(self, row_ids: List[int]) -> Dict[int, tuple]:
+        if not row_ids:
+            return {}
+        placeholders = ",".join("?" for _ in row_ids)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, uuid, document, cmetadata FROM chunks WHERE id IN ({placeholders})", row_ids
+            ).fetchall()
+        return {row[0]: row[1:] for row in rows}
+
+    def search(
+        self,
+        embedding: List[float],
+        k: int,
+        filter: Optional[Dict[str, Any]] = None,
+        min_score: Optional[float] = None,
+        max_score: Optional[float] = None,
+    ) -> Iterator[BackendRow]:
+        yield from self.search_many([embedding], k, filter=filter, min_score=min_score, max_score=max_score)[0]
+
+    def search_many(
+        self,
+        embeddings: List[List[float]],
+        k: int,
+        filter: Optional[Dict[str, Any]] = None,
+        min_score: Optional[float] = None,
+        max_score: Optional[float] = None,
+    ) -> List[List[BackendRow]]:
+        if self.index is None or self.index.ntotal == 0 or not embeddings:
+            return [[] for _ in embeddings]
+        m = _import_faiss()
+        queries = self._normalized(embeddings)
+        candidate_ids = self._filter_ids(filter)
+        params = None
+        pool = self.index.ntotal
+        if candidate_ids is not None:
+            if not candidate_ids:
+                return [[] for _ in embeddings]
+            params = m["faiss"].SearchParameters(
+                sel=m["faiss"].IDSelectorBatch(m["np"].asarray(candidate_ids, dtype="int64"))
+            )
+            pool = len(candidate_ids)
+        # A lower score bound drops the nearest rows, so the limit has to come after it.
+        search_k = pool if min_score is not None else min(k, pool)
+        # One index call for all queries.
+        with self._lock:
+            similarities, ids = self.index.search(queries, search_k, params=params)
+
+        all_hits = []
+        for query_similarities, query_ids in zip(similarities.tolist(), ids.tolist()):
+            hits = []
+            for similarity, row_id in zip(query_similarities, query_ids):
+                if row_id < 0:
+                    continue
+                distance = 1.0 - similarity
+                if min_score is not None and distance < min_score:
+                    continue
+                if max_score is not None and distance > max_score:
+                    continue
+                hits.append((row_id, distance))
+                if len(hits) >= k:
+                    break
+            all_hits.append(hits)
+
+        rows = self._rows(list({row_id for hits in all_hits for row_id, _ in hits}))
+        results = []
+        for hits in all_hits:
+            # Skip ids whose row was deleted concurrently.
+            results.append([
+                (rows[row_id][0], rows[row_id][1], json.loads(rows[row_id][2]), distance)
+                for row_id, distance in hits if row_id in rows
+            ])
+        return results
+
+    def lexical_search(self, terms: List[str], k: int, filter: Optional[Dict[str, Any]] = None) -> Iterator[BackendRow]:
+        if not self.has_fts or not terms:
+            return
+        match = " OR ".join(f'"{term}"' for term in terms)
+        sql = """
+            SELECT c.uuid, c.document, c.cmetadata, -bm25(chunks_fts) AS rank
+            FROM chunks_fts JOIN chunks c ON c.id = chunks_fts.rowid
+            WHERE chunks_fts MATCH ?
+        """
+        params: List[Any] = [match]
+        for key, value in (filter or {}).items():
+            if key == "source":
+                sql += " AND c.source = ?"
+            else:
+                sql += " AND CAST(json_extract(c.cmetadata, ?) AS TEXT) = ?"
+                params.append(f"$.{key}")
+            params.append(str(value))
+        sql += " ORDER BY rank DESC LIMIT ?"
+        params.append(k)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        for chunk_uuid, document, cmetadata, rank in rows:
+            yield chunk_uuid, document, json.loads(cmetadata), float(rank)
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._conn.close()
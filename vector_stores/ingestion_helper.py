@@ -0,0 +1,274 @@
+import hashlib
+import os
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Deque, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+import constants
+from .registry import get_vector_helper
+from .vector_helper import ChunkSyncPlan, VectorHelper, content_hash
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt")
+
+
+def extract_text(file_path: str) -> str:
+    """Extract plain text from a PDF, DOCX or TXT file."""
+    suffix = Path(file_path).suffix.lower()
+    if suffix == ".pdf":
+        import pymupdf
+
+        with pymupdf.open(file_path) as pdf:
+            return "\n".join(page.get_text() for page in pdf)
+    if suffix == ".docx":
+        import docx2txt
+
+        return docx2txt.process(file_path) or ""
+    if suffix == ".txt":
+        with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+    raise ValueError(f"Unsupported file type: {file_path}")
+
+
+def _extract_worker(file_path: str) -> Tuple[str, str]:
+    # Top-level so it can be pickled into the process pool.
+    return file_path, extract_text(file_path)
+
+
+def _page_count_worker(file_path: str) -> int:
+    import pymupdf
+
+    with pymupdf.open(file_path) as pdf:
+        return pdf.page_count
+
+
+def _extract_pages_worker(file_path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    # Each worker opens the PDF itself; pymupdf documents cannot be pickled.
+    import pymupdf
+
+    with pymupdf.open(file_path) as pdf:
+        return [(number + 1, pdf[number].get_text()) for number in range(start, stop)]
+
+
+def file_hash(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """sha256 of the file bytes, read in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def iter_pdf_pages(
+    file_path: str,
+    executor: Optional[Executor] = None,
+    pages_per_task: int = constants.INGEST_STREAM_PAGES_PER_TASK,
+    max_in_flight: int = 4,
+) -> Iterator[Tuple[int, int, str]]:
+    """
+    Yield (page_number, offset, text) for each page of a PDF, in page order.
+
+    Page ranges are extracted in the executor with at most max_in_flight ranges
+    submitted or waiting to be consumed, so extraction never runs further ahead
+    of the consumer than that. page_number is 1-based; offset is where the page
+    starts in the text extract_text returns for the same file.
+    """
+    offset = 0
+    if executor is None:
+        page_count = _page_count_worker(file_path)
+        for start in range(0, page_count, pages_per_task):
+            for page_number, text in _extract_pages_worker(file_path, start, min(start + pages_per_task, page_count)):
+                yield page_number, offset, text
+                # extract_text joins pages with a newline.
+                offset += len(text) + 1
+        return
+
+    # Asked of a worker so the parent never has to import pymupdf.
+    page_count = executor.submit(_page_count_worker, file_path).result()
+    in_flight: Deque[Future] = deque()
+    starts = iter(range(0, page_count, pages_per_task))
+    try:
+        while True:
+            for start in starts:
+                stop = min(start + pages_per_task, page_count)
+                in_flight.append(executor.submit(_extract_pages_worker, file_path, start, stop))
+                if len(in_flight) >= max_in_flight:
+                    break
+            if not in_flight:
+                return
+            for page_number, text in in_flight.popleft().result():
+                yield page_number, offset, text
+                offset += len(text) + 1
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+class IngestionHelper:
+    """
+    Batch ingestion of patient documents into the vector store.
+
+    Text extraction runs in a process pool, chunks are embedded in fixed-size
+    batches and written in one bulk insert per batch (COPY on PGVector). Documents and chunks are
+    content-hashed, so re-ingesting a file only embeds new or changed chunks.
+
+    With streaming on, PDFs are not extracted as one string: page ranges are
+    extracted in the pool and chunked, embedded and written as they arrive,
+    so memory use does not grow with the size of the PDF. Streamed chunks are
+    split per page, carry page and offset metadata, and the document hash is
+    taken over the file bytes. A streamed PDF's stale chunks are dropped as
+    soon as all of its own new chunks are written.
+    """
+    def __init__(
+        self,
+        vector_helper: Optional[VectorHelper] = None,
+        chunk_size: int = constants.INGEST_CHUNK_SIZE,
+        chunk_overlap: int = constants.INGEST_CHUNK_OVERLAP,
+        embed_batch_size: int = constants.INGEST_EMBED_BATCH_SIZE,
+        max_workers: Optional[int] = None,
+        streaming: bool = constants.INGEST_STREAMING,
+        pages_per_task: int = constants.INGEST_STREAM_PAGES_PER_TASK,
+    ) -> None:
+        self.vector_helper = vector_helper or get_vector_helper()
+        self.embed_batch_size = embed_batch_size
+        self.max_workers = max_workers
+        self.streaming = streaming
+        self.pages_per_task = pages_per_task
+        # Two page ranges per worker: one being extracted, one ready to be consumed.
+        self.max_in_flight = 2 * (max_workers or os.cpu_count() or 1)
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            separators=["\n\n", "\n", " ", ". "],
+            add_start_index=True,
+        )
+
+    def collect_files(self, directory: str) -> List[str]:
+        """Return every supported document under directory, sorted for stable runs."""
+        files = []
+        for root, _, names in os.walk(directory):
+            for name in names:
+                if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                    files.append(os.path.join(root, name))
+        return sorted(files)
+
+    def split_text(self, text: str, file_path: str) -> List[Document]:
+        metadata = {
+            "source": file_path,
+            "filename": os.path.basename(file_path),
+            "uploaded_at": datetime.now().isoformat(),
+        }
+        return self.text_splitter.create_documents([text], metadatas=[metadata])
+
+    def iter_pdf_chunks(self, file_path: str, executor: Optional[Executor] = None) -> Iterator[Document]:
+        """
+        Chunk a PDF page by page without holding its full text.
+
+        Each chunk gets its 1-based page number, and both start_index and offset
+        are its position within the whole document text, as for a PDF chunked
+        in one piece.
+        """
+        metadata = {
+            "source": file_path,
+            "filename": os.path.basename(file_path),
+            "uploaded_at": datetime.now().isoformat(),
+        }
+        pages = iter_pdf_pages(file_path, executor, self.pages_per_task, self.max_in_flight)
+        for page_number, offset, text in pages:
+            if not text.strip():
+                continue
+            for chunk in self.text_splitter.create_documents([text], metadatas=[{**metadata, "page": page_number}]):
+                chunk.metadata["start_index"] = chunk.metadata["offset"] = offset + chunk.metadata["start_index"]
+                yield chunk
+
+    def ingest_directory(self, directory: str):
+        """
+        Ingest every supported document under directory.
+
+        Returns (success: bool, message: str)
+        """
+        return self.ingest_files(self.collect_files(directory))
+
+    def ingest_files(self, file_paths: List[str]):
+        """
+        Extract, chunk, embed and bulk-insert the given files.
+
+        Returns (success: bool, message: str)
+        """
+        if not file_paths:
+            return False, "No supported documents found."
+
+        self.vector_helper.backend.prepare()
+        pending: List[Document] = []
+        plans: List[ChunkSyncPlan] = []
+        streamed_plans: List[ChunkSyncPlan] = []
+        stored_chunks = 0
+        failed: List[Tuple[str, str]] = []
+
+        streamed, whole = [], []
+        for path in file_paths:
+            (streamed if self.streaming and path.lower().endswith(".pdf") else whole).append(path)
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(_extract_worker, path): path for path in whole}
+            for future in as_completed(futures):
+                try:
+                    file_path, text = future.result()
+                except Exception as exc:
+                    failed.append((futures[future], str(exc)))
+                    continue
+                if not text.strip():
+                    continue
+                plan = self.vector_helper.plan_chunk_sync(
+                    file_path, content_hash(text), self.split_text(text, file_path)
+                )
+                plans.append(plan)
+                pending.extend(plan.new_chunks)
+                # Only flush whole batches while extraction is still running.
+                while len(pending) >= self.embed_batch_size:
+                    batch = pending[:self.embed_batch_size]
+                    pending = pending[self.embed_batch_size:]
+                    stored_chunks += self.vector_helper.add_chunks(batch, self.embed_batch_size)
+
+            # One PDF at a time, its page ranges spread over the pool.
+            for file_path in streamed:
+                try:
+                    plan = self.vector_helper.sync_chunk_stream(
+                        file_path,
+                        file_hash(file_path),
+                        self.iter_pdf_chunks(file_path, executor),
+                        self.embed_batch_size,
+                    )
+                except Exception as exc:
+                    failed.append((file_path, str(exc)))
+                    continue
+                # Already finalized by sync_chunk_stream; only counted below.
+                streamed_plans.append(plan)
+                stored_chunks += plan.added
+
+        if pending:
+            stored_chunks += self.vector_helper.add_chunks(pending, self.embed_batch_size)
+
+        # Stale chunks are only dropped once every new chunk has been written
+        # (for a streamed PDF, once all of its own chunks have been).
+        for plan in plans:
+            self.vector_helper.finalize_chunk_sync(plan)
+        plans.extend(streamed_plans)
+
+        # Build ANN/source indexes after the load; a no-op once they exist.
+        if stored_chunks:
+            self.vector_helper.ensure_indexes()
+
+        unchanged = sum(1 for plan in plans if plan.unchanged)
+        removed = sum(len(plan.stale_ids) for plan in plans)
+        message = (
+            f"Stored {stored_chunks} new chunks and removed {removed} stale chunks "
+            f"from {len(file_paths) - len(failed)} documents ({unchanged} unchanged)."
+        )
+        if failed:
+            message += f" {len(failed)} documents failed: " + "; ".join(f"{path}: {error}" for path, error in failed)
+        return not failed, message
@@ -0,0 +1,230 @@
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from langchain_community.vectorstores.pgvector import PGVector
+from langchain_core.embeddings import Embeddings
+
+import constants
+from . import db_helper
+from .vector_backend import BackendRow, VectorBackend
+
+
+class PGVectorBackend(VectorBackend):
+    """
+    VectorHelper backend on the PGVector collection in PostgreSQL.
+
+    A compact VECTOR_STORAGE (halfvec/binary) is only used for unfiltered
+    searches without min_score. Source-filtered searches, which is every
+    pipeline search, are exact scans of the full vectors.
+    """
+    name = "pgvector"
+
+    def __init__(self, embeddings: Embeddings, collection_name: str = "embeddings") -> None:
+        self.collection_name = collection_name
+        self.connection_string = PGVector.connection_string_from_db_params(
+            driver="psycopg2",
+            host=os.getenv("DB_HOST", "localhost"),
+            port=int(os.getenv("DB_PORT", "5432")),
+            database=os.getenv("DB_NAME", "postgres"),
+            user=os.getenv("DB_USER", "postgres"),
+            password=os.getenv("DB_PASSWORD", ""),
+        )
+
+        # Share db_helper's pool instead of letting PGVector create its own engine.
+        self.vectorstore = PGVector(
+            embedding_function=embeddings,
+            connection_string=self.connection_string,
+            collection_name=self.collection_name,
+            connection=db_helper.get_engine(),
+        )
+        self._collection_id = None
+        # Matches PGVector's default COSINE distance strategy above.
+        self.distance_operator = db_helper.DISTANCE_OPERATORS["cosine"]
+        self.index_method = constants.VECTOR_INDEX_METHOD
+        self.storage = constants.VECTOR_STORAGE
+        self.search_settings = {}
+        self.search_params: Dict[str, Any] = {}
+        self.set_search_params()
+
+    def get_collection_id(self) -> str:
+        """Return (and memoise) the uuid of the PGVector collection."""
+        if self._collection_id is None:
+            self._collection_id = db_helper.get_collection_id(self.collection_name)
+            if self._collection_id is None:
+                raise ValueError(f"Collection '{self.collection_name}' not found")
+        return self._collection_id
+
+    def prepare(self) -> None:
+        db_helper.ensure_pgvector_extension()
+
+    def add(self, texts: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]]) -> List[str]:
+        # One COPY per batch instead of row-by-row INSERTs.
+        return db_helper.copy_embeddings(self.get_collection_id(), texts, embeddings, metadatas)
+
+    def source_chunk_hashes(self, source: str) -> List[Dict[str, Any]]:
+        return db_helper.fetch_source_chunk_hashes(self.get_collection_id(), source) or []
+
+    def source_embeddings(self, source: str) -> List[Tuple[str, str, Dict[str, Any], List[float]]]:
+        rows = db_helper.fetch_source_embeddings(self.get_collection_id(), source) or []
+        return [
+            (row["id"], row["document"], dict(row["cmetadata"] or {}), row["embedding"]) for row in rows
+        ]
+
+    def delete(self, ids: List[str]) -> None:
+        db_helper.delete_embeddings(ids)
+
+    def set_source_doc_hash(self, source: str, doc_hash: str) -> None:
+        db_helper.set_source_doc_hash(self.get_collection_id(), source, doc_hash)
+
+    def ensure_indexes(
+        self,
+        dimension: int,
+        method: Optional[str] = None,
+        m: int = constants.HNSW_M,
+        ef_construction: int = constants.HNSW_EF_CONSTRUCTION,
+        lists: int = constants.IVFFLAT_LISTS,
+        storage: Optional[str] = None,
+        **_: Any,
+    ) -> None:
+        self.index_method = method or self.index_method
+        self.storage = storage or self.storage
+        db_helper.ensure_embedding_dimension(dimension)
+        db_helper.create_vector_index(
+            method=self.index_method,
+            distance="cosine",
+            m=m,
+            ef_construction=ef_construction,
+            lists=lists,
+            storage=self.storage,
+            dimension=dimension,
+        )
+        db_helper.create_source_index()
+        db_helper.create_fulltext_index()
+        db_helper.analyze_embeddings()
+        # Re-derive the settings for the (possibly new) index method, keeping tuned values.
+        self.set_search_params(**self.search_params)
+
+    def set_search_params(
+        self,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        iterative_scan: Optional[str] = None,
+        **_: Any,
+    ) -> None:
+        self.search_params = {"ef_search": ef_search, "probes": probes, "iterative_scan": iterative_scan}
+        if self.index_method == "hnsw":
+            self.search_settings = {"hnsw.ef_search": ef_search or constants.HNSW_EF_SEARCH}
+        else:
+            self.search_settings = {"ivfflat.probes": probes or constants.IVFFLAT_PROBES}
+        if iterative_scan:
+            self.search_settings[f"{self.index_method}.iterative_scan"] = iterative_scan
+
+    def search(
+        self,
+        embedding: List[float],
+        k: int,
+        filter: Optional[Dict[str, Any]] = None,
+        min_score: Optional[float] = None,
+        max_score: Optional[float] = None,
+    ) -> Iterator[BackendRow]:
+        if self._use_compact(filter, min_score):
+            rows = self._reranked_search(embedding, k, filter, max_score)
+        else:
+            rows = self._exact_search(embedding, k, filter, min_score, max_score)
+        for row in rows:
+            yield row["id"], row["document"], dict(row["cmetadata"] or {}), float(row["distance"])
+
+    def search_many(
+        self,
+        embeddings: List[List[float]],
+        k: int,
+        filter: Optional[Dict[str, Any]] = None,
+        min_score: Optional[float] = None,
+        max_score: Optional[float] = None,
+    ) -> List[List[BackendRow]]:
+        # All queries in one statement (LATERAL join over a VALUES list).
+        results: List[List[BackendRow]] = [[] for _ in embeddings]
+        if not embeddings:
+            return results
+        storage = self.storage if self._use_compact(filter, min_score) else "full"
+        settings = self.search_settings
+        candidates = None
+        if storage != "full":
+            candidates = k * constants.VECTOR_RERANK_CANDIDATES_FACTOR
+            settings = self._rerank_settings(candidates)
+        rows = db_helper.stream_multi_similarity_search(
+            self.get_collection_id(),
+            embeddings,
+            k,
+            filter=filter,
+            min_score=min_score,
+            max_score=max_score,
+            distance_operator=self.distance_operator,
+            settings=settings,
+            storage=storage,
+            candidates=candidates,
+        )
+        # Text and metadata only come with a chunk's first row.
+        chunks: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        for row in rows:
+            if row["id"] not in chunks:
+                chunks[row["id"]] = (row["document"], dict(row["cmetadata"] or {}))
+            document, metadata = chunks[row["id"]]
+            results[row["query_index"]].append((row["id"], document, dict(metadata), float(row["distance"])))
+        return results
+
+    def _use_compact(self, filter: Optional[Dict[str, Any]], min_score: Optional[float]) -> bool:
+        # The candidate pass is an ANN scan, so filters are applied to at most
+        # ef_search rows, and a lower bound (min_score) keeps far rows a
+        # nearest-first pass would miss. Both cases use the exact search.
+        return self.storage != "full" and not filter and min_score is None
+
+    def _rerank_settings(self, candidates: int) -> Dict[str, Any]:
+        settings = dict(self.search_settings)
+        if "hnsw.ef_search" in settings:
+            # An HNSW scan returns at most ef_search rows (pgvector caps it at 1000).
+            settings["hnsw.ef_search"] = max(settings["hnsw.ef_search"], min(candidates, 1000))
+        return settings
+
+    def _reranked_search(
+        self,
+        embedding: List[float],
+        k: int,
+        filter: Optional[Dict[str, Any]],
+        max_score: Optional[float],
+    ):
+        candidates = k * constants.VECTOR_RERANK_CANDIDATES_FACTOR
+        return db_helper.stream_reranked_similarity_search(
+            self.get_collection_id(),
+            embedding,
+            k,
+            storage=self.storage,
+            candidates=candidates,
+            filter=filter,
+            max_score=max_score,
+            distance_operator=self.distance_operator,
+            settings=self._rerank_settings(candidates),
+        )
+
+    def _exact_search(
+        self,
+        embedding: List[float],
+        k: int,
+        filter: Optional[Dict[str, Any]],
+        min_score: Optional[float],
+        max_score: Optional[float],
+    ):
+        return db_helper.stream_similarity_search(
+            self.get_collection_id(),
+            embedding,
+            k,
+            filter=filter,
+            min_score=min_score,
+            max_score=max_score,
+            distance_operator=self.distance_operator,
+            settings=self.search_settings,
+        )
+
+    def lexical_search(self, terms: List[str], k: int, filter: Optional[Dict[str, Any]] = None) -> Iterator[BackendRow]:
+        for row in db_helper.stream_lexical_search(self.get_collection_id(), terms, k, filter=filter):
+            yield row["id"], row["document"], dict(row["cmetadata"] or {}), float(row["rank"])
@@ -0,0 +1,73 @@
+"""
+Process-wide, lazily initialised shared resources.
+
+Agents, chains and tools should get the embedding model, the vector store and
+the DB pool from here instead of constructing their own, so each process
+loads the embedding model once and opens one set of connections.
+"""
+import threading
+
+import constants
+from . import db_helper
+
+_lock = threading.RLock()
+_embeddings = None
+_vector_helper = None
+
+
+def get_embeddings():
+    """Return the shared (cached) embedding model, loading it on first use."""
+    global _embeddings
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                from caching.embedding_cache import cached_embeddings
+                from .embedding_backends import BatchingEmbeddings, create_embeddings, embedding_namespace
+
+                base_embeddings = create_embeddings()
+                if constants.EMBEDDING_DYNAMIC_BATCHING:
+                    base_embeddings = BatchingEmbeddings(base_embeddings, constants.EMBEDDING_BATCH_SIZE)
+                _embeddings = cached_embeddings(base_embeddings, embedding_namespace())
+    return _embeddings
+
+
+def get_db_pool():
+    """Initialise the shared connection pool on first use and return the db_helper module."""
+    with _lock:
+        db_helper.init_connection_pool()
+    return db_helper
+
+
+def get_vector_helper():
+    """Return the shared VectorHelper (one vector backend per process)."""
+    global _vector_helper
+    if _vector_helper is None:
+        with _lock:
+            if _vector_helper is None:
+                from .vector_helper import VectorHelper
+
+                if constants.VECTOR_BACKEND == "pgvector":
+                    get_db_pool()
+                _vector_helper = VectorHelper(embeddings=get_embeddings())
+    return _vector_helper
+
+
+def install(embeddings=None, vector_helper=None) -> None:
+    """Use the given embeddings / VectorHelper as the shared ones (benchmarks, scripts)."""
+    global _embeddings, _vector_helper
+    with _lock:
+        if embeddings is not None:
+            _embeddings = embeddings
+        if vector_helper is not None:
+            _vector_helper = vector_helper
+
+
+def reset() -> None:
+    """Drop every shared resource; the next getter call builds fresh ones."""
+    global _embeddings, _vector_helper
+    with _lock:
+        if _vector_helper is not None:
+            _vector_helper.backend.close()
+        _vector_helper = None
+        _embeddings = None
+        db_helper.close_connection_pool()
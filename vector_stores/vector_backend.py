@@ -0,0 +1,94 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import constants
+
+# (id, document, metadata, score) rows returned by backend searches.
+BackendRow = Tuple[str, str, Dict[str, Any], float]
+
+
+class VectorBackend:
+    """
+    Storage interface VectorHelper is written against.
+
+    Distances follow PGVector's cosine distance (0 = identical), so scores
+    and thresholds mean the same thing on every backend.
+    """
+    name = ""
+
+    def prepare(self) -> None:
+        """Make sure the store exists before writing to it."""
+
+    def add(self, texts: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]]) -> List[str]:
+        raise NotImplementedError
+
+    def source_chunk_hashes(self, source: str) -> List[Dict[str, Any]]:
+        """Return {"uuid", "chunk_hash", "doc_hash"} dicts stored for one source."""
+        raise NotImplementedError
+
+    def source_embeddings(self, source: str) -> List[Tuple[str, str, Dict[str, Any], List[float]]]:
+        """Return (id, document, metadata, embedding) for every stored chunk of one source."""
+        raise NotImplementedError
+
+    def delete(self, ids: List[str]) -> None:
+        raise NotImplementedError
+
+    def set_source_doc_hash(self, source: str, doc_hash: str) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Persist pending writes (no-op for stores that write through)."""
+
+    def ensure_indexes(self, dimension: int, **index_params: Any) -> None:
+        """Build whatever search indexes the backend needs."""
+
+    def set_search_params(self, **search_params: Any) -> None:
+        """Tune per-query search settings."""
+
+    def search(
+        self,
+        embedding: List[float],
+        k: int,
+        filter: Optional[Dict[str, Any]] = None,
+        min_score: Optional[float] = None,
+        max_score: Optional[float] = None,
+    ) -> Iterator[BackendRow]:
+        """Nearest rows by cosine distance, filter and score bounds applied before the limit."""
+        raise NotImplementedError
+
+    def search_many(
+        self,
+        embeddings: List[List[float]],
+        k: int,
+        filter: Optional[Dict[str, Any]] = None,
+        min_score: Optional[float] = None,
+        max_score: Optional[float] = None,
+    ) -> List[List[BackendRow]]:
+        """search() for several query vectors, one result list per vector (batched where the store can)."""
+        return [
+            list(self.search(embedding, k, filter=filter, min_score=min_score, max_score=max_score))
+            for embedding in embeddings
+        ]
+
+    def lexical_search(
+        self,
+        terms: List[str],
+        k: int,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[BackendRow]:
+        """Rows matching any of terms, best (higher) rank first."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release connections or file handles."""
+
+
+def create_backend(name: str, embeddings=None) -> VectorBackend:
+    """Build the backend named in constants.VECTOR_BACKEND ("pgvector" or "faiss")."""
+    # Imported lazily so each setup only needs its own dependencies installed.
+    if name == "pgvector":
+        from .pgvector_backend import PGVectorBackend
+        return PGVectorBackend(embeddings)
+    if name == "faiss":
+        from .faiss_backend import FaissBackend
+        return FaissBackend(index_dir=constants.FAISS_INDEX_DIR)
+    raise ValueError(f"Unknown vector backend '{name}'")
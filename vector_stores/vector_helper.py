@@ -1,30 +1,262 @@
+from dataclasses import dataclass, field
 from datetime import datetime
-import os
-from langchain_community.vectorstores.pgvector import PGVector
+import hashlib
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from .db_helper import ensure_pgvector_extension
-from langchain_huggingface import HuggingFaceEmbeddings
-import dotenv
-dotenv.load_dotenv()
+from langchain_core.embeddings import Embeddings
+from .embedding_backends import embed_queries
+from .vector_backend import BackendRow, VectorBackend, create_backend
+from .working_set import DocumentWorkingSet
+import constants
+
+
+def content_hash(text: str) -> str:
+    """Stable content hash used for document and chunk change detection."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+_LEXICAL_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of",
+    "on", "or", "the", "to", "was", "were", "with", "what", "which", "patient", "all",
+}
+
+
+def lexical_query_terms(query: str) -> List[str]:
+    """Tokenise a query the way to_tsvector('simple', ...) does, minus stop words."""
+    terms = []
+    for term in re.findall(r"[a-z0-9]+", query.lower()):
+        if len(term) > 1 and term not in _LEXICAL_STOPWORDS and term not in terms:
+            terms.append(term)
+    return terms
+
+
+def reciprocal_rank_fusion(
+    rankings: Iterable[List[Tuple[Document, float]]],
+    k: int = 60,
+) -> List[Tuple[Document, float]]:
+    """
+    Fuse ranked result lists with reciprocal rank fusion.
+
+    Documents are identified by their row id (or content when there is none).
+    Returns (document, fused_score) pairs, highest fused score first.
+    """
+    fused: Dict[str, List] = {}
+    for ranking in rankings:
+        for rank, (doc, _) in enumerate(ranking):
+            key = doc.metadata.get("id") or doc.page_content
+            entry = fused.setdefault(key, [doc, 0.0])
+            entry[1] += 1.0 / (k + rank + 1)
+    return sorted(((doc, score) for doc, score in fused.values()), key=lambda item: item[1], reverse=True)
+
+
+@dataclass
+class ChunkSyncPlan:
+    """What needs to change in the store to bring one source document up to date."""
+    source: str
+    doc_hash: str
+    new_chunks: List[Document] = field(default_factory=list)
+    stale_ids: List[str] = field(default_factory=list)
+    unchanged: bool = False
+    # Chunks written by sync_chunk_stream, which does not keep them in new_chunks.
+    added: int = 0
+
+
+@dataclass
+class MultiQueryResult:
+    """Results of multi_query_search: one ranked list per query plus their fused union."""
+    queries: List[str]
+    per_query: List[List[Tuple[Document, float]]]
+    # (document, fused_score) pairs, deduplicated by chunk id, highest score first.
+    fused: List[Tuple[Document, float]]
+
 
 class VectorHelper:
-    def __init__(self):
-        self.embeddings = HuggingFaceEmbeddings()
-        self.connection_string = PGVector.connection_string_from_db_params(
-            driver="psycopg2",
-            host=os.getenv("DB_HOST", "localhost"),
-            port=int(os.getenv("DB_PORT", "5432")),
-            database=os.getenv("DB_NAME", "postgres"),
-            user=os.getenv("DB_USER", "postgres"),
-            password=os.getenv("DB_PASSWORD", ""),
-        )
-        
-        self.vectorstore = PGVector(
-            embedding_function=self.embeddings,
-            connection_string=self.connection_string,
-            collection_name="embeddings"
+    collection_name = "embeddings"
+
+    def __init__(
+        self,
+        embeddings: Optional[Embeddings] = None,
+        backend: Optional[VectorBackend] = None,
+        working_set: Optional[bool] = None,
+    ):
+        if embeddings is None:
+            from .registry import get_embeddings
+            embeddings = get_embeddings()
+        self.embeddings = embeddings
+        self.backend = backend or create_backend(constants.VECTOR_BACKEND, self.embeddings)
+        # The LangChain PGVector store, when running on Postgres.
+        self.vectorstore = getattr(self.backend, "vectorstore", None)
+        if working_set is None:
+            working_set = constants.WORKING_SET_ENABLED
+        # Serves {"source": ...} searches from memory after the first one.
+        self.working_set = DocumentWorkingSet(self.backend) if working_set else None
+
+    def ensure_indexes(
+        self,
+        method: Optional[str] = None,
+        m: int = constants.HNSW_M,
+        ef_construction: int = constants.HNSW_EF_CONSTRUCTION,
+        lists: int = constants.IVFFLAT_LISTS,
+        storage: Optional[str] = None,
+    ) -> None:
+        """
+        Create the ANN, source and full-text indexes the backend uses.
+
+        Safe to call repeatedly. IVFFlat picks its centroids from the rows present
+        at build time, so create it after the initial load. storage ("full",
+        "halfvec", "binary") picks the encoding the PGVector ANN index is built
+        on; the FAISS backend always stores full vectors.
+        """
+        dimension = len(self.embeddings.embed_query("healthcheck"))
+        self.backend.ensure_indexes(
+            dimension, method=method, m=m, ef_construction=ef_construction, lists=lists, storage=storage
         )
-    
+
+    def set_search_params(
+        self,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        iterative_scan: Optional[str] = None,
+    ) -> None:
+        """
+        Tune the per-query ANN settings used by the search methods.
+
+        ef_search applies to HNSW, probes to IVFFlat. iterative_scan
+        ("strict_order" / "relaxed_order", pgvector >= 0.8) keeps filtered
+        searches from returning fewer than k rows. The FAISS backend searches
+        exactly and ignores these.
+        """
+        self.backend.set_search_params(ef_search=ef_search, probes=probes, iterative_scan=iterative_scan)
+
+    def add_chunks(self, documents: List[Document], batch_size: int = 256) -> int:
+        """
+        Embed chunk documents in fixed-size batches and bulk-insert them.
+
+        Returns the number of chunks written.
+        """
+        for start in range(0, len(documents), batch_size):
+            batch = documents[start:start + batch_size]
+            texts = [doc.page_content for doc in batch]
+            vectors = self.embeddings.embed_documents(texts)
+            self.backend.add(texts, vectors, [doc.metadata for doc in batch])
+        return len(documents)
+
+    def plan_chunk_sync(self, source: str, doc_hash: str, chunks: List[Document]) -> ChunkSyncPlan:
+        """
+        Compare chunks of a source document against what is already stored.
+
+        Chunk metadata is stamped with source and chunk_hash. Only chunks whose
+        hash is not stored yet end up in new_chunks; stored chunks that no
+        longer appear in the document end up in stale_ids. New chunks carry no
+        doc_hash until finalize_chunk_sync, so a source with any of them stored
+        is never taken as unchanged.
+        """
+        plan, stored_ids = self._start_chunk_sync(source, doc_hash)
+        if plan.unchanged:
+            return plan
+
+        seen = set()
+        for chunk in self._new_chunks(plan, chunks, stored_ids, seen):
+            plan.new_chunks.append(chunk)
+        self._collect_stale_ids(plan, stored_ids, seen)
+        return plan
+
+    def _start_chunk_sync(self, source: str, doc_hash: str) -> Tuple[ChunkSyncPlan, Dict[str, List[str]]]:
+        if not source:
+            # Everything stored under the source that is not in this document is deleted as stale.
+            raise ValueError("Chunk sync needs a non-empty source")
+        plan = ChunkSyncPlan(source=source, doc_hash=doc_hash)
+        stored = self.backend.source_chunk_hashes(source)
+        if stored and all(row["doc_hash"] == doc_hash for row in stored):
+            plan.unchanged = True
+        stored_ids: Dict[str, List[str]] = {}
+        for row in stored:
+            stored_ids.setdefault(row["chunk_hash"], []).append(row["uuid"])
+        return plan, stored_ids
+
+    @staticmethod
+    def _new_chunks(
+        plan: ChunkSyncPlan,
+        chunks: Iterable[Document],
+        stored_ids: Dict[str, List[str]],
+        seen: set,
+    ) -> Iterator[Document]:
+        """Stamp chunks with source and chunk hash and yield the ones not stored yet."""
+        for chunk in chunks:
+            chunk_hash = content_hash(chunk.page_content)
+            if chunk_hash in seen:
+                continue
+            seen.add(chunk_hash)
+            # No doc_hash yet: it marks the row pending until the sync is finalized.
+            chunk.metadata.update(source=plan.source, chunk_hash=chunk_hash)
+            chunk.metadata.pop("doc_hash", None)
+            if chunk_hash not in stored_ids:
+                yield chunk
+
+    @staticmethod
+    def _collect_stale_ids(plan: ChunkSyncPlan, stored_ids: Dict[str, List[str]], seen: set) -> None:
+        for chunk_hash, ids in stored_ids.items():
+            # Keep one row per chunk that is still present, drop everything else.
+            plan.stale_ids.extend(ids[1:] if chunk_hash in seen else ids)
+
+    def finalize_chunk_sync(self, plan: ChunkSyncPlan) -> None:
+        """
+        Delete stale chunks and stamp every chunk of the source with the new doc_hash.
+
+        Call this only after plan.new_chunks are written. Until then the new
+        rows have no doc_hash, so an interrupted run is picked up again on the
+        next ingest instead of being treated as unchanged.
+        """
+        if plan.unchanged:
+            return
+        self.backend.delete(plan.stale_ids)
+        self.backend.set_source_doc_hash(plan.source, plan.doc_hash)
+        self.backend.flush()
+        if self.working_set is not None:
+            self.working_set.invalidate(plan.source)
+
+    def sync_chunks(self, source: str, doc_hash: str, chunks: List[Document], batch_size: int = 256) -> ChunkSyncPlan:
+        """Embed and store only new or changed chunks of a source, then drop stale ones."""
+        plan = self.plan_chunk_sync(source, doc_hash, chunks)
+        self.add_chunks(plan.new_chunks, batch_size)
+        self.finalize_chunk_sync(plan)
+        return plan
+
+    def sync_chunk_stream(
+        self,
+        source: str,
+        doc_hash: str,
+        chunks: Iterable[Document],
+        batch_size: int = 256,
+    ) -> ChunkSyncPlan:
+        """
+        Streaming variant of sync_chunks for chunks produced by a generator.
+
+        New chunks are embedded and written batch_size at a time as they arrive,
+        so at most one batch is held in memory; plan.added counts them. The
+        generator is only consumed when the source changed, so an unchanged
+        document is never extracted at all.
+        """
+        plan, stored_ids = self._start_chunk_sync(source, doc_hash)
+        if plan.unchanged:
+            return plan
+
+        seen = set()
+        batch: List[Document] = []
+        for chunk in self._new_chunks(plan, chunks, stored_ids, seen):
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                plan.added += self.add_chunks(batch, batch_size)
+                batch = []
+        if batch:
+            plan.added += self.add_chunks(batch, batch_size)
+
+        self._collect_stale_ids(plan, stored_ids, seen)
+        self.finalize_chunk_sync(plan)
+        return plan
+
     def create_vectorization(
         self,
         text: str,
@@ -33,12 +265,16 @@ class VectorHelper:
         file_name: str = ""
     ):
         """
-        Chunk the provided text and store embeddings into PostgreSQL using PGVector.
+        Chunk the provided text and store embeddings in the vector backend.
+
+        file_name is the source the chunks are synced under; without one the
+        text is stored under its content hash, so unrelated texts never
+        replace each other.
 
         Returns (success: bool, message: str)
         """
         print(f"start creating chunks...")
-        ensure_pgvector_extension()
+        self.backend.prepare()
 
         # Verify AWS credentials are available (avoid empty embeddings)
         # session_creds = boto3.Session(region_name=aws_region).get_credentials()
@@ -61,17 +297,24 @@ class VectorHelper:
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
             separators=["\n\n", "\n", " ", ". "],
+            add_start_index=True,
         )
 
         metadatas = [{
             'filename': file_name,
-            'uploaded_at': datetime.datetime.now().isoformat(),
+            'uploaded_at': datetime.now().isoformat(),
         }]
         documents = text_splitter.create_documents([text], metadatas=metadatas)
 
-        self.vectorstore.add_documents(documents)
-
-        return True, f"Stored {len(documents)} documents under '{file_name}'."
+        doc_hash = content_hash(text)
+        source = file_name or f"text:{doc_hash}"
+        plan = self.sync_chunks(source, doc_hash, documents)
+        if plan.unchanged:
+            return True, f"'{source}' is unchanged, nothing to store."
+        return True, (
+            f"Stored {len(plan.new_chunks)} new documents and removed "
+            f"{len(plan.stale_ids)} stale documents under '{source}'."
+        )
     
     def create_vectorization_from_documents(
         self,
@@ -80,23 +323,34 @@ class VectorHelper:
         chunk_overlap: int = 100
     ):
         """
-        Chunk the provided text and store embeddings into PostgreSQL using PGVector.
+        Chunk the provided documents and store embeddings in the vector backend.
 
         Returns (success: bool, message: str)
         """
         print(f"start creating chunks...")
-        db_helper.ensure_pgvector_extension()
+        self.backend.prepare()
 
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
+            add_start_index=True,
         )
 
-        documents = text_splitter.split_documents(documents)
+        # Hash and sync per source so unchanged files are skipped entirely.
+        # A document without a source is synced on its own under its content hash.
+        by_source = {}
+        for document in documents:
+            source = document.metadata.get("source") or f"text:{content_hash(document.page_content)}"
+            by_source.setdefault(source, []).append(document)
 
-        self.vectorstore.add_documents(documents)
+        stored = removed = 0
+        for source, source_documents in by_source.items():
+            doc_hash = content_hash("\n".join(doc.page_content for doc in source_documents))
+            plan = self.sync_chunks(source, doc_hash, text_splitter.split_documents(source_documents))
+            stored += len(plan.new_chunks)
+            removed += len(plan.stale_ids)
 
-        return True, f"Stored {len(documents)} documents."
+        return True, f"Stored {stored} documents, removed {removed} stale documents."
     
     def search_knowledge_base(self, query: str, k: int = 5, filter: dict = None):
         """
@@ -104,7 +358,7 @@ class VectorHelper:
 
         Returns a list of documents most similar to the query.
         """
-        return self.vectorstore.similarity_search(query, k=k, filter=filter)
+        return [doc for doc, _ in self.search_with_cosine_similarity(query, k=k, filter=filter)]
 
     def search_with_cosine_similarity(self, query: str, k: int = 5, filter: dict = None):
         """
@@ -112,4 +366,123 @@ class VectorHelper:
 
         Returns a list of documents most similar to the query.
         """
-        return self.vectorstore.similarity_search_with_score(query, k=k, filter=filter)
\ No newline at end of file
+        return list(self.search_with_score_threshold(query, k=k, filter=filter))
+
+    def search_with_score_threshold(
+        self,
+        query: str,
+        k: int = 5,
+        filter: dict = None,
+        min_score: Optional[float] = None,
+        max_score: Optional[float] = None,
+    ) -> Iterator[Tuple[Document, float]]:
+        """
+        Search the knowledge base, applying the filter and score bounds in the backend.
+
+        Scores are the same distances search_with_cosine_similarity returns.
+        Yields (document, score) pairs ordered by score, streamed from the backend.
+        """
+        embedding = self.embeddings.embed_query(query)
+        yield from self.search_by_vector_with_score_threshold(
+            embedding, k=k, filter=filter, min_score=min_score, max_score=max_score
+        )
+
+    def search_by_vector_with_score_threshold(
+        self,
+        embedding: List[float],
+        k: int = 5,
+        filter: dict = None,
+        min_score: Optional[float] = None,
+        max_score: Optional[float] = None,
+    ) -> Iterator[Tuple[Document, float]]:
+        """Same as search_with_score_threshold for an already embedded query."""
+        if self.working_set is not None and filter and list(filter) == ["source"]:
+            results = self.working_set.search(
+                embedding, filter["source"], k, min_score=min_score, max_score=max_score
+            )
+            if results is not None:
+                yield from results
+                return
+        rows = self.backend.search(embedding, k, filter=filter, min_score=min_score, max_score=max_score)
+        for row in rows:
+            yield self._to_document(row)
+
+    def multi_query_search(
+        self,
+        queries: List[str],
+        k: int = 5,
+        filter: dict = None,
+        min_score: Optional[float] = None,
+        max_score: Optional[float] = None,
+        fused_k: Optional[int] = None,
+        rrf_k: int = constants.HYBRID_RRF_K,
+        embeddings: Optional[List[List[float]]] = None,
+    ) -> MultiQueryResult:
+        """
+        Search several queries with one embedding batch and one backend call.
+
+        On PGVector all queries run as a single SQL statement. per_query[i] holds
+        the (document, distance) pairs for queries[i], exactly what
+        search_with_score_threshold would return for it; fused merges them with
+        reciprocal rank fusion, keeping each chunk once (top fused_k, default all).
+        """
+        if embeddings is None:
+            embeddings = embed_queries(self.embeddings, queries) if queries else []
+        per_query = None
+        if self.working_set is not None and filter and list(filter) == ["source"]:
+            served = [
+                self.working_set.search(embedding, filter["source"], k, min_score=min_score, max_score=max_score)
+                for embedding in embeddings
+            ]
+            if all(results is not None for results in served):
+                per_query = served
+        if per_query is None:
+            per_query = [
+                [self._to_document(row) for row in rows]
+                for rows in self.backend.search_many(
+                    embeddings, k, filter=filter, min_score=min_score, max_score=max_score
+                )
+            ]
+        fused = reciprocal_rank_fusion(per_query, k=rrf_k)
+        return MultiQueryResult(
+            queries=list(queries),
+            per_query=per_query,
+            fused=fused[:fused_k] if fused_k else fused,
+        )
+
+    def lexical_search(self, query: str, k: int = 50, filter: dict = None) -> List[Tuple[Document, float]]:
+        """Full-text search over chunk text; scores are backend ranks (higher is better)."""
+        terms = lexical_query_terms(query)
+        if not terms:
+            return []
+        return [self._to_document(row) for row in self.backend.lexical_search(terms, k, filter=filter)]
+
+    @staticmethod
+    def _to_document(row: BackendRow) -> Tuple[Document, float]:
+        row_id, text, metadata, score = row
+        metadata = dict(metadata)
+        metadata.setdefault("id", row_id)
+        return Document(page_content=text, metadata=metadata), score
+
+    def hybrid_search(
+        self,
+        query: str,
+        k: int = constants.HYBRID_TOP_K,
+        filter: dict = None,
+        dense_k: Optional[int] = None,
+        lexical_k: Optional[int] = None,
+        rrf_k: int = constants.HYBRID_RRF_K,
+        embedding: Optional[List[float]] = None,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Dense + full-text search fused with reciprocal rank fusion.
+
+        Exact lexical hits (clinical codes, drug names and doses) rank well even
+        when the embedding model blurs them. Returns the top k
+        (document, fused_score) pairs; fused scores are higher-is-better.
+        """
+        if embedding is None:
+            embedding = self.embeddings.embed_query(query)
+        dense = list(self.search_by_vector_with_score_threshold(embedding, k=dense_k or k, filter=filter))
+        lexical = self.lexical_search(query, k=lexical_k or k, filter=filter)
+        return reciprocal_rank_fusion([dense, lexical], k=rrf_k)[:k]
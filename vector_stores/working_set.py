@@ -0,0 +1,137 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+import constants
+
+
+class _SourceMatrix:
+    """One document's chunks with their L2-normalised embeddings as a float32 matrix."""
+    def __init__(self, rows: List[Tuple[str, str, Dict[str, Any], List[float]]]) -> None:
+        import numpy as np
+
+        self.documents = []
+        for row_id, text, metadata, _ in rows:
+            metadata = dict(metadata)
+            metadata.setdefault("id", row_id)
+            self.documents.append(Document(page_content=text, metadata=metadata))
+        matrix = np.asarray([row[3] for row in rows], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.matrix = np.ascontiguousarray(matrix / norms)
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes
+
+
+class DocumentWorkingSet:
+    """
+    Per-document in-memory vectors for repeated source-filtered searches.
+
+    The first search against a source loads all of its chunk embeddings from
+    the backend. Later searches are a single matrix-vector product. Sources are
+    evicted least-recently-used once the matrices exceed max_bytes. Scores are
+    cosine distances, the same as the backend search.
+    """
+    def __init__(self, backend, max_bytes: int = constants.WORKING_SET_MAX_BYTES) -> None:
+        self.backend = backend
+        self.max_bytes = max_bytes
+        self._sources: "OrderedDict[str, _SourceMatrix]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self, source: str) -> Optional[_SourceMatrix]:
+        with self._lock:
+            entry = self._sources.get(source)
+            if entry is not None:
+                self._sources.move_to_end(source)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        rows = self.backend.source_embeddings(source)
+        if not rows:
+            return None
+        entry = _SourceMatrix(rows)
+        if entry.nbytes > self.max_bytes:
+            # Larger than the whole cap; let the backend search it.
+            return None
+
+        with self._lock:
+            previous = self._sources.pop(source, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._sources[source] = entry
+            self._bytes += entry.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._sources.popitem(last=False)
+                self._bytes -= evicted.nbytes
+        return entry
+
+    def search(
+        self,
+        embedding: List[float],
+        source: str,
+        k: int,
+        min_score: Optional[float] = None,
+        max_score: Optional[float] = None,
+    ) -> Optional[List[Tuple[Document, float]]]:
+        """
+        Nearest chunks of one source as (document, distance) pairs, closest first.
+
+        Returns None when the source cannot be served from memory (not stored,
+        or too large for the cap) so the caller can fall back to the backend.
+        """
+        import numpy as np
+
+        entry = self._load(source)
+        if entry is None:
+            return None
+
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        distances = 1.0 - entry.matrix @ query
+
+        candidates = np.arange(len(distances))
+        if min_score is not None:
+            candidates = candidates[distances[candidates] >= min_score]
+        if max_score is not None:
+            candidates = candidates[distances[candidates] <= max_score]
+        if k < len(candidates):
+            candidates = candidates[np.argpartition(distances[candidates], k)[:k]]
+        candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+        # Copies, so callers that annotate a result do not change the cached chunk.
+        return [
+            (
+                Document(page_content=entry.documents[i].page_content, metadata=dict(entry.documents[i].metadata)),
+                float(distances[i]),
+            )
+            for i in candidates
+        ]
+
+    def invalidate(self, source: Optional[str] = None) -> None:
+        """Drop one source (after it was re-ingested), or everything."""
+        with self._lock:
+            if source is None:
+                self._sources.clear()
+                self._bytes = 0
+                return
+            entry = self._sources.pop(source, None)
+            if entry is not None:
+                self._bytes -= entry.nbytes
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "sources": len(self._sources),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }